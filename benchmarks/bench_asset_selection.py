@@ -0,0 +1,68 @@
+# benchmarks/bench_asset_selection.py
+#
+# Data-preparation time of the Asset Selection page script against universe size:
+# the legacy per-row apply + per-class iterrows against the vectorized classification and grouped options.
+#   python -m benchmarks.bench_asset_selection --sizes 1000,5000,20000,100000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.universe import ASSET_CLASS_MAP, REVERSE_MAP, classify, build_class_options
+
+
+def synthetic_universe(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Mix of mapped sub-classes and unmapped ones, like the real sheet
+    classes = [sub for subs in ASSET_CLASS_MAP.values() for sub in subs] + [f"Other Class {i}" for i in range(200)]
+    return pd.DataFrame({
+        "symbol": [f"E{i:06d}" for i in range(n)],
+        "name": [f"Synthetic ETF {i}" for i in range(n)],
+        "exchange": "NYSE",
+        "exchangeShortName": "AMEX",
+        "Asset Class": rng.choice(classes, size=n),
+    })
+
+
+def legacy_prepare(df):
+    df = df.copy()
+    df["Broad Asset Class"] = df["Asset Class"].apply(lambda x: REVERSE_MAP.get(str(x).lower(), "Unclassified"))
+    options = {}
+    for broad_class in ASSET_CLASS_MAP.keys():
+        subset = df[df["Broad Asset Class"] == broad_class]
+        if not subset.empty:
+            options[broad_class] = [f"{row['name']} – {row['symbol']}" for _, row in subset.iterrows()]
+    return options
+
+
+def vectorized_prepare(df):
+    return build_class_options(classify(df.copy()))
+
+
+def best_of(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Asset Selection page preparation.")
+    parser.add_argument("--sizes", default="1000,5000,20000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'legacy':>12} {'vectorized':>12} {'speed-up':>9}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        df = synthetic_universe(n)
+        legacy, legacy_time = best_of(legacy_prepare, df, args.repeat)
+        vectorized, vector_time = best_of(vectorized_prepare, df, args.repeat)
+        assert {k: v for k, v in vectorized.items() if k in ASSET_CLASS_MAP} == legacy, "option lists differ"
+        print(f"{n:>8} {legacy_time * 1e3:>10.1f}ms {vector_time * 1e3:>10.1f}ms {legacy_time / vector_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_fetch.py
+#
+# Fetch-path throughput against the local FMP replay server; needs no network or API key.
+#   python -m benchmarks.bench_fetch --tickers 40 --latency 0.08 --error-rate 0.02
+#   python -m benchmarks.bench_fetch --fixtures data/fixtures/fmp --symbols SPY,QQQ,GSG
+#
+# The server runs in its own process and is warmed up before timing, so every timed request costs the fixed
+# --latency plus socket I/O and the pool sizes compare fetch concurrency, not the server's JSON encoding.
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+from utils import fmp_utils
+
+
+def run(label, fn):
+    start = time.perf_counter()
+    frames, failures = fn()
+    elapsed = time.perf_counter() - start
+    rows = sum(len(df) for df in frames.values())
+    print(f"{label:<28} {elapsed:8.3f}s  {len(frames):4d} ok  {len(failures):3d} failed  {rows:8d} rows")
+    return elapsed
+
+
+def start_server(args):
+    """Launch utils.fmp_replay in a subprocess; returns (process, base_url)."""
+    cmd = [sys.executable, "-m", "utils.fmp_replay", "--fixtures", args.fixtures or "", "--port", "0",
+           "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+           "--seed", str(args.seed), "--synthetic"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    match = re.search(r"http://\S+", line)
+    if not match:
+        process.kill()
+        raise RuntimeError(f"replay server did not start: {line!r}")
+    return process, match.group(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FMP price download path offline.")
+    parser.add_argument("--fixtures", default=None, help="recorded fixture directory (default: synthetic only)")
+    parser.add_argument("--symbols", default=None, help="comma-separated tickers (default: synthetic T000...)")
+    parser.add_argument("--tickers", type=int, default=30)
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", default="1,4,8,16")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tickers = args.symbols.split(",") if args.symbols else [f"T{i:03d}" for i in range(args.tickers)]
+    pools = [int(w) for w in args.workers.split(",")]
+
+    # The benchmark measures the fetch path, not our FMP plan's quota
+    fmp_utils.rate_limiter = fmp_utils.RateLimiter(10 ** 6, 1)
+    fmp_utils.BACKOFF_BASE = 0.01
+
+    server, base_url = start_server(args)
+    try:
+        fmp_utils.set_base_url(base_url)
+        print(f"{len(tickers)} tickers in {len(fmp_utils.chunk_symbols(tickers, 'v3/historical-price-full'))} "
+              f"requests, {args.start}..{args.end}, latency {args.latency}s + <= {args.jitter}s jitter, "
+              f"error rate {args.error_rate:.0%}")
+
+        # Untimed: the server serializes each response once and serves the bytes from then on
+        run("warm-up (untimed)", lambda: fmp_utils.fetch_prices_concurrent(
+            tickers, args.start, args.end, None, max_workers=max(pools)))
+
+        for workers in pools:
+            run(f"pool of {workers}", lambda: fmp_utils.fetch_prices_concurrent(
+                tickers, args.start, args.end, None, max_workers=workers))
+
+        with urlopen(f"{base_url}/_replay/stats") as response:
+            print(f"server: {json.load(response)}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_parse.py
+#
+# Peak memory and parse time of one historical-price-full payload:
+# the legacy response.json() -> DataFrame(list of dicts) path against the streaming array parser.
+#   python -m benchmarks.bench_parse --years 20 --repeat 5
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+from utils.fmp_replay import _synthetic_history
+from utils.fmp_stream import parse_history_stream, history_frame, estimate_rows
+
+
+def legacy_parse(body, ticker):
+    data = json.loads(body)
+    hist = data.get("historical", [])
+    df = pd.DataFrame(hist)
+    df["date"] = pd.to_datetime(df["date"])
+    df = df[["date", "close"]].rename(columns={"close": ticker})
+    return df.set_index("date")
+
+
+def streaming_parse(body, ticker, start, end, chunk_size=64 * 1024):
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    history = parse_history_stream(chunks, estimate_rows(start, end))
+    return history_frame(ticker, *history[ticker])
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FMP price payload parsing.")
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    end = date(2024, 12, 31)
+    start = end - timedelta(days=365 * args.years)
+    body = json.dumps(_synthetic_history("BENCH", start, end)).encode()
+    print(f"payload: {args.years}y daily, {len(body) / 1e6:.1f} MB")
+
+    legacy, legacy_time, legacy_peak = measure(lambda: legacy_parse(body, "BENCH"), args.repeat)
+    stream, stream_time, stream_peak = measure(
+        lambda: streaming_parse(body, "BENCH", start.isoformat(), end.isoformat()), args.repeat)
+
+    assert legacy.sort_index()["BENCH"].equals(stream["BENCH"]), "parsers disagree"
+    print(f"{'legacy json + DataFrame':<26} {legacy_time * 1e3:8.1f} ms   peak {legacy_peak / 1e6:7.1f} MB")
+    print(f"{'streaming arrays':<26} {stream_time * 1e3:8.1f} ms   peak {stream_peak / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
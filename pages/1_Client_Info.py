@@ -3,8 +3,10 @@
 #======================================================================================================================
 import streamlit as st
 st.set_page_config(page_title="Client Information", layout="wide")
-import json
-import os
+import pandas as pd
+import time
+from utils.client_store import (ClientStoreError, CLIENT_PAGE_SIZE, client_exists, client_history, count_clients,
+                                delete_client, get_client, save_profile, search_clients)
 from utils.layout_utils import render_sidebar
 
 
@@ -20,57 +22,48 @@ st.markdown(
 )
 
 
-#======================================================================================================================
-# Helper Functions
-#======================================================================================================================
-def get_client_folder(name):
-    return f"data/clients/{name.replace(' ', '_')}"
-
-def get_client_file(name):
-    folder = get_client_folder(name)
-    return os.path.join(folder, f"{name.replace(' ', '_')}.json")
-
-def load_client_data(name):
-    path = get_client_file(name)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return {}
-
-
 #======================================================================================================================
 # Client Setup
 #======================================================================================================================
 client_type = st.radio("Client Type", ["New", "Existing"], horizontal=True)
 
 if client_type == "Existing":
-    os.makedirs("data/clients", exist_ok=True)
-
-    # Get all folders (each folder is a client)
-    folders = [f for f in os.listdir("data/clients") if os.path.isdir(os.path.join("data/clients", f))]
-
-    client_options = []
-    valid_clients = {}
-
-    for folder in folders:
-        client_json_path = os.path.join("data/clients", folder, f"{folder}.json")
-        if os.path.exists(client_json_path):
-            # Display with spaces, keep folder key internally
-            display_name = folder.replace("_", " ")
-            client_options.append(display_name)
-            valid_clients[display_name] = client_json_path
-
-    if client_options:
+    # Search, filter and page through the client manifest; only the selected client's full record is loaded
+    search_col, level_col, page_col = st.columns([3, 1, 1])
+    with search_col:
+        client_query = st.text_input("Search Clients", placeholder="Type part of a name")
+    with level_col:
+        level_filter = st.selectbox("Risk Level", ["All", "Conservative", "Moderate", "Aggressive"])
+    risk_level = None if level_filter == "All" else level_filter
+
+    total_clients = count_clients(client_query, risk_level)
+    page_count = max(1, -(-total_clients // CLIENT_PAGE_SIZE))
+    with page_col:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    matches = search_clients(client_query, risk_level, page=page - 1)
+    client_options = [row["name"] for row in matches]
+    if total_clients > CLIENT_PAGE_SIZE:
+        first = (page - 1) * CLIENT_PAGE_SIZE
+        st.caption(f"Showing {first + 1}-{first + len(matches)} of {total_clients} clients")
+
+    if not client_options:
+        st.info("No clients match your search.")
+    else:
         client_option = st.selectbox("Select Existing Client", client_options)
         if client_option:
-            # Load the correct JSON based on the displayed name
-            client_file_path = valid_clients[client_option]
-            with open(client_file_path, "r") as f:
-                client_data = json.load(f)
+            client_data = get_client(client_option)
+            if client_data is None:
+                # Renamed or deleted in another session since the list was loaded; reload the list once, not forever
+                st.warning(f"⚠️ Client '{client_option}' no longer exists. Reloading the client list.")
+                if st.session_state.get("missing_client") != client_option:
+                    st.session_state["missing_client"] = client_option
+                    time.sleep(1)
+                    st.rerun()
+                st.session_state.pop("missing_client", None)
+                st.stop()
 
             # Save to session for later use
             st.session_state["client_profile"] = client_data
-            st.session_state["client_file"] = client_file_path  # optional: in case you want to reference the path later
 
 
             col1, col2, col3 = st.columns(3)
@@ -84,18 +77,19 @@ if client_type == "Existing":
                 company = st.text_input("Company", value=client_data.get("company", ""))
 
                 if st.button("💾 Edit Client Info"):
-                    client_data.update({
+                    profile = {
                         "name": name,
                         "email": email,
                         "phone": phone,
                         "country": country,
                         "company": company
-                    })
-                    folder = get_client_folder(name)
-                    os.makedirs(folder, exist_ok=True)
-                    with open(get_client_file(name), "w") as f:
-                        json.dump(client_data, f, indent=4)
-                    st.success("✅ Client information updated.")
+                    }
+                    try:
+                        save_profile(client_option, profile)
+                        client_data.update(profile)
+                        st.success("✅ Client information updated.")
+                    except ClientStoreError as e:
+                        st.error(f"❌ {e}")
 
             with col2:
                 st.markdown("<h2 style='color: #CC9900;'>📉 Risk Aversion Information</h2>", unsafe_allow_html=True)
@@ -149,17 +143,14 @@ if client_type == "Existing":
             with colB:
                 if st.button("🗑️ Delete Client"):
                     if "client_profile" in st.session_state and st.session_state.client_profile.get("name"):
-                        client_name = st.session_state.client_profile.get("name").replace(" ", "_")
-                        folder = get_client_folder(client_name)
+                        client_name = st.session_state.client_profile.get("name")
                         try:
-                            if os.path.exists(folder):
-                                import shutil
-
-                                shutil.rmtree(folder)
+                            if delete_client(client_name):
+                                del st.session_state["client_profile"]
                                 st.success(f"✅ Client '{client_name}' deleted.")
                                 st.rerun()
                             else:
-                                st.error("❌ Client folder not found.")
+                                st.error("❌ Client not found.")
                         except Exception as e:
                             st.error(f"❌ Failed to delete client: {e}")
                     else:
@@ -172,6 +163,14 @@ if client_type == "Existing":
                     else:
                         st.error("❌ Please select or create a client first.")
 
+            with st.expander("🕘 Change History"):
+                history = client_history(client_option)
+                if history:
+                    st.dataframe(pd.DataFrame(history)[["changed_at", "field", "value"]].astype(str),
+                                 hide_index=True, use_container_width=True)
+                else:
+                    st.markdown("No recorded changes.")
+
 elif client_type == "New":
     st.markdown("<h2 style='color: #CC9900;'>📝 Enter New Client Details</h2>", unsafe_allow_html=True)
     col1, col2 = st.columns(2)
@@ -184,7 +183,9 @@ elif client_type == "New":
         company = st.text_input("Company")
 
     if st.button("✅ Save New Client"):
-        if name and email:
+        if name and email and client_exists(name):
+            st.error(f"A client named '{name}' already exists.")
+        elif name and email:
             new_client_data = {
                 "name": name,
                 "email": email,
@@ -192,10 +193,7 @@ elif client_type == "New":
                 "country": country,
                 "company": company,
             }
-            folder = get_client_folder(name)
-            os.makedirs(folder, exist_ok=True)
-            with open(get_client_file(name), "w") as f:
-                json.dump(new_client_data, f, indent=4)
+            save_profile(name, new_client_data)
 
             st.session_state.client_profile = new_client_data
             st.success(f"New client '{name}' saved.")
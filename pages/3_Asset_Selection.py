@@ -4,11 +4,21 @@
 import streamlit as st
 st.set_page_config(page_title="Asset Selection", layout="wide")
 import pandas as pd
+import numpy as np
 import os
-import requests
-import json
+import time
+from datetime import date
 from dotenv import load_dotenv
 from utils.layout_utils import render_sidebar
+from utils.client_store import get_client, save_current_allocation, save_selected_etfs
+from utils.etf_metadata import fetch_etf_metadata, save_meta_snapshot
+from utils.fmp_utils import set_base_url
+from utils.prefetch import enqueue_prefetch
+from utils.price_store import DEFAULT_START_DATE
+from utils.universe import get_universe, ASSET_CLASS_MAP
+from utils.etf_search import search_universe
+from utils.etf_stats import load_stats_table, screen
+from utils.covariance_store import load_covariance_store
 
 
 #======================================================================================================================
@@ -32,43 +42,21 @@ if not FMP_API_KEY:
     st.error("❌ FMP_API_KEY not found. Please add it to Streamlit Secrets or your .env file.")
     st.stop()
 
+# Optional override of the FMP host, e.g. a local replay server (utils/fmp_replay.py)
+if "api" in st.secrets:
+    set_base_url(st.secrets["api"].get("base_url"))
+
 #======================================================================================================================
 # Asset Classes Lists Download and Mapping
 #======================================================================================================================
-data_path = "data/data_lists.xlsx"
-sheet_name = "ETF"
+# One read-only Universe per process, shared by every session; reruns only hold positions into it
 try:
-    df = pd.read_excel(data_path, sheet_name=sheet_name)
+    universe = get_universe()
 except Exception as e:
     st.error(f"❌ Failed to load Excel data: {e}")
     st.stop()
 
-if "Asset Class" not in df.columns:
-    st.error("❌ 'Asset Class' column not found.")
-    st.stop()
-
-# ==== Asset Class Mapping ====
-asset_class_map = {
-    "Equities": ["Domestic Equity", "Canadian Equity", "Emerging Market Equity", "Australasian Equities",
-                 "Consumer Discretionary", "Consumer Staples", "Banks", "Biotechnology", "Aerospace & Defense",
-                 "Cyber Security", "E-Commerce", "Currency-hedged, Equities, International"],
-    "Fixed Income": ["Active Fixed Income", "Bond", "Canadian Fixed Income", "Emerging Market Bonds",
-                     "Convertible Securities"],
-    "Commodities": ["Commodities", "Commodity", "Agriculture"],
-    "Real Estate": ["Alternative | Real Estate", "REITs", "Global Real Estate", "Real Estate"],
-    "Private Equity": ["Private Equity", "Buyout Funds", "Venture Capital"],
-    "Alternatives": ["Alternative", "Alternative Energy", "Alternative Investments", "Alternative Equity Focused",
-                     "Alternative Credit Focused", "Alternative | Infrastructure", "Alternative | Managed Futures",
-                     "Alternative | Mid-Stream Energy", "Alternative | Multi-Strategy"],
-    "Multi-Asset": ["Balanced", "Balanced/Diversified", "Asset Allocation",
-                    "Active Equity Income and Green/Renewable", "Capital Efficient ETFs", "Alternatives, Equities"],
-    "Other": ["Cash", "Cash and Cash Equivalents", "Currency", "Community Bank"],
-    "Crypto": [ "Crypto ETPs", "Crypto-Linked","Digital Assets", "Currencies"],
-    "Private Credit": [ "Private Credit"]
-}
-
-reverse_map = {sub.lower(): broad for broad, subs in asset_class_map.items() for sub in subs}
-df["Broad Asset Class"] = df["Asset Class"].apply(lambda x: reverse_map.get(str(x).lower(), "Unclassified"))
+asset_class_map = ASSET_CLASS_MAP
 
 
 #======================================================================================================================
@@ -84,13 +72,8 @@ client_data = {}
 
 if "client_profile" in st.session_state:
     client_name = st.session_state["client_profile"]["name"]
-    client_dir = f"data/clients/{client_name.replace(' ', '_')}"
-    os.makedirs(client_dir, exist_ok=True)
-    client_file = f"{client_dir}/{client_name.replace(' ', '_')}.json"
-    if os.path.exists(client_file):
-        with open(client_file, "r") as f:
-            client_data = json.load(f)
-            existing_allocation = client_data.get("current_allocation", {})
+    client_data = get_client(client_name) or {}
+    existing_allocation = client_data.get("current_allocation", {})
 
 cols = st.columns(3)
 allocation_inputs = {}
@@ -119,9 +102,8 @@ if st.button("💾 Save Current Allocation"):
 
         if "client_profile" in st.session_state:
             client_data["current_allocation"] = final_alloc
-            with open(client_file, "w") as f:
-                json.dump(client_data, f, indent=4)
-            st.success("✅ Allocation saved to client JSON.")
+            save_current_allocation(client_name, final_alloc)
+            st.success("✅ Allocation saved to client profile.")
 
 
 #======================================================================================================================
@@ -129,14 +111,73 @@ if st.button("💾 Save Current Allocation"):
 #======================================================================================================================
 st.markdown("---")
 st.markdown("<h1 style='color: #CC9900;'>📂 Asset Selection</h1>", unsafe_allow_html=True)
+st.caption(f"Universe: {len(universe):,} ETFs, {universe.memory_bytes() / 1e6:.1f} MB shared across sessions")
+
+# ==== Search ====
+# One search box over symbol, name, asset class and exchange; picks are kept across queries
+if "etf_search_picks" not in st.session_state:
+    st.session_state.etf_search_picks = []
+
+query = st.text_input("🔎 Search ETFs", placeholder="Ticker, fund name, issuer or asset class, e.g. 'ishares bond'")
+search_start = time.perf_counter()
+matches = search_universe(query) if query else universe.rows([])
+search_ms = (time.perf_counter() - search_start) * 1e3
+if query:
+    st.caption(f"{len(matches)} matches in {search_ms:.1f} ms")
+
+match_labels = (matches["name"].astype(str) + " – " + matches["symbol"].astype(str)).tolist()
+picked = st.multiselect("Select ETFs from search",
+                        list(dict.fromkeys(st.session_state.etf_search_picks + match_labels)),
+                        default=st.session_state.etf_search_picks)
+st.session_state.etf_search_picks = picked
+st.session_state.etf_selection_by_class["Search"] = picked
+
+# ==== Screener ====
+# Filters the nightly statistics table (utils/nightly_refresh.py); nothing is computed on the page
+with st.expander("📐 Screener"):
+    stats_table = load_stats_table()
+    if stats_table.empty:
+        st.info("ℹ️ No ETF statistics yet. They are computed by the nightly refresh.")
+        st.session_state.etf_selection_by_class["Screener"] = []
+    else:
+        f1, f2, f3 = st.columns(3)
+        with f1:
+            max_expense = st.number_input("Max expense ratio (%)", min_value=0.0, value=1.0, step=0.05)
+            max_vol = st.number_input("Max volatility (%)", min_value=0.0, value=40.0, step=1.0)
+        with f2:
+            min_1y = st.number_input("Min 1Y return (%)", value=-100.0, step=1.0)
+            min_3y = st.number_input("Min 3Y return (%)", value=-100.0, step=1.0)
+        with f3:
+            max_dd = st.number_input("Max drawdown (%)", min_value=0.0, max_value=100.0, value=100.0, step=1.0)
+            sort_by = st.selectbox("Sort by", ["sharpe", "annual_return", "return_1y", "return_3y", "volatility",
+                                               "max_drawdown", "expense_ratio"])
+        include_missing_expense = st.checkbox("Include ETFs without a cached expense ratio", value=True)
+
+        screened = screen(stats_table,
+                          max_expense=max_expense,
+                          min_return_1y=min_1y / 100 if min_1y > -100 else None,
+                          min_return_3y=min_3y / 100 if min_3y > -100 else None,
+                          max_volatility=max_vol / 100,
+                          max_drawdown=-max_dd / 100 if max_dd < 100 else None,
+                          keep_missing_expense=include_missing_expense,
+                          sort_by=sort_by,
+                          ascending=sort_by in ("volatility", "expense_ratio"))
+        screened = screened.assign(name=universe.names(screened["symbol"]))
+        st.caption(f"{len(screened)} of {len(stats_table)} ETFs")
+        st.dataframe(screened.head(200), hide_index=True)
+
+        screened = screened.head(200)
+        screener_labels = (screened["name"].fillna(screened["symbol"]) + " – " + screened["symbol"]).tolist()
+        st.session_state.etf_selection_by_class["Screener"] = st.multiselect("Select ETFs from screener",
+                                                                              screener_labels)
 
 cols = st.columns(3)
+class_options = universe.class_options
 for idx, broad_class in enumerate(asset_class_map.keys()):
-    subset = df[df["Broad Asset Class"] == broad_class]
-    if not subset.empty:
+    options = class_options.get(broad_class, [])
+    if options:
         with cols[idx % 3]:
             st.markdown(f"###### {broad_class}")
-            options = [f"{row['name']} – {row['symbol']}" for _, row in subset.iterrows()]
             selected = st.multiselect(f"Select ETFs for {broad_class}", options,
                                       key=f"etfs_{broad_class}_{idx}")
             st.session_state.etf_selection_by_class[broad_class] = selected
@@ -148,51 +189,19 @@ st.markdown("<h2 style='color: #CC9900;'>📋 Selected ETFs</h2>", unsafe_allow_
 selected_symbols = [item.split("–")[-1].strip()
                     for lst in st.session_state.etf_selection_by_class.values() for item in lst]
 
-selected_df = df[df["symbol"].isin(selected_symbols)]
+selected_df = universe.rows(np.unique(universe.positions(selected_symbols)))
 st.dataframe(selected_df)
 
-def fetch_etf_metadata(ticker, api_key):
-    base_v4 = "https://financialmodelingprep.com/api/v4"
-    base_v3 = "https://financialmodelingprep.com/api/v3"
-
-    def safe_json(url):
-        try:
-            return requests.get(url).json()
-        except:
-            return {}
-
-    # General ETF profile info
-    profile = safe_json(f"{base_v4}/etf-info?symbol={ticker}&apikey={api_key}")
-
-    # Weights
-    sector = safe_json(f"{base_v3}/etf-sector-weightings/{ticker}?apikey={api_key}")
-    country = safe_json(f"{base_v3}/etf-country-weightings/{ticker}?apikey={api_key}")
-
-    # Performance metrics
-    performance = safe_json(f"{base_v3}/stock-price-change/{ticker}?apikey={api_key}")
-    perf_data = performance[0] if performance else {}
-
-    return {
-        "name": profile[0].get("name", "") if profile else "",
-        "assetClass": profile[0].get("assetClass", "") if profile else "",
-        "description": profile[0].get("description", "") if profile else "",
-        "expenseRatio": profile[0].get("expenseRatio", None) if profile else None,
-        "etfCompany": profile[0].get("etfCompany", "") if profile else "",
-        "price": profile[0].get("price", None) if profile else None,
-        "exchange": profile[0].get("exchange", "") if profile else "",
-        "country_weights": {
-            d["country"]: d["weightPercentage"]
-            for d in country if "country" in d
-        },
-        "sector_weights": {
-            d["sector"]: d["weightPercentage"]
-            for d in sector if "sector" in d
-        },
-        "performance": {
-            k: v for k, v in perf_data.items()
-            if k in ["3M", "6M", "YTD", "1Y", "3Y", "5Y"]
-        }
-    }
+# Correlation of the selection, read from the nightly universe-wide store instead of downloaded prices
+cov_store = load_covariance_store()
+if cov_store is not None and len(selected_df) > 1:
+    corr_block = cov_store.sub_matrix(selected_df["symbol"].tolist(), kind="corr")
+    if len(corr_block) > 1:
+        with st.expander(f"🔗 Return Correlation ({cov_store.meta['start']} to {cov_store.meta['end']})"):
+            st.dataframe(corr_block.style.format("{:.2f}").background_gradient(cmap="coolwarm", vmin=-1, vmax=1))
+            missing = cov_store.missing(selected_df["symbol"].tolist())
+            if missing:
+                st.caption(f"Not yet in the store: {', '.join(missing)}")
 
 col1, col2 = st.columns(2)
 
@@ -205,19 +214,26 @@ with col1:
         })[["Name", "Ticker", "Asset Class"]]
         selected_etfs = etf_df.to_dict("records")
 
+        # Start downloading prices now, so the panel is ready by the time the Optimization page opens
+        if selected_etfs:
+            job = enqueue_prefetch([etf["Ticker"] for etf in selected_etfs], DEFAULT_START_DATE, date.today(),
+                                   FMP_API_KEY)
+            st.session_state["prefetch_job"] = job.key
+
+        # Cached endpoints cost nothing; everything else is fetched concurrently. The client keeps a versioned
+        # reference to each ETF's metadata, not a copy of it
+        meta_by_ticker, failures = fetch_etf_metadata([etf["Ticker"] for etf in selected_etfs], FMP_API_KEY)
         for etf in selected_etfs:
-            try:
-                etf["meta"] = fetch_etf_metadata(etf["Ticker"], FMP_API_KEY)
-            except Exception as e:
-                st.warning(f"⚠️ Could not fetch metadata for {etf['Ticker']}: {e}")
+            etf["meta_version"] = save_meta_snapshot(etf["Ticker"], meta_by_ticker[etf["Ticker"]])
+        for ticker, endpoints in failures.items():
+            st.warning(f"⚠️ Could not fetch metadata for {ticker}: {', '.join(endpoints)}")
 
         st.session_state["selected_etfs"] = selected_etfs
 
         if "client_profile" in st.session_state:
             client_data["selected_etfs"] = selected_etfs
-            with open(client_file, "w") as f:
-                json.dump(client_data, f, indent=4)
-            st.success("✅ Selection with metadata saved to client JSON.")
+            save_selected_etfs(client_name, selected_etfs)
+            st.success("✅ Selection with metadata saved to client profile.")
 
 with col2:
     if st.button("🧾 View Selected Portfolio"):
@@ -247,8 +263,7 @@ with col2:
                     selected_etfs.append({
                         "Name": ticker,
                         "Ticker": ticker,
-                        "Asset Class": "N/A",
-                        "meta": {}
+                        "Asset Class": "N/A"
                     })
 
             st.session_state["selected_etfs"] = selected_etfs
@@ -5,14 +5,22 @@ import streamlit as st
 st.set_page_config(page_title="📈 Optimization", layout="wide")
 import pandas as pd
 import numpy as np
-import requests
 from datetime import date
 import warnings
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from utils.layout_utils import render_sidebar
-import riskfolio as rp
-import json
+from utils.fmp_utils import set_base_url
+from utils.prefetch import get_prefetch
+from utils.price_store import (refresh_tickers, load_panel, save_client_manifest, load_client_panel,
+                               load_client_price_panel, DEFAULT_START_DATE)
+from utils.covariance_store import load_covariance_store, COV_YEARS
+from utils.marginal_scan import scan_candidates
+from utils import client_store
+from utils import optimization_cache
+from utils.optimization_pool import solve_objectives, warm_pool
 import plotly.express as px
 
 
@@ -40,38 +48,42 @@ if not FMP_API_KEY:
     st.error("❌ FMP_API_KEY not found. Please add it to Streamlit Secrets or your .env file.")
     st.stop()
 
+# Optional override of the FMP host, e.g. a local replay server (utils/fmp_replay.py)
+if "api" in st.secrets:
+    set_base_url(st.secrets["api"].get("base_url"))
+
 # === helper to save selected file
+def warm_report(client_name: str, obj: str):
+    # The report solves its own 3-year window; solving it now means the report finds it in the optimization cache
+    try:
+        panel = load_client_price_panel(client_name)
+        if panel is not None:
+            optimization_cache.warm_report(panel, obj)
+    except Exception as e:
+        print(f"⚠ Report warm-up failed for {client_name}: {e}")
+
+
 def save_selected_portfolio(name: str, weights: dict, metrics: dict) -> bool:
     if "client_profile" not in st.session_state:
         st.error("❌ No client profile found.")
         return False
 
     client_name = st.session_state["client_profile"]["name"]
-    folder_name = client_name.replace(" ", "_")
-    client_dir = f"data/clients/{folder_name}"
-    json_file = f"{client_dir}/{folder_name}.json"
-
-    if not os.path.exists(json_file):
-        st.error(f"❌ JSON file not found: {json_file}")
+    if not client_store.client_exists(client_name):
+        st.error(f"❌ Client not found: {client_name}")
         return False
 
     try:
-        with open(json_file, "r") as f:
-            client_data = json.load(f)
-
-        client_data["Selected Portfolio"] = {
-            "Name": name,
-            "Weights": {k: round(v, 4) for k, v in weights.items()},
-            "Metrics": {
+        client_store.save_selected_portfolio(
+            client_name, name,
+            {k: round(v, 4) for k, v in weights.items()},
+            {
                 "Return": round(metrics.get("Return", 0), 4),
                 "Volatility": round(metrics.get("Volatility", 0), 4),
                 "Sharpe Ratio": round(metrics.get("Sharpe Ratio", 0), 4)
             }
-        }
-
-        with open(json_file, "w") as f:
-            json.dump(client_data, f, indent=4)
-
+        )
+        threading.Thread(target=warm_report, args=(client_name, name), daemon=True).start()
         return True
 
     except Exception as e:
@@ -103,6 +115,26 @@ except Exception as e:
 
 st.dataframe(df_etfs, use_container_width=True)
 
+# Precomputed by the nightly refresh, so it is available before any prices are downloaded here
+cov_store = load_covariance_store()
+if cov_store is not None:
+    tickers = df_etfs["Ticker"].dropna().tolist()
+    cov_block = cov_store.sub_matrix(tickers, kind="cov", annualize=True)
+    if len(cov_block) > 1:
+        with st.expander(f"🔗 Covariance & Correlation ({cov_store.meta['start']} to {cov_store.meta['end']})"):
+            c1, c2 = st.columns(2)
+            with c1:
+                st.markdown("**Annualized Covariance**")
+                st.dataframe(cov_block.style.format("{:.4f}"), use_container_width=True)
+            with c2:
+                st.markdown("**Correlation**")
+                corr_block = cov_store.sub_matrix(tickers, kind="corr")
+                st.dataframe(corr_block.style.format("{:.2f}").background_gradient(cmap="coolwarm", vmin=-1, vmax=1),
+                             use_container_width=True)
+            missing = cov_store.missing(tickers)
+            if missing:
+                st.caption(f"Not yet in the store: {', '.join(missing)}")
+
 
 #======================================================================================================================
 # Download Historical Data
@@ -112,7 +144,7 @@ st.markdown("---")
 
 col1, col2, col3 = st.columns(3)
 with col1:
-    start_date = st.date_input("Start Date", value=date(2020, 1, 1))
+    start_date = st.date_input("Start Date", value=DEFAULT_START_DATE)
 with col2:
     end_date = st.date_input("End Date", value=date.today())
 with col3:
@@ -123,55 +155,60 @@ with col3:
 if "price_data" not in st.session_state:
     st.session_state["price_data"] = None
 
-def fetch_fmp_prices(ticker, start, end):
-    try:
-        url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker}?from={start}&to={end}&apikey={FMP_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        hist = data.get("historical", [])
-        if hist:
-            df = pd.DataFrame(hist)
-            df["date"] = pd.to_datetime(df["date"])
-            df = df[["date", "close"]].rename(columns={"close": ticker})
-            return df.set_index("date")
-        else:
-            return pd.DataFrame()
-    except Exception as e:
-        st.warning(f"⚠️ Failed to fetch data for {ticker}: {e}")
-        return pd.DataFrame()
+# Prices enqueued in the background when the selection was confirmed on Asset Selection
+prefetch = get_prefetch(st.session_state.get("prefetch_job"))
+if (prefetch is not None and st.session_state["price_data"] is None and "client_profile" in st.session_state
+        and set(prefetch.tickers) == set(df_etfs["Ticker"].dropna())):
+    if prefetch.running:
+        progress_bar = st.progress(prefetch.progress, text="Prefetching prices...")
+        while prefetch.running:
+            time.sleep(0.25)
+            progress_bar.progress(prefetch.progress, text=f"Prefetching prices: {prefetch.done}/{prefetch.total} requests")
+        progress_bar.empty()
+
+    st.session_state.pop("prefetch_job")
+    if prefetch.error:
+        st.warning(f"⚠️ Background price prefetch failed: {prefetch.error}")
+    else:
+        if prefetch.failures:
+            st.warning("⚠️ Failed to fetch data for: " +
+                       ", ".join(f"{t} ({reason})" for t, reason in prefetch.failures.items()))
+        combined_df = load_panel(prefetch.tickers, prefetch.start, prefetch.end)
+        if not combined_df.empty:
+            save_client_manifest(st.session_state["client_profile"]["name"], prefetch.tickers,
+                                 prefetch.start, prefetch.end, panel=combined_df)
+            st.session_state["price_data"] = combined_df.reset_index()
+            st.success(f"✅ Historical data prefetched for {combined_df.shape[1]} tickers.")
 
 if st.button("📥 Download Historical Data from FMP"):
     if "client_profile" not in st.session_state:
         st.error("❌ Client profile not found.")
         st.stop()
 
-    client_name = st.session_state["client_profile"]["name"].replace(" ", "_")
-    today_str = date.today().strftime("%Y-%m-%d")
-    folder_path = f"data/clients/{client_name}"
-    os.makedirs(folder_path, exist_ok=True)
-    csv_path = os.path.join(folder_path, f"{client_name}_{today_str}.csv")
+    client_name = st.session_state["client_profile"]["name"]
 
-    if os.path.exists(csv_path):
-        combined_df = pd.read_csv(csv_path, parse_dates=["date"])
-        st.success("✅ Loaded existing historical data from CSV.")
+    # Only the missing head/tail of each ticker is requested; the rest comes from the local price store
+    tickers = df_etfs["Ticker"].dropna().tolist()
+    progress_bar = st.progress(0.0, text="Refreshing prices...")
+    failures = refresh_tickers(
+        tickers, start_date, end_date, FMP_API_KEY,
+        progress=lambda done, total: progress_bar.progress(done / total, text=f"Downloaded {done}/{total} requests"),
+    )
+    progress_bar.empty()
+    combined_df = load_panel(tickers, start_date, end_date)
+
+    if failures:
+        st.warning("⚠️ Failed to fetch data for: " +
+                   ", ".join(f"{t} ({reason})" for t, reason in failures.items()))
+
+    if combined_df.empty:
+        st.error("❌ No historical data could be downloaded.")
+        st.stop()
     else:
-        combined_df = pd.DataFrame()
-        for ticker in df_etfs["Ticker"]:
-            df = fetch_fmp_prices(ticker, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
-            if not df.empty:
-                if combined_df.empty:
-                    combined_df = df
-                else:
-                    combined_df = combined_df.join(df, how="outer")
-
-        if combined_df.empty:
-            st.error("❌ No historical data could be downloaded.")
-            st.stop()
-        else:
-            combined_df.reset_index(inplace=True)
-            combined_df.to_csv(csv_path, index=False)
-            st.session_state["price_data"] = combined_df
-            st.success(f"✅ Historical data downloaded and saved to: {csv_path}")
+        save_client_manifest(client_name, tickers, start_date, end_date, panel=combined_df)
+        combined_df.reset_index(inplace=True)
+        st.session_state["price_data"] = combined_df
+        st.success(f"✅ Historical data refreshed for {len(tickers) - len(failures)} tickers.")
 
 # Download Historical Data json
 #-----------------------------------
@@ -180,22 +217,13 @@ if st.button("📂 Use Last Downloaded Data"):
         st.error("❌ Client profile not found.")
         st.stop()
 
-    client_name = st.session_state["client_profile"]["name"].replace(" ", "_")
-    folder_path = f"data/clients/{client_name}"
-
     try:
-        csv_files = [f for f in os.listdir(folder_path) if f.startswith(client_name) and f.endswith(".csv")]
-        if not csv_files:
-            st.warning("⚠️ No historical data files found for this client.")
+        combined_df = load_client_panel(st.session_state["client_profile"]["name"])
+        if combined_df.empty:
+            st.warning("⚠️ No historical data found for this client.")
         else:
-            # Sort files by date extracted from filename
-            csv_files.sort(reverse=True)  # Latest should be first assuming ISO date
-            latest_file = csv_files[0]
-            latest_path = os.path.join(folder_path, latest_file)
-
-            combined_df = pd.read_csv(latest_path, parse_dates=["date"])
-            st.session_state["price_data"] = combined_df
-            st.success(f"✅ Loaded historical data from: {latest_file}")
+            st.session_state["price_data"] = combined_df.reset_index()
+            st.success(f"✅ Loaded historical data for {combined_df.shape[1]} tickers.")
     except Exception as e:
         st.error(f"❌ Failed to load historical data: {e}")
 
@@ -212,38 +240,44 @@ if st.session_state["price_data"] is None:
 
 prices = st.session_state["price_data"].set_index("date")
 returns = prices.pct_change().dropna()
+warm_pool()  # no-op after the first call in this process
 
 if st.button("🚀 Run Multi-Objective Optimization"):
     st.session_state["just_ran_optimization"] = True
     st.session_state["opt_run"] = False
 
     objectives = ["Sharpe", "MinRisk", "Utility", "MaxRet"]
-    port = rp.Portfolio(returns=returns, sht=False)
-    port.assets_stats(method_mu="hist", method_cov="hist")
+    # Solved problems come from the optimization cache, so re-running on unchanged prices is instant
+    port = optimization_cache.portfolio(returns, sht=False)
     n_assets = returns.shape[1]
     weights_dict = {}
     performance_data = []
-    risk_lambda = float(st.session_state.get("risk_lambda", 2))
+    risk_lambda = float(st.session_state.get("risk_lambda")
+                        or st.session_state.get("client_profile", {}).get("risk_lambda") or 2)
 
-    for obj in objectives:
-        try:
-            kwargs = dict(model="Classic", rm="MAD", hist=True)
-            if obj == "Utility":
-                kwargs["l"] = risk_lambda
-            if obj == "Sharpe":
-                kwargs["rf"] = 0.00
-            w = port.optimization(obj=obj, **kwargs)
-
-            if w is not None and not w.empty:
-                weights_dict[obj] = w.squeeze()
-                w_arr = w.values.reshape(-1).astype(float)
-                ret = float(np.dot(port.mu, w_arr))
-                vol = float(np.sqrt(np.dot(w_arr.T, np.dot(port.cov, w_arr))))
-                performance_data.append({"Objective": obj, "Return": ret, "Volatility": vol})
-        except Exception as e:
-            st.warning(f"⚠️ Optimization failed for {obj}: {e}")
+    # The objectives are independent solves, so they run side by side in the worker pool
+    results, wall_time = solve_objectives(returns, objectives, model="Classic", rm="MAD", rf=0.00, l=risk_lambda,
+                                          hist=True, sht=False)
 
-            print(f"Optimization result for {obj}:\n{w}")
+    for obj in objectives:
+        w = results[obj]["weights"]
+        if results[obj]["error"]:
+            st.warning(f"⚠️ Optimization failed for {obj}: {results[obj]['error']}")
+        elif w is not None and not w.empty:
+            weights_dict[obj] = w.squeeze()
+            w_arr = w.values.reshape(-1).astype(float)
+            ret = float(np.dot(port.mu, w_arr))
+            vol = float(np.sqrt(np.dot(w_arr.T, np.dot(port.cov, w_arr))))
+            performance_data.append({"Objective": obj, "Return": ret, "Volatility": vol})
+
+    timings = pd.DataFrame({
+        "Seconds": [results[obj]["seconds"] for obj in objectives],
+        "Source": ["cache" if results[obj]["cached"] else "solved" for obj in objectives]
+    }, index=objectives)
+    st.session_state["opt_timings"] = timings
+    st.caption(f"⏱️ Solved in {wall_time:.2f}s wall time (slowest objective {timings['Seconds'].max():.2f}s).")
+    with st.expander("⏱️ Solve times by objective"):
+        st.dataframe(timings.style.format({"Seconds": "{:.3f}"}), use_container_width=True)
 
     # Equal Weighted
     # -----------------------------------
@@ -260,34 +294,25 @@ if st.button("🚀 Run Multi-Objective Optimization"):
     st.session_state["port"] = port
     st.session_state["opt_run"] = True
 
-    # Saving to  json
+    # Saving to the client store
     # -----------------------------------
     if "client_profile" in st.session_state:
         client = st.session_state["client_profile"]
         client_name = client["name"]
-        folder_name = client_name.replace(" ", "_")
-        client_dir = f"data/clients/{folder_name}"
-        json_file = f"{client_dir}/{folder_name}.json"
 
         try:
-            if os.path.exists(json_file):
-                with open(json_file, "r") as f:
-                    client_data = json.load(f)
-            else:
-                client_data = client  # fallback if file doesn't exist
+            if not client_store.client_exists(client_name):
+                client_store.save_profile(client_name, client)  # fallback if the client was never saved
 
             perf_dict = perf_df.round(4).to_dict("index")
             weights_serialized = {k: v.round(4).to_dict() for k, v in weights_dict.items()}
 
-            client_data["Quantitative Portfolios Performance"] = {
+            client_store.save_optimization_runs(client_name, {
                 obj: {
                     "Weights": weights_serialized[obj],
                     "Metrics": perf_dict[obj]
                 } for obj in weights_dict.keys()
-            }
-
-            with open(json_file, "w") as f:
-                json.dump(client_data, f, indent=4)
+            })
 
             st.success("📊 Optimization results saved to client profile.")
         except Exception as e:
@@ -343,6 +368,38 @@ if st.session_state.get("opt_run"):
             st.metric("Volatility", f"{selected_perf['Volatility']:.2%}")
             st.metric("Sharpe Ratio", f"{selected_perf['Sharpe Ratio']:.2f}")
 
+        # Score every ETF in the covariance store against this allocation, no re-optimization
+        with st.expander("🔍 Marginal Contribution Scan"):
+            s1, s2, s3 = st.columns(3)
+            with s1:
+                scan_alpha = st.slider("Allocation to candidate (%)", 1, 25, 5) / 100
+            with s2:
+                scan_objective = st.radio("Rank by", ["sharpe", "risk"], horizontal=True,
+                                          format_func={"sharpe": "Sharpe improvement", "risk": "Risk reduction"}.get)
+            with s3:
+                scan_limit = st.number_input("Show top", min_value=5, max_value=500, value=25, step=5)
+
+            scan_start = time.perf_counter()
+            scan_df, scan_dropped, scan_summary = scan_candidates(selected_weights.to_dict(), alpha=scan_alpha,
+                                                                  objective=scan_objective, limit=int(scan_limit))
+            scan_ms = (time.perf_counter() - scan_start) * 1e3
+            if not scan_summary:
+                st.info("ℹ️ The covariance store and ETF statistics are built by the nightly refresh.")
+            elif scan_df.empty:
+                st.warning("⚠️ No ETF could be scored against this portfolio.")
+            else:
+                st.caption(f"Scored {scan_summary['candidates']} ETFs in {scan_ms:.0f} ms against "
+                           f"return {scan_summary['return']:.2%}, volatility {scan_summary['volatility']:.2%}, "
+                           f"Sharpe {scan_summary['sharpe']:.2f} (annualized, last {COV_YEARS} years)")
+                st.dataframe(scan_df.style.format({
+                    "expected_return": "{:.2%}", "volatility": "{:.2%}", "corr_with_portfolio": "{:.2f}",
+                    "new_return": "{:.2%}", "new_volatility": "{:.2%}", "new_sharpe": "{:.2f}",
+                    "delta_sharpe": "{:+.3f}", "delta_volatility": "{:+.2%}"
+                }), use_container_width=True, hide_index=True)
+            if scan_dropped:
+                st.caption("Left out of the scan: "
+                           + "; ".join(f"{t} ({reason})" for t, reason in scan_dropped.items()))
+
         if st.button("💾 Save Allocation and Generate Report"):
             success = save_selected_portfolio(
                 name=selection,
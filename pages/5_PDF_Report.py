@@ -11,7 +11,6 @@ from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from io import BytesIO
 from PyPDF2 import PdfReader, PdfWriter
-import json
 import os
 import re
 import matplotlib.pyplot as plt
@@ -28,6 +27,10 @@ import seaborn as sns
 import numpy as np
 import scipy.stats as stats
 import bt
+from utils.price_store import load_client_price_panel
+from utils.client_store import get_client
+from utils.etf_metadata import hydrate_etfs
+from utils import optimization_cache
 # from reportlab.pdfbase.ttfonts import TTFont
 # from reportlab.pdfbase import pdfmetrics
 #
@@ -56,23 +59,21 @@ TEXT_COLOR = HexColor("#000000")
 
 
 #======================================================================================================================
-# Calling Json File for Client
+# Loading the Client
 #======================================================================================================================
 client_data = {}
 objective_commentary = ""
 
 if "client_profile" in st.session_state:
     client_name = st.session_state["client_profile"]["name"]
-    folder_name = client_name.replace(" ", "_")
-    client_file = f"data/clients/{folder_name}/{folder_name}.json"
+    stored = get_client(client_name)
 
-    if os.path.exists(client_file):
-        with open(client_file, "r") as f:
-            client_data = json.load(f)
+    if stored is not None:
+        client_data = stored
         st.session_state["client_data"] = client_data
         objective_commentary = client_data.get("final_objective_text", "")
     else:
-        st.error(f"❌ Client JSON file not found at: {client_file}")
+        st.error(f"❌ Client not found in the client store: {client_name}")
 else:
     st.error("❌ No client profile found in session state.")
 
@@ -227,35 +228,6 @@ def draw_table(c, x, y, col_widths, headers, rows, table_title, zebra_color, new
     return y - LINE_HEIGHT * 1.5
 
 
-# Last Downloaded CSV File
-#,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
-def load_latest_client_csv():
-    """Loads the latest historical CSV for the active client. Returns (df, filename) or (None, None)."""
-    if "client_profile" not in st.session_state:
-        st.error("❌ Client profile not found.")
-        return None, None
-
-    client_name = st.session_state["client_profile"]["name"].replace(" ", "_")
-    folder_path = f"data/clients/{client_name}"
-
-    try:
-        csv_files = [f for f in os.listdir(folder_path) if f.startswith(client_name) and f.endswith(".csv")]
-        if not csv_files:
-            st.warning("⚠️ No historical data files found for this client.")
-            return None, None
-
-        csv_files.sort(reverse=True)
-        latest_file = csv_files[0]
-        latest_path = os.path.join(folder_path, latest_file)
-
-        df = pd.read_csv(latest_path, parse_dates=["date"])
-        df.set_index("date", inplace=True)  # ✅ Set index so comparisons work
-        return df, latest_file
-
-    except Exception as e:
-        st.error(f"❌ Failed to load historical data: {e}")
-        return None, None
-
 # Text Wrapping over pages
 #,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
 def draw_wrapped_text(c, text, y_pos, indent=0, font_name=FONT_NAME, font_size=12, font_color=TEXT_COLOR):
@@ -671,28 +643,14 @@ def generate_continuous_pdf(inv_note, executive_summary, macro_perspective, asse
     from textwrap import wrap
     import matplotlib.dates as mdates
     zebra_color = HexColor("#f5e8c4")
-    etfs = client_data.get("selected_etfs", [])
-    client_name = client_data.get("name", "").replace(" ", "_")
-
-    def load_latest_client_csv():
-        folder_path = f"data/clients/{client_name}"
-        csv_files = [f for f in os.listdir(folder_path) if f.startswith(client_name) and f.endswith(".csv")]
-        if not csv_files:
-            return pd.DataFrame(), None
-        csv_files.sort(reverse=True)
-        latest_path = os.path.join(folder_path, csv_files[0])
-        try:
-            price_df = pd.read_csv(latest_path, parse_dates=["date"]).set_index("date")
-        except:
-            price_df = pd.DataFrame()
-        return price_df, latest_path
-
-    price_df, csv_path = load_latest_client_csv()
+    # Metadata is only read here, from the versioned snapshots the selection references
+    etfs = hydrate_etfs(client_data.get("selected_etfs", []))
 
+    # Memory-mapped panel: the 3-year window is a binary search on the date index, not a parse plus mask
     try:
-        number_years = date.today() - pd.DateOffset(years=3)
-        price_df = price_df[price_df.index >= number_years]
-    except:
+        price_panel = load_client_price_panel(client_data.get("name", ""))
+        price_df = optimization_cache.report_prices(price_panel) if price_panel is not None else pd.DataFrame()
+    except Exception:
         price_df = pd.DataFrame()
 
     indent_x = LEFT_MARGIN + 20
@@ -876,12 +834,9 @@ def generate_continuous_pdf(inv_note, executive_summary, macro_perspective, asse
 
 
     try:
-        price_df, latest_file = load_latest_client_csv()
-        if price_df is None:
+        if price_df.empty:
             raise ValueError("No historical price data available.")
 
-        price_df = price_df[price_df.index >= number_years]
-
         # === Compute ETF Stats
         # ,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
         stats_rows = []
@@ -1468,21 +1423,22 @@ def generate_continuous_pdf(inv_note, executive_summary, macro_perspective, asse
 
         returns = price_df.pct_change().dropna()
 
-        port = rp.Portfolio(returns=returns)
-        port.assets_stats(method_mu='hist', method_cov='hist')
+        # Same window and parameters the Optimization page solves on save, so these are usually cache hits
+        model = optimization_cache.REPORT_PARAMS["model"]
+        rm = optimization_cache.REPORT_PARAMS["rm"]
+        hist = optimization_cache.REPORT_PARAMS["hist"]
+        rf = optimization_cache.REPORT_PARAMS["rf"]
+        sht = optimization_cache.REPORT_PARAMS["sht"]
+        l = optimization_cache.REPORT_L
+        points = optimization_cache.REPORT_POINTS
 
-        model = 'Classic'
-        rm = 'MAD'
-        hist = True
-        rf = 0
-        l = 0
-        points = 50
+        port = optimization_cache.portfolio(returns, sht=sht)
 
         selected_portfolio = client_data.get("Selected Portfolio", {})
         obj = selected_portfolio.get("Name", "Sharpe")
 
         if obj in ["Sharpe", "MinRisk", "Utility", "MaxRet"]:
-            w = port.optimization(model=model, rm=rm, obj=obj, rf=rf, l=l, hist=hist)
+            w = optimization_cache.optimize(returns, obj, model=model, rm=rm, rf=rf, l=l, hist=hist, sht=sht)
             w_series = w.squeeze()
             w_vector = w_series.reindex(returns.columns, fill_value=0).values.flatten()
 
@@ -1514,7 +1470,7 @@ def generate_continuous_pdf(inv_note, executive_summary, macro_perspective, asse
         else:
             print("⚠ Unrecognized portfolio, defaulting to Sharpe.")
             obj = "Sharpe"
-            w = port.optimization(model=model, rm=rm, obj=obj, rf=rf, l=l, hist=hist)
+            w = optimization_cache.optimize(returns, obj, model=model, rm=rm, rf=rf, l=l, hist=hist, sht=sht)
             w_series = w.squeeze()
             w_vector = w_series.reindex(returns.columns, fill_value=0).values.flatten()
 
@@ -1525,7 +1481,8 @@ def generate_continuous_pdf(inv_note, executive_summary, macro_perspective, asse
 
         # Calculating and plotting the efficient frontier points
         # ,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
-        frontier = port.efficient_frontier(model=model, rm=rm, points=points, rf=rf, hist=hist)
+        frontier = optimization_cache.efficient_frontier(returns, model=model, rm=rm, points=points, rf=rf, hist=hist,
+                                                        sht=sht)
 
         # Plot frontier
         ax = rp.plot_frontier(w_frontier=frontier, mu=port.mu, cov=port.cov, returns=returns,
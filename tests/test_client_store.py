@@ -0,0 +1,102 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from utils import client_store, price_store
+
+
+def _fields(history):
+    return [h["field"] for h in history]
+
+
+def test_new_client_does_not_inherit_deleted_clients_journal(tmp_path):
+    db = str(tmp_path / "clients.db")
+    client_store.save_profile("Alice A", {"email": "alice@example.com"}, db)
+    client_store.save_profile("Bob B", {"email": "bob@example.com"}, db)
+    client_store.save_optimization_runs("Bob B", {"Sharpe": {"Weights": {"SPY": 1.0}, "Metrics": {}}}, db)
+    bob_id = client_store._client_id(client_store.connect(db), "Bob B")
+
+    assert client_store.delete_client("Bob B", db, clients_dir=str(tmp_path / "clients"))
+    client_store.save_profile("Carol C", {"email": "carol@example.com"}, db)
+
+    carol_id = client_store._client_id(client_store.connect(db), "Carol C")
+    assert carol_id != bob_id
+    history = client_store.client_history("Carol C", db_path=db)
+    assert "deleted" not in _fields(history)
+    assert "optimization_runs.Sharpe" not in _fields(history)
+    assert {"field": "email", "value": "bob@example.com"} not in [
+        {"field": h["field"], "value": h["value"]} for h in history]
+
+
+def test_upgrade_detaches_journal_of_reused_ids(tmp_path):
+    db = str(tmp_path / "clients.db")
+    legacy = sqlite3.connect(db)
+    schema = client_store.SCHEMA.replace("INTEGER PRIMARY KEY AUTOINCREMENT,\n    folder",
+                                         "INTEGER PRIMARY KEY,\n    folder")
+    legacy.executescript(schema)
+    legacy.execute("PRAGMA user_version = 1")
+    # Bob (id 2) was deleted and Carol was then given his id, as a plain rowid table does
+    legacy.execute("INSERT INTO clients (id, folder, name, created_at, updated_at) "
+                   "VALUES (1, 'Alice_A', 'Alice A', 't', 't'), (2, 'Carol_C', 'Carol C', 't', 't')")
+    legacy.executemany("INSERT INTO client_journal (client_id, field, value, changed_at) VALUES (?, ?, ?, 't')",
+                       [(2, "email", '"bob@example.com"'), (2, "deleted", '"Bob B"'),
+                        (2, "created", '"Carol C"'), (2, "email", '"carol@example.com"')])
+    legacy.execute("INSERT INTO selections (client_id, position, ticker, entry) VALUES (2, 0, 'SPY', '{}')")
+    legacy.commit()
+    legacy.close()
+
+    conn = client_store.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == client_store.SCHEMA_VERSION
+    assert _fields(client_store.client_history("Carol C", db_path=db)) == ["email", "created"]
+    assert client_store.get_client("Carol C", db)["selected_etfs"] == [{}]
+
+    client_store.delete_client("Carol C", db, clients_dir=str(tmp_path / "clients"))
+    client_store.save_profile("Dan D", {}, db)
+    assert client_store._client_id(conn, "Dan D") == 3
+    assert _fields(client_store.client_history("Dan D", db_path=db)) == ["created"]
+
+
+def test_renamed_client_keeps_its_price_panel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the price manifest and panels live under the relative data/ tree
+    db = str(tmp_path / "clients.db")
+    client_store.save_profile("Alice A", {"email": "alice@example.com"}, db)
+    prices = pd.DataFrame({"SPY": [100.0, 101.0, 99.5]}, index=pd.bdate_range("2024-01-02", periods=3, name="date"))
+    price_store.save_client_manifest("Alice A", ["SPY"], "2024-01-02", "2024-01-04", panel=prices)
+
+    client_store.save_profile("Alice A", {"name": "Alice B"}, db)
+
+    assert not os.path.exists(os.path.join(client_store.CLIENTS_DIR, "Alice_A"))
+    panel = price_store.load_client_price_panel("Alice B")
+    assert panel is not None
+    assert panel.to_frame()["SPY"].tolist() == [100.0, 101.0, 99.5]
+
+
+def test_failed_directory_move_rolls_back_the_rename(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = str(tmp_path / "clients.db")
+    client_store.save_profile("Alice A", {}, db)
+    price_store.save_client_manifest("Alice A", ["SPY"], "2024-01-02", "2024-01-04")
+    os.makedirs(os.path.join(client_store.CLIENTS_DIR, "Alice_B"))  # left behind by an earlier client
+
+    with pytest.raises(client_store.ClientStoreError):
+        client_store.save_profile("Alice A", {"name": "Alice B"}, db)
+
+    assert client_store.client_exists("Alice A", db) and not client_store.client_exists("Alice B", db)
+    assert price_store.load_client_manifest("Alice A")["tickers"] == ["SPY"]
+
+
+def test_journal_mode_follows_the_setting_and_the_filesystem(tmp_path, monkeypatch):
+    monkeypatch.setattr(client_store, "JOURNAL_MODE", "AUTO")
+    monkeypatch.setattr(client_store, "_on_network_fs", lambda path: True)
+    db = str(tmp_path / "share.db")
+    assert client_store.connect(db).execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+    monkeypatch.setattr(client_store, "_on_network_fs", lambda path: False)
+    db = str(tmp_path / "local.db")
+    assert client_store.connect(db).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    monkeypatch.setattr(client_store, "JOURNAL_MODE", "TRUNCATE")
+    db = str(tmp_path / "forced.db")
+    assert client_store.connect(db).execute("PRAGMA journal_mode").fetchone()[0] == "truncate"
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from utils.covariance_store import CovarianceStore
+from utils.marginal_scan import scan_candidates
+
+
+def _store_and_stats(tickers, missing_pairs=()):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0004, 0.01, (500, len(tickers)))
+    cov = np.cov(returns, rowvar=False)
+    for a, b in missing_pairs:
+        i, j = tickers.index(a), tickers.index(b)
+        cov[i, j] = cov[j, i] = np.nan
+    corr = cov / np.sqrt(np.outer(np.diag(cov), np.diag(cov)))
+    stats = pd.DataFrame({"symbol": tickers, "annual_return": np.linspace(0.02, 0.12, len(tickers))})
+    return CovarianceStore(cov, corr, tickers, {}), stats
+
+
+def test_holding_without_overlap_is_reported_not_fatal():
+    tickers = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+    store, stats = _store_and_stats(tickers, missing_pairs=[("BBB", "CCC")])
+    ranked, dropped, summary = scan_candidates({"AAA": 0.4, "BBB": 0.3, "CCC": 0.2, "CASH": 0.1},
+                                               limit=None, store=store, stats=stats)
+
+    assert list(dropped) == ["BBB"]
+    assert "CCC" in dropped["BBB"]
+    assert np.isfinite(summary["volatility"])
+    assert set(ranked["symbol"]) >= {"DDD", "EEE"}
+
+
+def test_unknown_holding_is_reported():
+    store, stats = _store_and_stats(["AAA", "BBB", "CCC"])
+    ranked, dropped, summary = scan_candidates({"AAA": 0.5, "ZZZ": 0.5}, limit=None, store=store, stats=stats)
+    assert list(dropped) == ["ZZZ"]
+    assert summary["candidates"] == len(ranked) == 3
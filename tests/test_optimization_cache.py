@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+import riskfolio as rp
+
+from utils import optimization_cache
+from utils.panel_store import PricePanel
+
+
+@pytest.fixture
+def panel(tmp_path, monkeypatch):
+    """Five years of synthetic closes for four tickers, with the optimization cache kept under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(optimization_cache, "_memory", optimization_cache.OrderedDict())
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=5 * 252, name="date")
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0004, 0.01, size=(len(dates), 4)) + np.array([0.0, 0.0002, -0.0001, 0.0003])
+    closes = pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=dates, columns=["SPY", "QQQ", "TLT", "GLD"])
+    return PricePanel.from_frame(closes)
+
+
+@pytest.mark.parametrize("obj", ["Sharpe", "Utility"])
+def test_report_after_saved_allocation_is_served_from_cache(panel, monkeypatch, obj):
+    optimization_cache.warm_report(panel, obj)
+    optimization_cache._memory.clear()  # the report may run in another process; the disk entries must do
+
+    def unsolved(*args, **kwargs):
+        raise AssertionError("the report re-solved a problem the Optimization page had cached")
+
+    monkeypatch.setattr(rp.Portfolio, "optimization", unsolved)
+    monkeypatch.setattr(rp.Portfolio, "efficient_frontier", unsolved)
+
+    # What pages/5_PDF_Report.py does for the selected portfolio
+    price_df = optimization_cache.report_prices(panel)
+    returns = price_df.pct_change().dropna()
+    params = optimization_cache.REPORT_PARAMS
+    w = optimization_cache.optimize(returns, obj, model=params["model"], rm=params["rm"], rf=params["rf"],
+                                    l=optimization_cache.REPORT_L, hist=params["hist"], sht=params["sht"])
+    frontier = optimization_cache.efficient_frontier(returns, model=params["model"], rm=params["rm"],
+                                                     points=optimization_cache.REPORT_POINTS, rf=params["rf"],
+                                                     hist=params["hist"], sht=params["sht"])
+    assert w is not None and list(w.index) == ["SPY", "QQQ", "TLT", "GLD"]
+    assert frontier.shape == (4, optimization_cache.REPORT_POINTS)
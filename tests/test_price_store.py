@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from utils import panel_store, price_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A price store in tmp_path whose FMP fetches are served from a synthetic daily series and recorded."""
+    monkeypatch.setattr(price_store, "PRICE_STORE_DIR", str(tmp_path / "prices"))
+    calls = []
+
+    def fetch_price_jobs(jobs, api_key, max_workers=None, progress=None):
+        calls.extend(jobs)
+        results = []
+        for ticker, start, end in jobs:
+            dates = pd.bdate_range(start, end, name="date")
+            results.append((pd.DataFrame({ticker: range(len(dates))}, index=dates, dtype=float), None))
+        return results
+
+    monkeypatch.setattr(price_store, "fetch_price_jobs", fetch_price_jobs)
+    return calls
+
+
+def test_request_after_checked_range_leaves_no_gap(store):
+    price_store.refresh_tickers(["SPY"], date(2020, 1, 1), date(2021, 12, 31), "key")
+    price_store.refresh_tickers(["SPY"], date(2024, 1, 1), date(2025, 1, 1), "key")
+    assert store[-1] == ("SPY", "2022-01-01", "2025-01-01")
+
+    store.clear()
+    price_store.refresh_tickers(["SPY"], date(2020, 1, 1), date(2025, 1, 1), "key")
+    assert store == []
+    panel = price_store.load_panel(["SPY"], "2022-01-01", "2023-12-31")
+    assert len(panel) == len(pd.bdate_range("2022-01-01", "2023-12-31"))
+
+
+def test_request_before_checked_range_backfills_up_to_it(store):
+    price_store.refresh_tickers(["SPY"], date(2024, 1, 1), date(2025, 1, 1), "key")
+    price_store.refresh_tickers(["SPY"], date(2020, 1, 1), date(2021, 12, 31), "key")
+    assert store[-1] == ("SPY", "2020-01-01", "2023-12-31")
+    assert len(price_store.load_panel(["SPY"], "2022-01-01", "2023-12-31")) > 0
+
+
+def test_concurrent_processes_keep_each_others_index_entries(tmp_path, monkeypatch):
+    # Each process merges its own tickers into the index one at a time, as the nightly CLI and the app do
+    script = (
+        "import sys\n"
+        "from utils import price_store\n"
+        "price_store.PRICE_STORE_DIR = sys.argv[1]\n"
+        "for i in range(40):\n"
+        "    price_store._update_index({f'{sys.argv[2]}{i}': {'checked': '2024-01-01'}})\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    procs = [subprocess.Popen([sys.executable, "-c", script, str(tmp_path), prefix], cwd=root)
+             for prefix in ("A", "B", "C", "D")]
+    assert [p.wait() for p in procs] == [0] * len(procs)
+
+    monkeypatch.setattr(price_store, "PRICE_STORE_DIR", str(tmp_path))
+    assert len(price_store.load_index()) == 4 * 40
+
+
+def test_prune_keeps_panels_a_client_manifest_references(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(panel_store, "PANEL_DIR", str(tmp_path / "panels"))
+    price_store.refresh_tickers(["SPY", "QQQ"], date(2024, 1, 1), date(2024, 6, 30), "key")
+    price_store.save_client_manifest("Alice A", ["SPY"], "2024-01-01", "2024-06-30",
+                                     panel=price_store.load_panel(["SPY"], "2024-01-01", "2024-06-30"))
+    referenced = price_store.panel_key(["SPY"], "2024-01-01", "2024-06-30")
+    orphan = price_store.panel_key(["QQQ"], "2024-01-01", "2024-06-30")
+    panel_store.save_price_panel(orphan, price_store.load_panel(["QQQ"], "2024-01-01", "2024-06-30"))
+    old = time.time() - 30 * 24 * 3600
+    for key in (referenced, orphan):
+        os.utime(os.path.join(panel_store.PANEL_DIR, key), (old, old))
+
+    panel_store.prune_panels(in_use=price_store.referenced_panel_keys)
+
+    assert panel_store.load_price_panel(orphan) is None
+    assert panel_store.load_price_panel(referenced) is not None  # checked first: loading the client rebuilds it
+    assert price_store.load_client_price_panel("Alice A").to_frame()["SPY"].notna().all()
@@ -0,0 +1,283 @@
+# utils/client_bulk.py
+#
+# Bulk import and export of client books (CSV or Excel), streamed row by row through the client store.
+#   python -m utils.client_bulk import book.xlsx [--sheet Clients] [--update] [--batch-size 500]
+#   python -m utils.client_bulk export book.csv           (or .xlsx)
+#
+# One row per client; columns in any order, unknown columns ignored:
+#   name (required), email, phone, country, company
+#   one column per questionnaire question, headed by the question text or Q1..Q14; a fully answered
+#       questionnaire is scored like the Questionnaire page (risk score, level, lambda, short/leverage)
+#   alloc:<Asset Class>   current allocation in percent, e.g. alloc:Equities; any remainder becomes Cash
+#   etfs                  selected tickers separated by ";" or ","; name and asset class come from the universe
+# Exports carry the same columns plus the stored risk_score, risk_level and risk_lambda (ignored on import).
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import threading
+from itertools import islice
+
+from utils.client_store import (CLIENT_DB, ClientStoreError, batch, client_exists, connect, get_client,
+                                save_current_allocation, save_profile, save_risk_profile, save_selected_etfs)
+from utils.risk_profile import QUESTIONS, risk_profile
+from utils.universe import ASSET_CLASS_MAP, UniverseError, get_universe
+
+
+#======================================================================================================================
+# Book Layout
+#======================================================================================================================
+CONTACT_COLUMNS = ["name", "email", "phone", "country", "company"]
+RISK_COLUMNS = ["risk_score", "risk_level", "risk_lambda"]
+ALLOC_PREFIX = "alloc:"
+ALLOC_CLASSES = list(ASSET_CLASS_MAP) + ["Cash"]
+ETF_COLUMN = "etfs"
+
+# Clients written per transaction
+BATCH_SIZE = 500
+
+
+def book_columns():
+    return (CONTACT_COLUMNS + RISK_COLUMNS + [q for q, _ in QUESTIONS]
+            + [ALLOC_PREFIX + c for c in ALLOC_CLASSES] + [ETF_COLUMN])
+
+
+#======================================================================================================================
+# Reading
+#======================================================================================================================
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def _excel_rows(path, sheet_name=None):
+    import openpyxl
+
+    # read_only streams the sheet instead of building the whole workbook in memory
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = ["" if h is None else str(h) for h in next(rows, [])]
+        for values in rows:
+            if any(v is not None for v in values):
+                yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def read_book(path, sheet_name=None):
+    """Lazily yield one {column: value} dict per client row."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _csv_rows(path)
+    if ext in (".xlsx", ".xlsm"):
+        return _excel_rows(path, sheet_name)
+    raise ClientStoreError(f"Unsupported book format '{ext}'; use .csv or .xlsx.")
+
+
+def _cell(row, key):
+    value = row.get(key)
+    if value is None:
+        return ""
+    # Excel hands back phone numbers and whole percentages as floats
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_row(row):
+    """(name, contact fields, answers, allocation, tickers) from one book row; ClientStoreError if invalid."""
+    row = {str(k).strip(): v for k, v in row.items() if k is not None}
+    name = _cell(row, "name")
+    if not name:
+        raise ClientStoreError("missing name")
+    contact = {f: _cell(row, f) for f in CONTACT_COLUMNS[1:] if _cell(row, f)}
+
+    answers = {}
+    for i, (question, options) in enumerate(QUESTIONS, start=1):
+        answer = _cell(row, question) or _cell(row, f"Q{i}")
+        if not answer:
+            continue
+        if answer not in options:
+            raise ClientStoreError(f"Q{i}: '{answer}' is not one of {options}")
+        answers[question] = answer
+    if 0 < len(answers) < len(QUESTIONS):
+        raise ClientStoreError(f"questionnaire has {len(answers)} of {len(QUESTIONS)} answers")
+
+    allocation = {}
+    for key in row:
+        if key.lower().startswith(ALLOC_PREFIX) and _cell(row, key):
+            try:
+                pct = float(_cell(row, key).rstrip("%"))
+            except ValueError:
+                raise ClientStoreError(f"{key}: '{_cell(row, key)}' is not a percentage")
+            if pct > 0:
+                allocation[key[len(ALLOC_PREFIX):].strip()] = pct
+    total = sum(allocation.values())
+    if total > 100:
+        raise ClientStoreError(f"allocation adds up to {total:.2f}%")
+    if allocation and total < 100 and "Cash" not in allocation:
+        allocation["Cash"] = round(100 - total, 2)
+
+    tickers = [t.strip().upper() for t in re.split(r"[;,]", _cell(row, ETF_COLUMN)) if t.strip()]
+    return name, contact, answers, allocation, list(dict.fromkeys(tickers))
+
+
+def _etf_entries(tickers):
+    """{ticker: selected-ETF entry} named and classified from the universe; unknown tickers are marked N/A."""
+    entries = {t: {"Name": t, "Ticker": t, "Asset Class": "N/A"} for t in tickers}
+    if not tickers:
+        return entries
+    try:
+        universe = get_universe()
+    except UniverseError:
+        return entries
+    found = universe.rows(universe.positions(sorted(tickers)))
+    for symbol, name, asset_class in zip(found["symbol"], found["name"], found["Asset Class"]):
+        entries[symbol] = {"Name": name, "Ticker": symbol, "Asset Class": asset_class or "N/A"}
+    return entries
+
+
+#======================================================================================================================
+# Import
+#======================================================================================================================
+def _save_client(name, contact, answers, allocation, etfs, db_path):
+    save_profile(name, contact, db_path)
+    if answers:
+        profile = risk_profile(answers)
+        save_risk_profile(name, profile["risk_score"], profile["risk_level"], profile["risk_lambda"], answers,
+                          profile["allow_short"], profile["allow_leverage"], db_path)
+    if allocation:
+        save_current_allocation(name, allocation, db_path)
+    if etfs:
+        save_selected_etfs(name, etfs, db_path)
+
+
+def import_book(path, sheet_name=None, update=False, batch_size=BATCH_SIZE, db_path=CLIENT_DB):
+    """
+    Stream a book into the client store, batch_size clients per transaction. Existing clients are skipped unless
+    `update`, which overwrites the fields the row provides. A bad row is reported and rolled back on its own
+    (savepoint) without failing its batch. Returns {"imported", "updated", "skipped", "failed": {row: error},
+    "unknown_tickers": [...]}.
+    """
+    summary = {"imported": 0, "updated": 0, "skipped": 0, "failed": {}, "unknown_tickers": set()}
+    rows = enumerate(read_book(path, sheet_name), start=2)  # row 1 is the header
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        parsed = []
+        for line, row in chunk:
+            try:
+                parsed.append((line, parse_row(row)))
+            except ClientStoreError as e:
+                summary["failed"][line] = str(e)
+        entries = _etf_entries({t for _, record in parsed for t in record[4]})
+
+        with batch(db_path) as conn:
+            for line, (name, contact, answers, allocation, tickers) in parsed:
+                exists = client_exists(name, db_path)
+                if exists and not update:
+                    summary["skipped"] += 1
+                    continue
+                conn.execute("SAVEPOINT book_row")
+                try:
+                    _save_client(name, contact, answers, allocation, [entries[t] for t in tickers], db_path)
+                    conn.execute("RELEASE book_row")
+                except (ClientStoreError, sqlite3.IntegrityError) as e:
+                    conn.execute("ROLLBACK TO book_row")
+                    conn.execute("RELEASE book_row")
+                    summary["failed"][line] = str(e)
+                    continue
+                summary["updated" if exists else "imported"] += 1
+                summary["unknown_tickers"].update(t for t in tickers if entries[t]["Asset Class"] == "N/A")
+
+    summary["unknown_tickers"] = sorted(summary["unknown_tickers"])
+    return summary
+
+
+#======================================================================================================================
+# Export
+#======================================================================================================================
+def iter_book(db_path=CLIENT_DB):
+    """Yield the book one client row at a time (header first); only the current client is ever in memory."""
+    yield book_columns()
+    conn = connect(db_path)
+    # The open cursor pins one read snapshot, so the export is consistent while advisers keep saving
+    for (name,) in conn.execute("SELECT name FROM clients ORDER BY name COLLATE NOCASE"):
+        client = get_client(name, db_path)
+        if client is None:
+            continue
+        answers = client.get("risk_answers", {})
+        allocation = client.get("current_allocation") or {}
+        yield ([client.get(c, "") for c in CONTACT_COLUMNS + RISK_COLUMNS]
+               + [answers.get(q, "") for q, _ in QUESTIONS]
+               + [allocation.get(c, "") for c in ALLOC_CLASSES]
+               + [";".join(etf.get("Ticker", "") for etf in client.get("selected_etfs", []))])
+
+
+def export_book(path, db_path=CLIENT_DB):
+    """Write every client to a .csv or .xlsx book in constant memory; returns the number of clients written."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (".csv", ".xlsx"):
+        raise ClientStoreError(f"Unsupported book format '{ext}'; use .csv or .xlsx.")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    count = -1
+    try:
+        if ext == ".csv":
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                for count, row in enumerate(iter_book(db_path)):
+                    writer.writerow(row)
+        else:
+            import xlsxwriter
+
+            # constant_memory flushes each row to disk as soon as the next one starts
+            workbook = xlsxwriter.Workbook(tmp, {"constant_memory": True})
+            sheet = workbook.add_worksheet("Clients")
+            for count, row in enumerate(iter_book(db_path)):
+                sheet.write_row(count, 0, row)
+            workbook.close()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of client books.")
+    parser.add_argument("--db", default=CLIENT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="create clients from a .csv or .xlsx book")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--sheet", help="Excel sheet (default: the first)")
+    import_cmd.add_argument("--update", action="store_true", help="overwrite clients that already exist")
+    import_cmd.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    export_cmd = sub.add_parser("export", help="write every client to a .csv or .xlsx book")
+    export_cmd.add_argument("path")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            print(f"{export_book(args.path, args.db)} clients written to {args.path}.")
+            return 0
+        summary = import_book(args.path, args.sheet, args.update, args.batch_size, args.db)
+    except (OSError, ClientStoreError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"{summary['imported']} imported, {summary['updated']} updated, {summary['skipped']} skipped, "
+          f"{len(summary['failed'])} failed.")
+    for line, error in summary["failed"].items():
+        print(f"  row {line}: {error}")
+    if summary["unknown_tickers"]:
+        print(f"  not in the universe: {', '.join(summary['unknown_tickers'])}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
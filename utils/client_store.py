@@ -0,0 +1,765 @@
+# utils/client_store.py
+#
+# Client repository: one SQLite database instead of a JSON document per client. Each part of a client (profile,
+# risk answers, ETF selection, optimization runs, selected portfolio) is its own table, so saving one part writes
+# only its rows. A new database imports the legacy data/clients/*/*.json tree on first use.
+#   python -m utils.client_store migrate                  (re-run the import by hand)
+#   python -m utils.client_store migrate --overwrite      (replace clients already in the store)
+#   python -m utils.client_store export [NAME ...]        (JSON snapshots in the legacy layout)
+#   python -m utils.client_store compact                  (also run by the nightly refresh)
+#
+# The database runs in WAL mode, which needs shared memory between every process that opens it, so it only works
+# when they all run on the machine whose local disk holds the file. On a network share (NFS, SMB/CIFS) set
+# CLIENT_DB_JOURNAL_MODE=DELETE; a database found on one is switched to DELETE automatically on Linux and for UNC
+# paths. DELETE mode is safe there but serialises readers against the writer.
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from utils.etf_metadata import hydrate_etfs, split_meta
+
+
+#======================================================================================================================
+# Schema
+#======================================================================================================================
+CLIENT_DB = "data/clients.db"
+CLIENTS_DIR = "data/clients"
+
+# "auto": WAL, or DELETE when the database sits on a network filesystem; any SQLite journal mode is accepted
+JOURNAL_MODE = os.getenv("CLIENT_DB_JOURNAL_MODE", "auto").upper()
+JOURNAL_MODES = {"AUTO", "WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"}
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smbfs", "smb3", "9p", "afs", "ceph", "glusterfs", "fuse.sshfs"}
+
+# PRAGMA user_version of a fully upgraded database; see _upgrade
+SCHEMA_VERSION = 2
+
+# Profile fields kept as columns; anything else found in a legacy document lands in `extra`
+PROFILE_FIELDS = ["name", "email", "phone", "country", "company", "risk_score", "risk_level", "risk_lambda",
+                  "allow_short", "allow_leverage", "current_allocation", "final_objective_text"]
+JSON_FIELDS = {"current_allocation"}
+BOOL_FIELDS = {"allow_short", "allow_leverage"}
+
+CLIENT_PAGE_SIZE = 50
+
+# Journal entries older than this are compacted to each field's latest value
+JOURNAL_KEEP_DAYS = 90
+
+# Pseudo-tickers that appear in saved weights but are not ETFs
+NON_TICKERS = {"CASH"}
+
+SCHEMA = """
+-- AUTOINCREMENT: a plain rowid is handed out again after the highest client is deleted, and the journal, which
+-- outlives deleted clients, would attach their history to whoever took the id
+CREATE TABLE IF NOT EXISTS clients (
+    id                   INTEGER PRIMARY KEY AUTOINCREMENT,
+    folder               TEXT NOT NULL UNIQUE,
+    name                 TEXT NOT NULL,
+    email                TEXT,
+    phone                TEXT,
+    country              TEXT,
+    company              TEXT,
+    risk_score           REAL,
+    risk_level           TEXT,
+    risk_lambda          REAL,
+    allow_short          INTEGER,
+    allow_leverage       INTEGER,
+    current_allocation   TEXT,
+    final_objective_text TEXT,
+    extra                TEXT,
+    created_at           TEXT NOT NULL,
+    updated_at           TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clients_updated_at ON clients (updated_at);
+-- Client manifest: a covering index, so listing, name search and risk-level filters never read the profile rows
+DROP INDEX IF EXISTS clients_risk_level;
+CREATE INDEX IF NOT EXISTS clients_manifest ON clients (name COLLATE NOCASE, risk_level, updated_at);
+
+CREATE TABLE IF NOT EXISTS risk_answers (
+    client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+    position  INTEGER NOT NULL,
+    question  TEXT NOT NULL,
+    answer    TEXT,
+    PRIMARY KEY (client_id, question)
+);
+
+CREATE TABLE IF NOT EXISTS selections (
+    client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+    position  INTEGER NOT NULL,
+    ticker    TEXT NOT NULL,
+    entry     TEXT NOT NULL,
+    PRIMARY KEY (client_id, position)
+);
+CREATE INDEX IF NOT EXISTS selections_ticker ON selections (ticker);
+
+CREATE TABLE IF NOT EXISTS optimization_runs (
+    client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+    objective TEXT NOT NULL,
+    weights   TEXT NOT NULL,
+    metrics   TEXT NOT NULL,
+    run_at    TEXT NOT NULL,
+    PRIMARY KEY (client_id, objective)
+);
+
+CREATE TABLE IF NOT EXISTS selected_portfolios (
+    client_id   INTEGER PRIMARY KEY REFERENCES clients (id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    weights     TEXT NOT NULL,
+    metrics     TEXT NOT NULL,
+    selected_at TEXT NOT NULL
+);
+
+-- Append-only field-level change log (field e.g. "email", "risk_answers.<question>", "selected_portfolio");
+-- no foreign key, so a deleted client's history outlives it until compaction
+CREATE TABLE IF NOT EXISTS client_journal (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id  INTEGER NOT NULL,
+    field      TEXT NOT NULL,
+    value      TEXT,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS client_journal_client ON client_journal (client_id, field, seq);
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+class ClientStoreError(Exception):
+    pass
+
+
+def client_folder(name):
+    """Folder-style key of a client, the identity the JSON tree used (data/clients/<folder>/<folder>.json)."""
+    return name.strip().replace(" ", "_")
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _on_network_fs(path):
+    """Best effort: True for a UNC path or, on Linux, a file under a network mount in /proc/mounts."""
+    path = os.path.abspath(path)
+    if path.startswith("\\\\"):
+        return True
+    try:
+        with open("/proc/mounts", "r") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    # The longest mount point containing the path is the filesystem it lives on
+    containing = [(point, kind) for point, kind in mounts
+                  if path == point or path.startswith(point.rstrip("/") + "/")]
+    return max(containing, key=lambda m: len(m[0]), default=("", ""))[1] in NETWORK_FILESYSTEMS
+
+
+def _journal_mode(db_path):
+    if JOURNAL_MODE not in JOURNAL_MODES:
+        raise ClientStoreError(f"Unknown CLIENT_DB_JOURNAL_MODE '{JOURNAL_MODE}'; use one of {sorted(JOURNAL_MODES)}.")
+    if JOURNAL_MODE != "AUTO":
+        return JOURNAL_MODE
+    return "DELETE" if _on_network_fs(os.path.dirname(db_path) or ".") else "WAL"
+
+
+def connect(db_path=CLIENT_DB):
+    """
+    This thread's connection (Streamlit runs each session on its own thread). The schema is created once per
+    process; a new, empty default database first imports the legacy JSON tree so existing clients carry over.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA journal_mode = {_journal_mode(db_path)}")
+        conns[db_path] = conn
+        with _schema_lock:
+            if db_path not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _upgrade(conn)
+                _schema_ready.add(db_path)
+                empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM clients)").fetchone()[0]
+                if empty and db_path == CLIENT_DB and os.path.isdir(CLIENTS_DIR):
+                    migrate(CLIENTS_DIR, db_path)
+    return conn
+
+
+def _upgrade(conn):
+    """Bring an older database up to SCHEMA_VERSION; each step runs once, in order."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # Selections used to embed each ETF's full metadata; it now lives in the shared snapshot store
+        rows = conn.execute("SELECT client_id, position, entry FROM selections WHERE entry LIKE '%\"meta\"%'")
+        conn.executemany("UPDATE selections SET entry = ? WHERE client_id = ? AND position = ?",
+                         [(json.dumps(split_meta(json.loads(r["entry"]))), r["client_id"], r["position"])
+                          for r in rows.fetchall()])
+    if version < 2:
+        _autoincrement_clients(conn)
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+
+
+def _autoincrement_clients(conn):
+    """
+    Rebuild a `clients` table created without AUTOINCREMENT (SQLite's documented table rebuild), seeding the id
+    sequence past every id the journal has seen, and detach the journal entries of deleted clients whose id was
+    already reused: everything up to a live id's last "deleted" entry belongs to an earlier client.
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'clients'").fetchone()[0]
+    if "AUTOINCREMENT" not in sql.upper():
+        conn.commit()
+        conn.execute("PRAGMA foreign_keys = OFF")  # dropping the old table must not cascade into the child tables
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(re.sub(r"^CREATE TABLE \"?clients\"?", "CREATE TABLE clients_rebuilt", sql).replace(
+                "INTEGER PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", 1))
+            conn.execute("INSERT INTO clients_rebuilt SELECT * FROM clients")
+            conn.execute("DROP TABLE clients")
+            conn.execute("ALTER TABLE clients_rebuilt RENAME TO clients")
+            conn.commit()
+            conn.executescript(SCHEMA)  # recreates the indexes the drop took with it
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+    with conn:
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'clients'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'clients', max(coalesce((SELECT max(id) FROM "
+                     "clients), 0), coalesce((SELECT max(client_id) FROM client_journal), 0))")
+        conn.execute("UPDATE client_journal SET client_id = -client_id WHERE client_id IN (SELECT id FROM clients) "
+                     "AND seq <= (SELECT max(j.seq) FROM client_journal j "
+                     "WHERE j.client_id = client_journal.client_id AND j.field = 'deleted')")
+
+
+#======================================================================================================================
+# Reads
+#======================================================================================================================
+def _client_id(conn, name):
+    row = conn.execute("SELECT id FROM clients WHERE folder = ?", (client_folder(name),)).fetchone()
+    return row["id"] if row else None
+
+
+def list_clients(db_path=CLIENT_DB):
+    return [row["name"] for row in connect(db_path).execute("SELECT name FROM clients ORDER BY name COLLATE NOCASE")]
+
+
+def _manifest_filter(query, risk_level):
+    """WHERE clause and parameters: every whitespace-separated term of `query` in the name, case-insensitive."""
+    clauses, params = [], []
+    for term in (query or "").split():
+        clauses.append("name LIKE ? ESCAPE '\\'")
+        params.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if risk_level:
+        clauses.append("risk_level = ?")
+        params.append(risk_level)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def count_clients(query="", risk_level=None, db_path=CLIENT_DB):
+    where, params = _manifest_filter(query, risk_level)
+    return connect(db_path).execute(f"SELECT count(*) FROM clients{where}", params).fetchone()[0]
+
+
+def search_clients(query="", risk_level=None, page=0, page_size=CLIENT_PAGE_SIZE, db_path=CLIENT_DB):
+    """
+    One page of the client manifest, ordered by name: dicts of id, name, risk_level and updated_at (bumped by
+    every save). Served from the clients_manifest index alone.
+    """
+    where, params = _manifest_filter(query, risk_level)
+    rows = connect(db_path).execute(
+        f"SELECT id, name, risk_level, updated_at FROM clients{where} "
+        f"ORDER BY name COLLATE NOCASE LIMIT ? OFFSET ?", params + [page_size, page * page_size])
+    return [dict(row) for row in rows]
+
+
+def client_exists(name, db_path=CLIENT_DB):
+    return _client_id(connect(db_path), name) is not None
+
+
+def get_risk_answers(name, db_path=CLIENT_DB):
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT question, answer FROM risk_answers JOIN clients ON clients.id = risk_answers.client_id "
+        "WHERE clients.folder = ? ORDER BY position", (client_folder(name),))
+    return {row["question"]: row["answer"] for row in rows}
+
+
+def get_client(name, db_path=CLIENT_DB):
+    """
+    The client as the dict shape the pages have always used (profile keys, "risk_answers", "selected_etfs",
+    "Quantitative Portfolios Performance", "Selected Portfolio"), or None. Selected ETFs carry a meta_version
+    reference rather than their metadata; etf_metadata.hydrate_etfs loads it where it is rendered.
+    """
+    conn = connect(db_path)
+    row = conn.execute("SELECT * FROM clients WHERE folder = ?", (client_folder(name),)).fetchone()
+    if row is None:
+        return None
+
+    client = json.loads(row["extra"]) if row["extra"] else {}
+    for field in PROFILE_FIELDS:
+        value = row[field]
+        if value is None:
+            continue
+        if field in JSON_FIELDS:
+            value = json.loads(value)
+        elif field in BOOL_FIELDS:
+            value = bool(value)
+        client[field] = value
+
+    client_id = row["id"]
+    answers = conn.execute("SELECT question, answer FROM risk_answers WHERE client_id = ? ORDER BY position",
+                           (client_id,)).fetchall()
+    if answers:
+        client["risk_answers"] = {r["question"]: r["answer"] for r in answers}
+
+    selections = conn.execute("SELECT entry FROM selections WHERE client_id = ? ORDER BY position",
+                              (client_id,)).fetchall()
+    if selections:
+        client["selected_etfs"] = [json.loads(r["entry"]) for r in selections]
+
+    runs = conn.execute("SELECT objective, weights, metrics FROM optimization_runs WHERE client_id = ? "
+                        "ORDER BY rowid", (client_id,)).fetchall()
+    if runs:
+        client["Quantitative Portfolios Performance"] = {
+            r["objective"]: {"Weights": json.loads(r["weights"]), "Metrics": json.loads(r["metrics"])} for r in runs
+        }
+
+    selected = conn.execute("SELECT name, weights, metrics FROM selected_portfolios WHERE client_id = ?",
+                            (client_id,)).fetchone()
+    if selected:
+        client["Selected Portfolio"] = {
+            "Name": selected["name"],
+            "Weights": json.loads(selected["weights"]),
+            "Metrics": json.loads(selected["metrics"]),
+        }
+    return client
+
+
+def referenced_tickers(db_path=CLIENT_DB):
+    """De-duplicated tickers from every client's selection and selected-portfolio weights."""
+    rows = connect(db_path).execute(
+        "SELECT ticker FROM selections "
+        "UNION SELECT key FROM selected_portfolios, json_each(selected_portfolios.weights)")
+    return sorted(row[0] for row in rows if row[0] and row[0] not in NON_TICKERS)
+
+
+#======================================================================================================================
+# Writes
+#======================================================================================================================
+# Every mutation runs in _write(): a per-client lock queues this process's sessions (Streamlit tabs are threads)
+# on the same client, and BEGIN IMMEDIATE takes the database write lock before anything is read, so another
+# process can't interleave its own read-modify-write either. Each save compares against the stored rows, writes
+# only what changed and appends one journal entry per changed field.
+_client_locks = {}
+_client_locks_guard = threading.Lock()
+
+
+def _client_lock(name):
+    with _client_locks_guard:
+        return _client_locks.setdefault(client_folder(name), threading.Lock())
+
+
+@contextmanager
+def _immediate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+@contextmanager
+def _write(name, db_path):
+    conn = connect(db_path)
+    if conn.in_transaction:
+        # Inside batch(): the database write lock is already held for the whole batch
+        yield conn
+        return
+    with _client_lock(name), _immediate(conn):
+        yield conn
+
+
+@contextmanager
+def batch(db_path=CLIENT_DB):
+    """
+    One transaction around many saves (bulk loads): save_* calls on this thread join it instead of committing
+    client by client. Nothing is written if the block raises.
+    """
+    with _immediate(connect(db_path)) as conn:
+        yield conn
+
+
+def _journal(conn, client_id, entries, now):
+    """Append (field, value) entries for one client; values are stored as JSON."""
+    entries = list(entries)
+    if not entries:
+        return
+    conn.executemany("INSERT INTO client_journal (client_id, field, value, changed_at) VALUES (?, ?, ?, ?)",
+                     [(client_id, field, json.dumps(value), now) for field, value in entries])
+
+
+def _column_value(field, value):
+    if value is None:
+        return None
+    if field in JSON_FIELDS:
+        return json.dumps(value)
+    if field in BOOL_FIELDS:
+        return int(bool(value))
+    return value
+
+
+def _upsert_profile(conn, name, fields, now):
+    """Insert the client if new, else update only the profile columns that changed; returns the client id."""
+    fields = {f: v for f, v in fields.items() if f in PROFILE_FIELDS and f != "name"}
+    client_id = _client_id(conn, name)
+    if client_id is None:
+        columns = ["folder", "name", "created_at", "updated_at"] + list(fields)
+        values = [client_folder(name), name, now, now] + [_column_value(f, v) for f, v in fields.items()]
+        cur = conn.execute(f"INSERT INTO clients ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           values)
+        _journal(conn, cur.lastrowid, [("created", name)] + [(f, v) for f, v in fields.items() if v is not None], now)
+        return cur.lastrowid
+
+    changed = {}
+    if fields:
+        current = conn.execute(f"SELECT {', '.join(fields)} FROM clients WHERE id = ?", (client_id,)).fetchone()
+        changed = {f: v for f, v in fields.items() if _column_value(f, v) != current[f]}
+    assignments = "".join(f"{f} = ?, " for f in changed)
+    conn.execute(f"UPDATE clients SET {assignments}updated_at = ? WHERE id = ?",
+                 [_column_value(f, v) for f, v in changed.items()] + [now, client_id])
+    _journal(conn, client_id, changed.items(), now)
+    return client_id
+
+
+def _move_client_dir(old_folder, new_folder, clients_dir):
+    """
+    Move data/clients/<old_folder> to <new_folder> and rename the <old_folder>* files in it (price manifest, legacy
+    JSON and CSVs) to match. Returns a function that undoes the move; a move that fails part way is undone first.
+    """
+    src, dst = os.path.join(clients_dir, old_folder), os.path.join(clients_dir, new_folder)
+    if not os.path.isdir(src):
+        return lambda: None
+    if os.path.exists(dst) and not os.path.samefile(src, dst):
+        raise ClientStoreError(f"{dst} already exists.")
+
+    moves = []
+
+    def undo():
+        for a, b in reversed(moves):
+            try:
+                os.rename(b, a)
+            except OSError:
+                pass
+
+    try:
+        os.rename(src, dst)
+        moves.append((src, dst))
+        for file_name in sorted(os.listdir(dst)):
+            if file_name.startswith(old_folder):
+                a = os.path.join(dst, file_name)
+                b = os.path.join(dst, new_folder + file_name[len(old_folder):])
+                os.rename(a, b)
+                moves.append((a, b))
+    except OSError as e:
+        undo()
+        raise ClientStoreError(f"Could not move {src} to {dst}: {e}") from e
+    return undo
+
+
+def save_profile(name, fields, db_path=CLIENT_DB, clients_dir=CLIENTS_DIR):
+    """
+    Create the client or update the given profile fields. A changed "name" in `fields` renames the client, moving
+    its data/clients/<folder> directory with it; if either the move or the database write fails, neither happens.
+    """
+    new_name = fields.get("name", name)
+    now = _now()
+    undo_move = None
+    try:
+        with _write(name, db_path) as conn:
+            client_id = _upsert_profile(conn, name, fields, now)
+            if client_folder(new_name) != client_folder(name) and _client_id(conn, new_name) is not None:
+                raise ClientStoreError(f"A client named '{new_name}' already exists.")
+            if new_name != name:
+                conn.execute("UPDATE clients SET folder = ?, name = ? WHERE id = ?",
+                             (client_folder(new_name), new_name, client_id))
+                _journal(conn, client_id, [("name", new_name)], now)
+                if client_folder(new_name) != client_folder(name):
+                    # Last, so a failed move rolls back the rename and nothing after it can fail the move
+                    undo_move = _move_client_dir(client_folder(name), client_folder(new_name), clients_dir)
+    except BaseException:
+        if undo_move is not None:
+            undo_move()  # the commit itself failed
+        raise
+    return client_id
+
+
+def save_risk_profile(name, risk_score, risk_level, risk_lambda, answers, allow_short, allow_leverage,
+                      db_path=CLIENT_DB):
+    now = _now()
+    with _write(name, db_path) as conn:
+        client_id = _upsert_profile(conn, name, {
+            "risk_score": risk_score, "risk_level": risk_level, "risk_lambda": risk_lambda,
+            "allow_short": allow_short, "allow_leverage": allow_leverage,
+        }, now)
+        stored = {row["question"]: (row["position"], row["answer"]) for row in conn.execute(
+            "SELECT question, position, answer FROM risk_answers WHERE client_id = ?", (client_id,))}
+        changed = [(i, q, a) for i, (q, a) in enumerate(answers.items()) if stored.get(q) != (i, a)]
+        removed = [q for q in stored if q not in answers]
+
+        if removed:
+            conn.executemany("DELETE FROM risk_answers WHERE client_id = ? AND question = ?",
+                             [(client_id, q) for q in removed])
+        conn.executemany(
+            "INSERT INTO risk_answers (client_id, position, question, answer) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (client_id, question) DO UPDATE SET position = excluded.position, answer = excluded.answer",
+            [(client_id, i, q, a) for i, q, a in changed])
+        # Reordered answers are rewritten but only new or different answers are journaled
+        answered = [(f"risk_answers.{q}", a) for _, q, a in changed if q not in stored or stored[q][1] != a]
+        _journal(conn, client_id, answered + [(f"risk_answers.{q}", None) for q in removed], now)
+
+
+def save_current_allocation(name, allocation, db_path=CLIENT_DB):
+    with _write(name, db_path) as conn:
+        _upsert_profile(conn, name, {"current_allocation": allocation}, _now())
+
+
+def save_selected_etfs(name, selected_etfs, db_path=CLIENT_DB):
+    """
+    Replace the client's ETF selection (entries as stored on Asset Selection: Name, Ticker, Asset Class and
+    meta_version). Embedded `meta` is moved to the metadata snapshot store. The journal records the tickers.
+    """
+    now = _now()
+    selected_etfs = [split_meta(etf) for etf in selected_etfs]
+    entries = [json.dumps(etf) for etf in selected_etfs]
+    with _write(name, db_path) as conn:
+        client_id = _upsert_profile(conn, name, {}, now)
+        stored = [row["entry"] for row in conn.execute(
+            "SELECT entry FROM selections WHERE client_id = ? ORDER BY position", (client_id,))]
+        if stored == entries:
+            return
+        conn.execute("DELETE FROM selections WHERE client_id = ?", (client_id,))
+        conn.executemany("INSERT INTO selections (client_id, position, ticker, entry) VALUES (?, ?, ?, ?)",
+                         [(client_id, i, etf.get("Ticker", ""), entry)
+                          for i, (etf, entry) in enumerate(zip(selected_etfs, entries))])
+        _journal(conn, client_id, [("selected_etfs", [etf.get("Ticker", "") for etf in selected_etfs])], now)
+
+
+def save_optimization_runs(name, runs, db_path=CLIENT_DB):
+    """
+    Store the results of the multi-objective run: {objective: {"Weights": {...}, "Metrics": {...}}}. Objectives
+    missing from `runs` are removed; run_at is when an objective's result last changed.
+    """
+    now = _now()
+    with _write(name, db_path) as conn:
+        client_id = _upsert_profile(conn, name, {}, now)
+        stored = {row["objective"]: (row["weights"], row["metrics"]) for row in conn.execute(
+            "SELECT objective, weights, metrics FROM optimization_runs WHERE client_id = ?", (client_id,))}
+        rows = {obj: (json.dumps(r.get("Weights", {})), json.dumps(r.get("Metrics", {}))) for obj, r in runs.items()}
+        changed = [obj for obj in rows if stored.get(obj) != rows[obj]]
+        removed = [obj for obj in stored if obj not in rows]
+
+        if removed:
+            conn.executemany("DELETE FROM optimization_runs WHERE client_id = ? AND objective = ?",
+                             [(client_id, obj) for obj in removed])
+        conn.executemany(
+            "INSERT INTO optimization_runs (client_id, objective, weights, metrics, run_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (client_id, objective) DO UPDATE SET weights = excluded.weights, "
+            "metrics = excluded.metrics, run_at = excluded.run_at",
+            [(client_id, obj, *rows[obj], now) for obj in changed])
+        _journal(conn, client_id, [(f"optimization_runs.{obj}", runs[obj]) for obj in changed]
+                 + [(f"optimization_runs.{obj}", None) for obj in removed], now)
+
+
+def save_selected_portfolio(name, portfolio_name, weights, metrics, db_path=CLIENT_DB):
+    now = _now()
+    row = (portfolio_name, json.dumps(weights), json.dumps(metrics))
+    with _write(name, db_path) as conn:
+        client_id = _upsert_profile(conn, name, {}, now)
+        stored = conn.execute("SELECT name, weights, metrics FROM selected_portfolios WHERE client_id = ?",
+                              (client_id,)).fetchone()
+        if stored is not None and tuple(stored) == row:
+            return
+        conn.execute(
+            "INSERT INTO selected_portfolios (client_id, name, weights, metrics, selected_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (client_id) DO UPDATE SET name = excluded.name, weights = excluded.weights, "
+            "metrics = excluded.metrics, selected_at = excluded.selected_at",
+            (client_id, *row, now))
+        _journal(conn, client_id, [("selected_portfolio", {"Name": portfolio_name, "Weights": weights,
+                                                           "Metrics": metrics})], now)
+
+
+def delete_client(name, db_path=CLIENT_DB, clients_dir=CLIENTS_DIR):
+    """Delete the client's rows and its data/clients/<folder> directory (price manifest, legacy JSON)."""
+    with _write(name, db_path) as conn:
+        client_id = _client_id(conn, name)
+        if client_id is not None:
+            # The journal has no foreign key, so the deletion itself stays on record until compaction
+            _journal(conn, client_id, [("deleted", name)], _now())
+            conn.execute("DELETE FROM clients WHERE id = ?", (client_id,))
+    shutil.rmtree(os.path.join(clients_dir, client_folder(name)), ignore_errors=True)
+    return client_id is not None
+
+
+#======================================================================================================================
+# Change Journal
+#======================================================================================================================
+def client_history(name, limit=100, db_path=CLIENT_DB):
+    """The client's most recent field-level changes, newest first: dicts of field, value and changed_at."""
+    conn = connect(db_path)
+    client_id = _client_id(conn, name)
+    if client_id is None:
+        return []
+    rows = conn.execute("SELECT field, value, changed_at FROM client_journal WHERE client_id = ? "
+                        "ORDER BY seq DESC LIMIT ?", (client_id, limit))
+    return [{"field": r["field"], "value": json.loads(r["value"]), "changed_at": r["changed_at"]} for r in rows]
+
+
+def compact_journal(keep_days=JOURNAL_KEEP_DAYS, db_path=CLIENT_DB):
+    """
+    Drop journal entries older than `keep_days` that a later entry for the same client and field supersedes,
+    and old entries of deleted clients. Recent history stays complete; older history keeps each field's latest
+    value. Returns the number of entries removed.
+    """
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat(timespec="seconds")
+    conn = connect(db_path)
+    with conn:
+        return conn.execute(
+            "DELETE FROM client_journal WHERE changed_at < ? AND ("
+            "client_id NOT IN (SELECT id FROM clients) "
+            "OR seq NOT IN (SELECT max(seq) FROM client_journal GROUP BY client_id, field))", (cutoff,)).rowcount
+
+
+#======================================================================================================================
+# Migration from the JSON tree
+#======================================================================================================================
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def import_document(doc, folder=None, db_path=CLIENT_DB):
+    """Write one legacy client document into the tables, replacing whatever the store had for that client."""
+    name = doc.get("name") or (folder or "").replace("_", " ")
+    if not name:
+        raise ClientStoreError("Client document has no name.")
+
+    known = set(PROFILE_FIELDS) | {"risk_answers", "selected_etfs", "Quantitative Portfolios Performance",
+                                   "Selected Portfolio"}
+    extra = {k: v for k, v in doc.items() if k not in known}
+
+    now = _now()
+    with _write(name, db_path) as conn:
+        conn.execute("DELETE FROM clients WHERE folder = ?", (client_folder(name),))
+        client_id = _upsert_profile(conn, name, {f: doc.get(f) for f in PROFILE_FIELDS}, now)
+        conn.execute("UPDATE clients SET extra = ? WHERE id = ?", (json.dumps(extra) if extra else None, client_id))
+        _journal(conn, client_id, [("imported", folder or client_folder(name))], now)
+        conn.executemany("INSERT INTO risk_answers (client_id, position, question, answer) VALUES (?, ?, ?, ?)",
+                         [(client_id, i, q, a) for i, (q, a) in enumerate((doc.get("risk_answers") or {}).items())])
+        conn.executemany("INSERT INTO selections (client_id, position, ticker, entry) VALUES (?, ?, ?, ?)",
+                         [(client_id, i, etf.get("Ticker", ""), json.dumps(split_meta(etf)))
+                          for i, etf in enumerate(doc.get("selected_etfs") or [])])
+        conn.executemany(
+            "INSERT INTO optimization_runs (client_id, objective, weights, metrics, run_at) VALUES (?, ?, ?, ?, ?)",
+            [(client_id, obj, json.dumps(r.get("Weights", {})), json.dumps(r.get("Metrics", {})), now)
+             for obj, r in (doc.get("Quantitative Portfolios Performance") or {}).items()])
+        selected = doc.get("Selected Portfolio")
+        if selected:
+            conn.execute("INSERT INTO selected_portfolios (client_id, name, weights, metrics, selected_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (client_id, selected.get("Name", ""), json.dumps(selected.get("Weights", {})),
+                          json.dumps(selected.get("Metrics", {})), now))
+    return client_id
+
+
+def migrate(clients_dir=CLIENTS_DIR, db_path=CLIENT_DB, overwrite=False):
+    """Import every data/clients/<folder>/<folder>.json; returns {"imported", "skipped", "failed": {path: error}}."""
+    summary = {"imported": 0, "skipped": 0, "failed": {}}
+    for path in sorted(glob.glob(os.path.join(clients_dir, "*", "*.json"))):
+        folder = os.path.basename(os.path.dirname(path))
+        # Price manifests and other artifacts share the folder; only <folder>.json is the client document
+        if os.path.basename(path) != f"{folder}.json":
+            continue
+        try:
+            doc = _read_json(path)
+            if not isinstance(doc, dict):
+                raise ClientStoreError("not a JSON object")
+            if not overwrite and client_exists(doc.get("name") or folder.replace("_", " "), db_path):
+                summary["skipped"] += 1
+                continue
+            import_document(doc, folder, db_path)
+            summary["imported"] += 1
+        except (OSError, ValueError, ClientStoreError, sqlite3.Error) as e:
+            summary["failed"][path] = str(e)
+    return summary
+
+
+def export_client(name, clients_dir=CLIENTS_DIR, db_path=CLIENT_DB):
+    """
+    Write the client's document, metadata included, to data/clients/<folder>/<folder>.json (the legacy layout,
+    e.g. for backups) through a temp file and os.replace, so readers never see a half-written file. Returns the
+    path.
+    """
+    client = get_client(name, db_path)
+    if client is None:
+        raise ClientStoreError(f"Client not found: {name}")
+    if "selected_etfs" in client:
+        client["selected_etfs"] = hydrate_etfs(client["selected_etfs"])
+    folder = client_folder(client["name"])
+    os.makedirs(os.path.join(clients_dir, folder), exist_ok=True)
+    path = os.path.join(clients_dir, folder, f"{folder}.json")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(client, f, indent=4)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client repository maintenance.")
+    parser.add_argument("--db", default=CLIENT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_cmd = sub.add_parser("migrate", help="import the legacy data/clients JSON tree")
+    migrate_cmd.add_argument("--clients-dir", default=CLIENTS_DIR)
+    migrate_cmd.add_argument("--overwrite", action="store_true", help="re-import clients already in the store")
+    export_cmd = sub.add_parser("export", help="write client documents back to the JSON layout")
+    export_cmd.add_argument("--clients-dir", default=CLIENTS_DIR)
+    export_cmd.add_argument("names", nargs="*", help="clients to export (default: all)")
+    compact_cmd = sub.add_parser("compact", help="compact the change journal")
+    compact_cmd.add_argument("--keep-days", type=int, default=JOURNAL_KEEP_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for name in args.names or list_clients(args.db):
+            print(export_client(name, args.clients_dir, args.db))
+        return 0
+    if args.command == "compact":
+        print(f"{compact_journal(args.keep_days, args.db)} journal entries removed.")
+        return 0
+
+    summary = migrate(args.clients_dir, args.db, args.overwrite)
+    print(f"{summary['imported']} imported, {summary['skipped']} already in {args.db}, "
+          f"{len(summary['failed'])} failed.")
+    for path, error in summary["failed"].items():
+        print(f"  {path}: {error}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
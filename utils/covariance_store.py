@@ -0,0 +1,242 @@
+# utils/covariance_store.py
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.price_store import load_index, load_ticker
+
+
+#======================================================================================================================
+# Store Layout
+#======================================================================================================================
+# data/cache/covariance/<version>/cov.npy       float32 (N x N) daily return covariance, opened memory-mapped
+# data/cache/covariance/<version>/corr.npy      float32 (N x N) correlation
+# data/cache/covariance/<version>/tickers.json  row/column order
+# data/cache/covariance/<version>/meta.json     {"start", "end", "observations", "min_periods", "built_at"}
+# data/cache/covariance/CURRENT.json            {"version"} of the store readers open, swapped with os.replace
+# Every pair uses the days both tickers traded (pairwise-complete, like DataFrame.cov/corr) over the same
+# trailing window as the ETF statistics table.
+COV_DIR = "data/cache/covariance"
+CURRENT_FILE = "CURRENT.json"
+COV_YEARS = 3
+MIN_PERIODS = 60
+BLOCK_SIZE = 512
+KEEP_VERSIONS = 2
+TRADING_DAYS = 252
+
+_memo = {"version": None, "store": None}
+_memo_lock = threading.Lock()
+
+
+class CovarianceStore:
+    def __init__(self, cov, corr, tickers, meta):
+        self.cov = cov
+        self.corr = corr
+        self.tickers = list(tickers)
+        self.meta = meta
+        self.index = {t: i for i, t in enumerate(self.tickers)}
+
+    def __contains__(self, ticker):
+        return ticker in self.index
+
+    def missing(self, tickers):
+        return [t for t in tickers if t not in self.index]
+
+    def sub_matrix(self, tickers, kind="cov", annualize=False):
+        """
+        The (k x k) block for the stored tickers among `tickers`, in their given order; only those rows are
+        read from the memory-mapped matrix. Pairs with fewer than MIN_PERIODS common days are NaN.
+        """
+        tickers = [t for t in dict.fromkeys(tickers) if t in self.index]
+        pos = np.array([self.index[t] for t in tickers], dtype=np.int64)
+        matrix = self.cov if kind == "cov" else self.corr
+        block = np.asarray(matrix[pos][:, pos], dtype=np.float64)
+        if annualize and kind == "cov":
+            block *= TRADING_DAYS
+        return pd.DataFrame(block, index=tickers, columns=tickers)
+
+
+#======================================================================================================================
+# Build
+#======================================================================================================================
+def _closes(ticker):
+    """(dates, closes) of one stored ticker, or None if it has fewer than two closes."""
+    df = load_ticker(ticker)
+    if df.empty or ticker not in df.columns:
+        return None
+    prices = df[ticker].dropna()
+    if len(prices) < 2:
+        return None
+    return prices.index.values.astype("datetime64[D]"), prices.to_numpy(dtype=np.float64)
+
+
+def _window_returns(tickers, path, years=COV_YEARS):
+    """
+    Daily returns (dates x tickers) on the union date grid, written column by column into a .npy memmap. Two
+    passes over the price store, one ticker in memory at a time: the first collects only return dates (their union
+    is at most one entry per trading day) to fix the window and grid, the second writes each ticker's window
+    returns straight into its column.
+    """
+    return_dates, last = np.array([], dtype="datetime64[D]"), {}
+    for ticker in tickers:
+        closes = _closes(ticker)
+        if closes is not None:
+            return_dates = np.union1d(return_dates, closes[0][1:])
+            last[ticker] = closes[0][-1]
+    if not last:
+        return None, [], None
+
+    end = return_dates[-1]
+    start = np.datetime64((pd.Timestamp(end) - pd.DateOffset(years=years)).date(), "D")
+    grid = return_dates[return_dates >= start]
+    tickers = [t for t in dict.fromkeys(tickers) if t in last and last[t] >= start]
+    if not tickers:
+        return None, [], None
+
+    returns = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(grid), len(tickers)))
+    returns[:] = np.nan
+    for col, ticker in enumerate(tickers):
+        # Returns between the ticker's own consecutive closes, dated on the later close; the close just before the
+        # window is kept so the first in-window day has a return
+        closes = _closes(ticker)
+        if closes is None:
+            continue  # removed since the first pass; its column stays missing
+        dates, values = closes
+        lo = max(np.searchsorted(dates, start) - 1, 0)
+        dates, values = dates[lo:], values[lo:]
+        ret_dates, ret = dates[1:], values[1:] / values[:-1] - 1
+        keep = ret_dates >= start
+        returns[np.searchsorted(grid, ret_dates[keep]), col] = ret[keep]
+    returns.flush()
+    return returns, tickers, pd.DatetimeIndex(grid)
+
+
+def _block_moments(x, y, min_periods):
+    """Pairwise-complete covariance and correlation between the columns of x and y (NaN = missing)."""
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    fx, fy = mx.astype(np.float64), my.astype(np.float64)
+    x0, y0 = np.where(mx, x, 0.0).astype(np.float64), np.where(my, y, 0.0).astype(np.float64)
+
+    n = fx.T @ fy
+    sx, sy = x0.T @ fy, fx.T @ y0
+    sxx, syy = (x0 * x0).T @ fy, fx.T @ (y0 * y0)
+    sxy = x0.T @ y0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sxy - sx * sy / n) / (n - 1)
+        var_x = (sxx - sx * sx / n) / (n - 1)
+        var_y = (syy - sy * sy / n) / (n - 1)
+        corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+    thin = n < min_periods
+    cov[thin], corr[thin] = np.nan, np.nan
+    return cov, corr
+
+
+def build_covariance_store(tickers=None, block_size=BLOCK_SIZE, min_periods=MIN_PERIODS):
+    """
+    Build the matrices for `tickers` (default: every ticker in the price store) block by block, so peak memory
+    is a few (days x block) arrays rather than the full return panel, then make the new version current.
+    """
+    tickers = list(tickers) if tickers is not None else sorted(load_index())
+    version = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(COV_DIR, version)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+
+    try:
+        returns, tickers, grid = _window_returns(tickers, os.path.join(tmp, "returns.npy"))
+        n = len(tickers)
+        cov = np.lib.format.open_memmap(os.path.join(tmp, "cov.npy"), mode="w+", dtype=np.float32, shape=(n, n))
+        corr = np.lib.format.open_memmap(os.path.join(tmp, "corr.npy"), mode="w+", dtype=np.float32, shape=(n, n))
+
+        for a in range(0, n, block_size):
+            x = np.asarray(returns[:, a:a + block_size])
+            for b in range(a, n, block_size):
+                y = x if b == a else np.asarray(returns[:, b:b + block_size])
+                block_cov, block_corr = _block_moments(x, y, min_periods)
+                cov[a:a + block_size, b:b + block_size] = block_cov
+                corr[a:a + block_size, b:b + block_size] = block_corr
+                if b != a:
+                    cov[b:b + block_size, a:a + block_size] = block_cov.T
+                    corr[b:b + block_size, a:a + block_size] = block_corr.T
+        cov.flush()
+        corr.flush()
+        del returns, cov, corr
+        if os.path.exists(os.path.join(tmp, "returns.npy")):
+            os.remove(os.path.join(tmp, "returns.npy"))
+
+        meta = {
+            "start": grid[0].date().isoformat() if n else None,
+            "end": grid[-1].date().isoformat() if n else None,
+            "observations": len(grid) if n else 0,
+            "min_periods": min_periods,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(tmp, "tickers.json"), "w") as f:
+            json.dump(tickers, f)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=4)
+        os.rename(tmp, path)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    _set_current(version)
+    prune_versions()
+    return load_covariance_store()
+
+
+def _current_path():
+    return os.path.join(COV_DIR, CURRENT_FILE)
+
+
+def _set_current(version):
+    tmp = f"{_current_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp, _current_path())
+
+
+def _current_version():
+    try:
+        with open(_current_path(), "r") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def prune_versions(keep=KEEP_VERSIONS):
+    # Readers may still hold the previous version memory-mapped, so it is kept for one more build
+    current = _current_version()
+    versions = sorted(name for name in os.listdir(COV_DIR)
+                      if os.path.isdir(os.path.join(COV_DIR, name)) and not name.endswith(".tmp"))
+    for name in versions[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(COV_DIR, name), ignore_errors=True)
+
+
+#======================================================================================================================
+# Lookup
+#======================================================================================================================
+def load_covariance_store():
+    """The current store, opened memory-mapped once per version and shared across sessions. None if never built."""
+    version = _current_version()
+    if version is None:
+        return None
+    with _memo_lock:
+        if _memo["version"] != version:
+            path = os.path.join(COV_DIR, version)
+            with open(os.path.join(path, "tickers.json"), "r") as f:
+                tickers = json.load(f)
+            with open(os.path.join(path, "meta.json"), "r") as f:
+                meta = json.load(f)
+            cov = np.load(os.path.join(path, "cov.npy"), mmap_mode="r")
+            corr = np.load(os.path.join(path, "corr.npy"), mmap_mode="r")
+            _memo["store"] = CovarianceStore(cov, corr, tickers, meta)
+            _memo["version"] = version
+        return _memo["store"]
@@ -0,0 +1,253 @@
+# utils/etf_metadata.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.fmp_utils import fmp_get, fmp_get_batch, chunk_symbols, session_workers, MAX_WORKERS
+
+
+#======================================================================================================================
+# Endpoints and Cache Lifetimes
+#======================================================================================================================
+DAY = 24 * 3600
+
+# Weights and the fund profile barely move; performance is re-read daily
+ENDPOINT_TTL = {
+    "profile": 7 * DAY,
+    "sector": 7 * DAY,
+    "country": 7 * DAY,
+    "performance": 1 * DAY,
+}
+
+ENDPOINT_PATHS = {
+    "sector": "v3/etf-sector-weightings",
+    "country": "v3/etf-country-weightings",
+    "performance": "v3/stock-price-change",
+}
+
+# data/cache/etf_meta/<endpoint>/<TICKER>.json  ->  {"fetched_at": epoch seconds, "data": raw FMP response}
+META_CACHE_DIR = "data/cache/etf_meta"
+
+# data/etf_meta/<TICKER>/<version>.json  ->  one assembled `meta` dict, never rewritten (see Versioned Snapshots)
+META_STORE_DIR = "data/etf_meta"
+
+PERFORMANCE_KEYS = ["3M", "6M", "YTD", "1Y", "3Y", "5Y"]
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+#======================================================================================================================
+# On-disk Cache
+#======================================================================================================================
+def _cache_path(endpoint, ticker):
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+    return os.path.join(META_CACHE_DIR, endpoint, f"{safe}.json")
+
+
+def _read_cache(endpoint, ticker):
+    path = _cache_path(endpoint, ticker)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(endpoint, ticker, data):
+    path = _cache_path(endpoint, ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": time.time(), "data": data}, f)
+    os.replace(tmp, path)
+
+
+def _is_fresh(entry, endpoint, now):
+    return entry is not None and now - entry.get("fetched_at", 0) < ENDPOINT_TTL[endpoint]
+
+
+def _fetch_group(endpoint, tickers, api_key):
+    """{ticker: raw response} for one request group: a multi-symbol batch or a single ticker."""
+    if endpoint == "profile":
+        return {tickers[0]: fmp_get("v4/etf-info", {"symbol": tickers[0]}, api_key)}
+    # FMP may echo a symbol in a different case than it was asked for ("brk.b" -> "BRK.B"); match on upper case,
+    # as the cache files are named, so a case mismatch is not cached as an empty payload
+    payloads = {symbol.upper(): payload
+                for symbol, payload in fmp_get_batch(ENDPOINT_PATHS[endpoint], tickers, api_key=api_key).items()}
+    # Symbols FMP has nothing for are simply absent from a batch response
+    return {t: payloads.get(t.upper(), []) for t in tickers}
+
+
+def _request_groups(to_fetch):
+    by_endpoint = {}
+    for ticker, endpoint in to_fetch:
+        by_endpoint.setdefault(endpoint, []).append(ticker)
+
+    groups = []
+    for endpoint, tickers in by_endpoint.items():
+        # Endpoints without a BATCH_LIMITS entry come back as single-ticker chunks
+        groups.extend((endpoint, chunk) for chunk in chunk_symbols(tickers, ENDPOINT_PATHS.get(endpoint)))
+    return groups
+
+
+#======================================================================================================================
+# Metadata Assembly
+#======================================================================================================================
+def build_meta(profile, sector, country, performance):
+    """Shape the raw FMP responses into the `meta` dict stored with each selected ETF."""
+    profile = profile[0] if isinstance(profile, list) and profile else {}
+    perf_data = performance[0] if isinstance(performance, list) and performance else {}
+    sector = sector if isinstance(sector, list) else []
+    country = country if isinstance(country, list) else []
+
+    return {
+        "name": profile.get("name", ""),
+        "assetClass": profile.get("assetClass", ""),
+        "description": profile.get("description", ""),
+        "expenseRatio": profile.get("expenseRatio", None),
+        "etfCompany": profile.get("etfCompany", ""),
+        "price": profile.get("price", None),
+        "exchange": profile.get("exchange", ""),
+        "country_weights": {
+            d["country"]: d["weightPercentage"]
+            for d in country if "country" in d
+        },
+        "sector_weights": {
+            d["sector"]: d["weightPercentage"]
+            for d in sector if "sector" in d
+        },
+        "performance": {
+            k: v for k, v in perf_data.items()
+            if k in PERFORMANCE_KEYS
+        }
+    }
+
+
+def fetch_etf_metadata(tickers, api_key, max_workers=MAX_WORKERS):
+    """
+    Metadata for every ticker, served from the on-disk cache where each endpoint is still within its TTL
+    and fanned out concurrently for the rest, batching symbols on endpoints that accept lists. Returns (meta_by_ticker, failures) where failures maps
+    ticker -> list of endpoints that could not be fetched (stale cache, if any, is used for those).
+    """
+    tickers = list(dict.fromkeys(tickers))
+    now = time.time()
+
+    raw, stale, to_fetch = {}, {}, []
+    for ticker in tickers:
+        for endpoint in ENDPOINT_TTL:
+            entry = _read_cache(endpoint, ticker)
+            if _is_fresh(entry, endpoint, now):
+                raw[(ticker, endpoint)] = entry["data"]
+            else:
+                if entry is not None:
+                    stale[(ticker, endpoint)] = entry["data"]
+                to_fetch.append((ticker, endpoint))
+
+    failures = {}
+    groups = _request_groups(to_fetch)
+    if groups:
+        workers = min(max_workers, len(groups))
+        with session_workers(workers), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_fetch_group, ep, chunk, api_key): (ep, chunk) for ep, chunk in groups}
+            for future in as_completed(futures):
+                endpoint, chunk = futures[future]
+                try:
+                    for ticker, data in future.result().items():
+                        _write_cache(endpoint, ticker, data)
+                        raw[(ticker, endpoint)] = data
+                except Exception:
+                    for ticker in chunk:
+                        raw[(ticker, endpoint)] = stale.get((ticker, endpoint), {})
+                        failures.setdefault(ticker, []).append(endpoint)
+
+    meta = {
+        t: build_meta(raw[(t, "profile")], raw[(t, "sector")], raw[(t, "country")], raw[(t, "performance")])
+        for t in tickers
+    }
+    return meta, failures
+
+
+def cached_etf_metadata(tickers):
+    """Metadata assembled from whatever the on-disk cache holds, fresh or not; never touches the network."""
+    meta = {}
+    for ticker in dict.fromkeys(tickers):
+        raw = {}
+        for endpoint in ENDPOINT_TTL:
+            entry = _read_cache(endpoint, ticker)
+            raw[endpoint] = entry["data"] if entry else {}
+        meta[ticker] = build_meta(raw["profile"], raw["sector"], raw["country"], raw["performance"])
+    return meta
+
+
+#======================================================================================================================
+# Versioned Snapshots
+#======================================================================================================================
+# Clients reference metadata as {"Ticker", "meta_version"} instead of embedding it. The version is a hash of the
+# content: a snapshot never changes once written, identical metadata is stored once however many clients select
+# it, and a client keeps the metadata it was advised on after the cache moves on. Only pages that render
+# metadata (the PDF's ETF details) load it, through hydrate_etfs.
+def meta_version(meta):
+    return hashlib.sha1(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _snapshot_path(ticker, version):
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+    return os.path.join(META_STORE_DIR, safe, f"{version}.json")
+
+
+def save_meta_snapshot(ticker, meta):
+    """Store `meta` for `ticker` if this version is new; returns its version."""
+    version = meta_version(meta)
+    path = _snapshot_path(ticker, version)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+    return version
+
+
+def load_meta_snapshot(ticker, version):
+    """The snapshot, read once per process (snapshots are immutable); {} if it is missing."""
+    key = (ticker, version)
+    with _snapshots_lock:
+        if key in _snapshots:
+            return _snapshots[key]
+    try:
+        with open(_snapshot_path(ticker, version), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    with _snapshots_lock:
+        _snapshots[key] = meta
+    return meta
+
+
+def split_meta(etf):
+    """A selected-ETF entry with any embedded `meta` moved to the snapshot store and replaced by its version."""
+    if "meta" not in etf:
+        return etf
+    etf = dict(etf)
+    meta = etf.pop("meta") or {}
+    if meta:
+        etf["meta_version"] = save_meta_snapshot(etf.get("Ticker", ""), meta)
+    return etf
+
+
+def hydrate_etfs(etfs):
+    """Copies of selected-ETF entries with `meta` loaded from their referenced snapshots."""
+    hydrated = []
+    for etf in etfs:
+        if "meta" not in etf:
+            version = etf.get("meta_version")
+            etf = dict(etf, meta=load_meta_snapshot(etf.get("Ticker", ""), version) if version else {})
+        hydrated.append(etf)
+    return hydrated
@@ -0,0 +1,143 @@
+# utils/etf_search.py
+import re
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+from utils.universe import get_universe
+
+
+#======================================================================================================================
+# Index Layout
+#======================================================================================================================
+# Every indexed word ("token") gets one entry in a sorted vocabulary; its postings (row, field weight) are stored
+# contiguously in vocabulary order (CSR). A prefix such as "ish" is then a [lo, hi) range of the vocabulary found by
+# bisection, and all of its postings are one slice. Query words that match no prefix (typos, infixes) fall back to
+# trigram similarity against the vocabulary.
+SEARCH_FIELDS = {
+    "symbol": 4.0,
+    "name": 2.0,                # issuer names ("iShares", "Vanguard", ...) are part of the fund name
+    "Asset Class": 1.0,
+    "Broad Asset Class": 1.0,
+    "exchangeShortName": 0.5,
+}
+
+EXACT_QUALITY = 1.0
+PREFIX_QUALITY = 0.7
+FUZZY_QUALITY = 0.5
+FUZZY_THRESHOLD = 0.4
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[&.][a-z0-9]+)*")
+
+_index_memo = {"universe": None, "index": None}
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+#======================================================================================================================
+# Search Index
+#======================================================================================================================
+class SearchIndex:
+    def __init__(self, universe):
+        self.universe = universe
+        self.n_rows = len(universe)
+        postings = {}
+        for field, weight in SEARCH_FIELDS.items():
+            if field not in universe.columns:
+                continue
+            for row, text in enumerate(universe.column(field).tolist()):
+                for token in tokenize(text) if text is not None else ():
+                    best = postings.setdefault(token, {})
+                    if best.get(row, 0.0) < weight:
+                        best[row] = weight
+
+        self.vocab = sorted(postings)
+        sizes = [len(postings[t]) for t in self.vocab]
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+        self.rows = np.fromiter((r for t in self.vocab for r in postings[t]), dtype=np.int32,
+                                count=int(self.offsets[-1]))
+        self.weights = np.fromiter((w for t in self.vocab for w in postings[t].values()), dtype=np.float32,
+                                   count=int(self.offsets[-1]))
+
+        grams = {}
+        for token_id, token in enumerate(self.vocab):
+            for gram in trigrams(token):
+                grams.setdefault(gram, []).append(token_id)
+        self.grams = {g: np.array(ids, dtype=np.int32) for g, ids in grams.items()}
+        self.gram_counts = np.array([len(trigrams(t)) for t in self.vocab], dtype=np.int32)
+
+    def _fuzzy_tokens(self, term):
+        term_grams = trigrams(term)
+        hits = [self.grams[g] for g in term_grams if g in self.grams]
+        if not hits:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.vocab))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(term_grams) + self.gram_counts[candidates] - shared[candidates])
+        keep = similarity >= FUZZY_THRESHOLD
+        return candidates[keep], similarity[keep]
+
+    def _term_scores(self, term):
+        """Best (field weight x match quality) per row for one query word."""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        lo = bisect_left(self.vocab, term)
+        hi = bisect_left(self.vocab, term + "\uffff", lo)
+        if hi > lo:
+            start, stop = self.offsets[lo], self.offsets[hi]
+            np.maximum.at(scores, self.rows[start:stop], self.weights[start:stop] * PREFIX_QUALITY)
+            if self.vocab[lo] == term:
+                start, stop = self.offsets[lo], self.offsets[lo + 1]
+                np.maximum.at(scores, self.rows[start:stop], self.weights[start:stop] * EXACT_QUALITY)
+        elif len(term) >= 3:
+            for token_id, similarity in zip(*self._fuzzy_tokens(term)):
+                start, stop = self.offsets[token_id], self.offsets[token_id + 1]
+                np.maximum.at(scores, self.rows[start:stop], self.weights[start:stop] * FUZZY_QUALITY * similarity)
+        return scores
+
+    def search(self, query, limit=25):
+        """
+        Row positions of the best matches for `query`, best first. Every query word must match some field
+        (exactly, as a prefix, or fuzzily); rows are ranked by the summed field-weighted match quality,
+        ties kept in universe order.
+        """
+        terms = tokenize(query)
+        if not terms or not self.n_rows:
+            return np.empty(0, dtype=np.int64)
+
+        total = np.zeros(self.n_rows, dtype=np.float32)
+        matched = np.ones(self.n_rows, dtype=bool)
+        for term in dict.fromkeys(terms):
+            scores = self._term_scores(term)
+            matched &= scores > 0
+            total += scores
+
+        rows = np.flatnonzero(matched)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-total[rows], limit - 1)[:limit]]
+        return rows[np.lexsort((rows, -total[rows]))]
+
+
+def get_search_index():
+    """The index of the current universe, rebuilt only when get_universe() serves a new version."""
+    universe = get_universe()
+    with _index_lock:
+        if _index_memo["universe"] is not universe:
+            _index_memo["index"] = SearchIndex(universe)
+            _index_memo["universe"] = universe
+        return _index_memo["index"]
+
+
+def search_universe(query, limit=25):
+    """Matching universe rows, best first."""
+    index = get_search_index()
+    return index.universe.rows(index.search(query, limit))
@@ -0,0 +1,137 @@
+# utils/etf_stats.py
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.etf_metadata import cached_etf_metadata
+from utils.price_store import load_index, load_ticker
+
+
+#======================================================================================================================
+# Statistics Table
+#======================================================================================================================
+# data/cache/etf_stats.parquet: one row per ticker in the price store, written by the nightly refresh.
+# Return/volatility/Sharpe/drawdown use the same definitions and 3-year window as the PDF report's ETF table.
+# expense_ratio is in percent, as FMP reports it; every other column is a fraction.
+STATS_FILE = "data/cache/etf_stats.parquet"
+TRADING_DAYS = 252
+STATS_YEARS = 3
+
+STATS_COLUMNS = ["symbol", "expense_ratio", "return_1y", "return_3y", "annual_return", "volatility", "sharpe",
+                 "max_drawdown", "last_date"]
+
+_memo = {"signature": None, "df": None}
+_memo_lock = threading.Lock()
+
+
+def _trailing_return(closes, dates, years):
+    """Price return over the last `years`, or NaN when the history does not reach back that far."""
+    anchor = dates[-1] - np.timedelta64(int(365.25 * years), "D")
+    pos = np.searchsorted(dates, anchor, side="right") - 1
+    if pos < 0:
+        return np.nan
+    return closes[-1] / closes[pos] - 1
+
+
+def ticker_stats(prices):
+    """Stats for one close series (date-indexed), as a dict keyed like STATS_COLUMNS."""
+    prices = prices.dropna()
+    if len(prices) < 2:
+        return None
+    dates = prices.index.values.astype("datetime64[D]")
+    closes = prices.to_numpy(dtype=np.float64)
+
+    start = np.searchsorted(dates, dates[-1] - np.timedelta64(int(365.25 * STATS_YEARS), "D"))
+    window = closes[start:]
+    daily_ret = window[1:] / window[:-1] - 1
+    annual_ret = daily_ret.mean() * TRADING_DAYS if len(daily_ret) else np.nan
+    annual_vol = daily_ret.std(ddof=1) * TRADING_DAYS ** 0.5 if len(daily_ret) > 1 else np.nan
+
+    return {
+        "return_1y": _trailing_return(closes, dates, 1),
+        "return_3y": _trailing_return(closes, dates, 3),
+        "annual_return": annual_ret,
+        "volatility": annual_vol,
+        "sharpe": annual_ret / annual_vol if annual_vol > 0 else 0.0,
+        "max_drawdown": (window / np.maximum.accumulate(window) - 1).min(),
+        "last_date": pd.Timestamp(dates[-1]),
+    }
+
+
+def build_stats_table(tickers=None):
+    """Stats for `tickers` (default: every ticker in the price store) plus the cached expense ratio."""
+    tickers = list(tickers) if tickers is not None else sorted(load_index())
+    meta = cached_etf_metadata(tickers)
+
+    rows = []
+    for ticker in tickers:
+        df = load_ticker(ticker)
+        if df.empty or ticker not in df.columns:
+            continue
+        stats = ticker_stats(df[ticker])
+        if stats is None:
+            continue
+        expense = meta[ticker].get("expenseRatio")
+        rows.append(dict(stats, symbol=ticker, expense_ratio=np.nan if expense is None else float(expense)))
+
+    table = pd.DataFrame(rows, columns=STATS_COLUMNS)
+    float_cols = STATS_COLUMNS[1:-1]
+    table[float_cols] = table[float_cols].astype(np.float64)
+    return table
+
+
+def save_stats_table(table, path=STATS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def refresh_stats_table(tickers=None, path=STATS_FILE):
+    table = build_stats_table(tickers)
+    save_stats_table(table, path)
+    return table
+
+
+def load_stats_table(path=STATS_FILE):
+    """The stats table, re-read only when the file changes. Shared across sessions: do not modify in place."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=STATS_COLUMNS)
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    with _memo_lock:
+        if _memo["signature"] != signature:
+            _memo["df"] = pd.read_parquet(path)
+            _memo["signature"] = signature
+        return _memo["df"]
+
+
+#======================================================================================================================
+# Screening
+#======================================================================================================================
+def screen(table, max_expense=None, min_return_1y=None, min_return_3y=None, max_volatility=None,
+           max_drawdown=None, keep_missing_expense=False, sort_by="sharpe", ascending=False, limit=None):
+    """
+    Rows of `table` passing every given bound, sorted. Bounds left as None are not applied; a row with a
+    missing value for an applied bound is excluded, except a missing expense ratio when `keep_missing_expense`.
+    `max_drawdown` is the deepest drawdown allowed, e.g. -0.3.
+    """
+    mask = np.ones(len(table), dtype=bool)
+    # NaN comparisons are False, so missing values drop out of any active bound
+    if max_expense is not None:
+        expense = table["expense_ratio"].to_numpy()
+        mask &= (expense <= max_expense) | (keep_missing_expense & np.isnan(expense))
+    if min_return_1y is not None:
+        mask &= table["return_1y"].to_numpy() >= min_return_1y
+    if min_return_3y is not None:
+        mask &= table["return_3y"].to_numpy() >= min_return_3y
+    if max_volatility is not None:
+        mask &= table["volatility"].to_numpy() <= max_volatility
+    if max_drawdown is not None:
+        mask &= table["max_drawdown"].to_numpy() >= max_drawdown
+
+    result = table[mask].sort_values(sort_by, ascending=ascending, na_position="last", kind="stable")
+    return result.head(limit) if limit else result
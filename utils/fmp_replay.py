@@ -0,0 +1,244 @@
+# utils/fmp_replay.py
+#
+# Record/replay for FMP traffic.
+#   Record:  FMP_RECORD_DIR=data/fixtures/fmp streamlit run home.py
+#   Replay:  python -m utils.fmp_replay --fixtures data/fixtures/fmp --port 8765 --latency 0.05 --error-rate 0.02
+#            FMP_BASE_URL=http://127.0.0.1:8765 streamlit run home.py
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+import numpy as np
+
+
+#======================================================================================================================
+# Fixtures
+#======================================================================================================================
+IGNORED_PARAMS = {"apikey"}
+
+
+def fixture_key(path, params):
+    """Stable name for a request: the path plus its query, without the API key."""
+    query = sorted((k, str(v)) for k, v in (params or {}).items() if k not in IGNORED_PARAMS)
+    raw = path.strip("/") + "?" + "&".join(f"{k}={v}" for k, v in query)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def record_fixture(fixture_dir, path, params, body):
+    os.makedirs(fixture_dir, exist_ok=True)
+    fixture = {
+        "path": path.strip("/"),
+        "params": {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS},
+        "body": body,
+    }
+    target = os.path.join(fixture_dir, f"{fixture_key(path, params)}.json")
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(fixture, f)
+    os.replace(tmp, target)
+
+
+def load_fixtures(fixture_dir):
+    fixtures = {}
+    if not os.path.isdir(fixture_dir):
+        return fixtures
+    for name in os.listdir(fixture_dir):
+        if name.endswith(".json"):
+            with open(os.path.join(fixture_dir, name), "r") as f:
+                fixture = json.load(f)
+            fixtures[name[:-5]] = fixture["body"]
+    return fixtures
+
+
+#======================================================================================================================
+# Synthetic Responses
+#======================================================================================================================
+def _synthetic_history(symbol, start, end):
+    # Deterministic per symbol, so repeated benchmark runs see identical payloads
+    seed = int(hashlib.sha1(symbol.encode()).hexdigest()[:8], 16)
+    rng = np.random.default_rng(seed)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    days = [d for d in days if d.weekday() < 5]
+    closes = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(days)))
+
+    historical = []
+    for d, close in zip(reversed(days), closes[::-1]):
+        close = round(float(close), 4)
+        historical.append({
+            "date": d.isoformat(), "open": close, "high": close, "low": close, "close": close,
+            "adjClose": close, "volume": 1000000, "unadjustedVolume": 1000000, "change": 0.0,
+            "changePercent": 0.0, "vwap": close, "label": d.strftime("%B %d, %y"), "changeOverTime": 0.0,
+        })
+    return {"symbol": symbol, "historical": historical}
+
+
+def synthetic_response(path, params):
+    """Plausible stand-in bodies for the endpoints the app uses, or None if the path is unknown."""
+    parts = path.strip("/").split("/")
+    if parts[:2] == ["v3", "historical-price-full"] and len(parts) == 3:
+        start = date.fromisoformat(params.get("from", "2020-01-01"))
+        end = date.fromisoformat(params.get("to", date.today().isoformat()))
+        symbols = parts[2].split(",")
+        if len(symbols) == 1:
+            return _synthetic_history(symbols[0], start, end)
+        return {"historicalStockList": [_synthetic_history(s, start, end) for s in symbols]}
+    if parts[:2] == ["v3", "stock-price-change"] and len(parts) == 3:
+        return [{"symbol": s, "3M": 1.0, "6M": 2.0, "YTD": 3.0, "1Y": 4.0, "3Y": 5.0, "5Y": 6.0}
+                for s in parts[2].split(",")]
+    if parts[:2] == ["v3", "etf-sector-weightings"]:
+        return [{"sector": "Technology", "weightPercentage": "60.00%"},
+                {"sector": "Financial Services", "weightPercentage": "40.00%"}]
+    if parts[:2] == ["v3", "etf-country-weightings"]:
+        return [{"country": "United States", "weightPercentage": "100.00%"}]
+    if parts[:2] == ["v4", "etf-info"]:
+        symbol = params.get("symbol", "")
+        return [{"symbol": symbol, "name": f"{symbol} Synthetic ETF", "assetClass": "Equity",
+                 "description": "Synthetic replay fixture.", "expenseRatio": 0.1, "etfCompany": "Replay",
+                 "price": 100.0, "exchange": "NYSE"}]
+    return None
+
+
+#======================================================================================================================
+# Replay Server
+#======================================================================================================================
+class ReplayServer:
+    """
+    Local stand-in for financialmodelingprep.com/api serving recorded fixtures.
+    latency: fixed seconds added to every response, jitter: extra uniform seconds on top,
+    error_rate: share of requests answered with an injected 429/500/503 instead of the fixture.
+    Each distinct response is serialized once and served as bytes afterwards, so a warmed-up server costs only
+    its latency; GET /_replay/stats returns the counters.
+    """
+
+    def __init__(self, fixture_dir=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, synthetic=False, seed=0):
+        self.fixtures = load_fixtures(fixture_dir) if fixture_dir else {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.synthetic = synthetic
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors_injected": 0, "misses": 0, "bytes": 0}
+        self.payloads = {}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _draw(self):
+        with self.random_lock:
+            return self.random.random(), self.random.uniform(0, self.jitter)
+
+    def _count(self, key, n=1):
+        with self.random_lock:
+            self.stats[key] += n
+
+    def respond(self, path, params):
+        """(status, body bytes) for one request; also what the HTTP handler sends."""
+        roll, extra = self._draw()
+        delay = self.latency + extra
+        if delay:
+            time.sleep(delay)
+
+        self._count("requests")
+        if roll < self.error_rate:
+            self._count("errors_injected")
+            status = (429, 500, 503)[int(roll / self.error_rate * 3) % 3]
+            return status, json.dumps({"Error Message": "injected failure"}).encode()
+
+        key = fixture_key(path, params)
+        payload = self.payloads.get(key)
+        if payload is None:
+            body = self.fixtures.get(key)
+            if body is None and self.synthetic:
+                body = synthetic_response(path, params)
+            if body is None:
+                self._count("misses")
+                return 404, json.dumps({"Error Message": f"no fixture for {path}"}).encode()
+            payload = self.payloads.setdefault(key, json.dumps(body).encode())
+
+        self._count("bytes", len(payload))
+        return 200, payload
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/_replay/stats":
+                    with server.random_lock:
+                        status, payload = 200, json.dumps(server.stats).encode()
+                else:
+                    status, payload = server.respond(unquote(url.path), dict(parse_qsl(url.query)))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+#======================================================================================================================
+# CLI
+#======================================================================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded FMP responses locally.")
+    parser.add_argument("--fixtures", default="data/fixtures/fmp", help="directory written with FMP_RECORD_DIR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with 429/5xx")
+    parser.add_argument("--synthetic", action="store_true", help="generate responses for requests with no fixture")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixtures, args.host, args.port, args.latency, args.jitter,
+                          args.error_rate, args.synthetic, args.seed)
+    print(f"Replaying {len(server.fixtures)} fixtures on {server.base_url} (set FMP_BASE_URL to this)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# utils/fmp_stream.py
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+#======================================================================================================================
+# Streaming Parser for historical-price-full
+#======================================================================================================================
+# Only three keys matter: "symbol" (one per ticker block), "date" and "close" (one per bar).
+# Numbers must be followed by a delimiter, so a value cut at a chunk boundary is never read half-way.
+_TOKEN = re.compile(rb'"(symbol|date|close)"\s*:\s*(?:"([^"]*)"|(-?[0-9][0-9.eE+-]*)(?=[\s,}\]]))')
+
+# Longest stretch that can hold an unfinished token; anything older is safe to drop
+_MAX_TOKEN = 256
+
+
+class _HistoryArrays:
+    """Preallocated date/close arrays for one symbol, doubled only if the size estimate was short."""
+
+    def __init__(self, capacity):
+        self.dates = np.empty(capacity, dtype="S10")
+        self.closes = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    def append(self, day, close):
+        if self.size == len(self.closes):
+            self.dates = np.resize(self.dates, 2 * self.size)
+            self.closes = np.resize(self.closes, 2 * self.size)
+        self.dates[self.size] = day
+        self.closes[self.size] = close
+        self.size += 1
+
+    def finish(self):
+        # FMP sends newest first
+        dates = self.dates[:self.size][::-1].astype("U10").astype("datetime64[D]")
+        return dates, self.closes[:self.size][::-1].copy()
+
+
+def estimate_rows(start, end):
+    """Trading days between two ISO dates, rounded up so the arrays rarely need to grow."""
+    days = (date.fromisoformat(str(end)[:10]) - date.fromisoformat(str(start)[:10])).days
+    return max(16, days * 5 // 7 + 16)
+
+
+def parse_history_stream(chunks, capacity=4096):
+    """
+    Parse a historical-price-full body (single symbol or historicalStockList) from an iterable of byte chunks.
+    Returns {symbol: (dates datetime64[D], closes float64)} without building any per-bar Python objects.
+    """
+    arrays = {}
+    current = None
+    pending_date = None
+    buffer = b""
+
+    for chunk in chunks:
+        buffer += chunk
+        consumed = 0
+        for match in _TOKEN.finditer(buffer):
+            key, text, number = match.group(1), match.group(2), match.group(3)
+            if key == b"symbol":
+                current = arrays.setdefault(text.decode(), _HistoryArrays(capacity))
+            elif key == b"date":
+                pending_date = text
+            elif pending_date is not None and number is not None:
+                if current is None:
+                    current = arrays.setdefault("", _HistoryArrays(capacity))
+                current.append(pending_date, float(number))
+                pending_date = None
+            consumed = match.end()
+        buffer = buffer[max(consumed, len(buffer) - _MAX_TOKEN):]
+
+    return {symbol: a.finish() for symbol, a in arrays.items()}
+
+
+def history_frame(ticker, dates, closes):
+    """Same shape as the legacy DataFrame path: `date` index, one close column named after the ticker."""
+    if len(closes) == 0:
+        return pd.DataFrame()
+    index = pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="date")
+    return pd.DataFrame({ticker: closes}, index=index)
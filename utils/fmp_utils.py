@@ -0,0 +1,359 @@
+# utils/fmp_utils.py
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.fmp_replay import record_fixture
+from utils.fmp_stream import parse_history_stream, history_frame, estimate_rows
+
+
+#======================================================================================================================
+# FMP Settings
+#======================================================================================================================
+# Point FMP_BASE_URL at a local replay server (utils/fmp_replay.py) to run without network or quota
+FMP_BASE_URL = os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com/api").rstrip("/")
+
+# When set, every successful response is saved there as a replay fixture
+FMP_RECORD_DIR = os.getenv("FMP_RECORD_DIR")
+
+REQUEST_TIMEOUT = (5, 30)          # (connect, read) seconds per request
+STREAM_CHUNK_SIZE = 64 * 1024
+MAX_RETRIES = 4                    # retries after the first attempt
+BACKOFF_BASE = 0.5                 # seconds, doubled on every retry
+BACKOFF_CAP = 8.0                  # never sleep longer than this between retries
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Default fan-out; the session's connection pool grows to the threads actually in flight (session_workers)
+MAX_WORKERS = int(os.getenv("FMP_MAX_WORKERS", 8))
+
+# Endpoints that accept comma-separated symbol lists, with the most symbols FMP allows per call.
+# Anything not listed here is requested one symbol at a time.
+BATCH_LIMITS = {
+    "v3/historical-price-full": 5,
+    "v3/stock-price-change": 50,
+}
+
+# Calls allowed per period on our FMP plan (Starter: 300 / minute)
+RATE_LIMIT_CALLS = int(os.getenv("FMP_RATE_LIMIT", 300))
+RATE_LIMIT_PERIOD = 60.0
+
+
+class FMPError(Exception):
+    pass
+
+
+#======================================================================================================================
+# Rate Limiter
+#======================================================================================================================
+class RateLimiter:
+    """Thread-safe token bucket: at most `calls` requests per `period` seconds, bursts up to `calls`."""
+
+    def __init__(self, calls, period):
+        self.capacity = float(calls)
+        self.rate = calls / period
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD)
+
+
+#======================================================================================================================
+# Transfer Accounting
+#======================================================================================================================
+_transfer = {"requests": 0, "bytes": 0}
+_transfer_lock = threading.Lock()
+
+def _count_transfer(n_bytes):
+    with _transfer_lock:
+        _transfer["requests"] += 1
+        _transfer["bytes"] += n_bytes
+
+
+def transfer_stats():
+    """Successful requests and response bytes since the process started."""
+    with _transfer_lock:
+        return dict(_transfer)
+
+
+#======================================================================================================================
+# Pooled Session
+#======================================================================================================================
+_session = None
+_session_size = 0     # keep-alive sockets per host the mounted adapter holds
+_session_demand = 0   # threads currently sending through the session, across all callers
+_session_lock = threading.Lock()
+
+
+def _mount(session, size):
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def get_session():
+    global _session, _session_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session_size = MAX_WORKERS
+            _mount(_session, _session_size)
+        return _session
+
+
+@contextmanager
+def session_workers(n):
+    """
+    Declare `n` threads sending through the shared session for the duration of the block. The connection pool
+    grows to cover every such thread in flight, whichever caller started it, so no worker's socket is discarded
+    after each request for lack of room. It never shrinks; growing it drops the old adapter's idle sockets once.
+    """
+    global _session_size, _session_demand
+    session = get_session()
+    with _session_lock:
+        _session_demand += n
+        if _session_demand > _session_size:
+            _session_size = _session_demand
+            _mount(session, _session_size)
+    try:
+        yield session
+    finally:
+        with _session_lock:
+            _session_demand -= n
+
+
+def set_base_url(base_url):
+    global FMP_BASE_URL
+    if base_url:
+        FMP_BASE_URL = base_url.rstrip("/")
+
+
+def _backoff_delay(attempt, retry_after=None):
+    # Full jitter: spreads retries from concurrent workers instead of hitting FMP in lock-step
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _send(path, params=None, api_key=None, stream=False):
+    """GET `{FMP_BASE_URL}/{path}` and return the successful response, retrying transient failures."""
+    url = f"{FMP_BASE_URL}/{path.lstrip('/')}"
+    query = dict(params or {})
+    if api_key:
+        query["apikey"] = api_key
+
+    session = get_session()
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        retry_after = None
+        try:
+            response = session.get(url, params=query, timeout=REQUEST_TIMEOUT, stream=stream)
+            if response.status_code in RETRY_STATUS:
+                retry_after = response.headers.get("Retry-After")
+                last_error = FMPError(f"HTTP {response.status_code}")
+                response.close()
+            else:
+                response.raise_for_status()
+                return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+        except requests.HTTPError as e:
+            # 4xx other than 429: retrying will not help
+            raise FMPError(str(e)) from e
+
+        if attempt < MAX_RETRIES:
+            time.sleep(_backoff_delay(attempt, retry_after))
+
+    raise FMPError(f"{path}: {last_error}")
+
+
+def fmp_get(path, params=None, api_key=None):
+    """GET `{FMP_BASE_URL}/{path}` and return the decoded JSON."""
+    response = _send(path, params, api_key)
+    _count_transfer(len(response.content))
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise FMPError(f"{path}: response is not JSON") from e
+    if FMP_RECORD_DIR:
+        record_fixture(FMP_RECORD_DIR, path, params, data)
+    return data
+
+
+def fmp_get_history(path, params=None, api_key=None, capacity=4096):
+    """
+    Stream a historical-price-full response straight into {symbol: (dates, closes)} arrays,
+    never materialising the JSON document or its per-bar dicts.
+    """
+    response = _send(path, params, api_key, stream=True)
+    sizes = []
+    with response:
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        if FMP_RECORD_DIR:
+            raw = bytearray()
+            chunks = (raw.extend(chunk) or chunk for chunk in chunks)
+        try:
+            history = parse_history_stream((sizes.append(len(chunk)) or chunk for chunk in chunks), capacity)
+        except requests.RequestException as e:
+            raise FMPError(f"{path}: {e}") from e
+    _count_transfer(sum(sizes))
+    if FMP_RECORD_DIR:
+        record_fixture(FMP_RECORD_DIR, path, params, json.loads(bytes(raw)))
+    return history
+
+
+#======================================================================================================================
+# Batched Requests
+#======================================================================================================================
+def chunk_symbols(symbols, endpoint):
+    size = BATCH_LIMITS.get(endpoint, 1)
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+def split_batch_response(data):
+    """
+    Split a multi-symbol response into {symbol: payload}, each payload shaped like the single-symbol response.
+    Symbols FMP left out of the response are missing from the result.
+    """
+    if isinstance(data, dict) and "historicalStockList" in data:
+        return {item["symbol"]: item for item in data["historicalStockList"] if "symbol" in item}
+    if isinstance(data, dict) and "symbol" in data:
+        return {data["symbol"]: data}
+    if isinstance(data, list):
+        split = {}
+        for item in data:
+            if isinstance(item, dict) and "symbol" in item:
+                split.setdefault(item["symbol"], []).append(item)
+        return split
+    return {}
+
+
+def fmp_get_batch(endpoint, symbols, params=None, api_key=None):
+    """One request for all `symbols` (at most BATCH_LIMITS[endpoint]) on a path-style endpoint."""
+    if len(symbols) == 1:
+        return {symbols[0]: fmp_get(f"{endpoint}/{symbols[0]}", params, api_key)}
+    data = fmp_get(f"{endpoint}/{','.join(symbols)}", params, api_key)
+    return split_batch_response(data)
+
+
+#======================================================================================================================
+# Historical Prices
+#======================================================================================================================
+def fetch_price_history(ticker, start, end, api_key):
+    """Daily closes for one ticker as a DataFrame indexed by `date` with a single `ticker` column."""
+    history = fmp_get_history(f"v3/historical-price-full/{ticker}", {"from": start, "to": end}, api_key,
+                              capacity=estimate_rows(start, end))
+    # Single-symbol responses carry the symbol too, but FMP may echo it in a different case
+    dates, closes = next(iter(history.values()), (None, []))
+    return history_frame(ticker, dates, closes)
+
+
+def fetch_price_batch(tickers, start, end, api_key):
+    """{ticker: DataFrame} for up to BATCH_LIMITS tickers sharing one date range, in a single request."""
+    if len(tickers) == 1:
+        return {tickers[0]: fetch_price_history(tickers[0], start, end, api_key)}
+
+    history = fmp_get_history(f"v3/historical-price-full/{','.join(tickers)}", {"from": start, "to": end}, api_key,
+                              capacity=estimate_rows(start, end))
+    # Symbols FMP has nothing for are simply absent from the combined response
+    return {t: history_frame(t, *history[t]) if t in history else pd.DataFrame() for t in tickers}
+
+
+def _fetch_price_group(tickers, start, end, api_key):
+    # A rejected batch (one bad symbol can fail the whole call) falls back to single-symbol requests
+    try:
+        return {t: (df, None) for t, df in fetch_price_batch(tickers, start, end, api_key).items()}
+    except Exception as e:
+        if len(tickers) == 1:
+            return {tickers[0]: (None, str(e))}
+
+    results = {}
+    for ticker in tickers:
+        try:
+            results[ticker] = (fetch_price_history(ticker, start, end, api_key), None)
+        except Exception as e:
+            results[ticker] = (None, str(e))
+    return results
+
+
+def fetch_price_jobs(jobs, api_key, max_workers=MAX_WORKERS, progress=None):
+    """
+    Run (ticker, start, end) download jobs over the shared session with a bounded thread pool.
+    Jobs sharing a date range are grouped into multi-symbol requests.
+    Returns a list aligned with `jobs` of (DataFrame, error) pairs; exactly one of them is None.
+    `progress(done, total)` is called from the calling thread, so it may update Streamlit widgets.
+    """
+    results = [(None, None)] * len(jobs)
+    if not jobs:
+        return results
+
+    by_range = {}
+    for i, (ticker, start, end) in enumerate(jobs):
+        by_range.setdefault((start, end), {}).setdefault(ticker, []).append(i)
+
+    groups = []
+    for (start, end), positions in by_range.items():
+        for chunk in chunk_symbols(list(positions), "v3/historical-price-full"):
+            groups.append((chunk, start, end, positions))
+
+    done = 0
+    workers = min(max_workers, len(groups))
+    with session_workers(workers), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch_price_group, chunk, s, e, api_key): (chunk, positions)
+                   for chunk, s, e, positions in groups}
+        for future in as_completed(futures):
+            chunk, positions = futures[future]
+            for ticker, result in future.result().items():
+                for i in positions[ticker]:
+                    results[i] = result
+            done += sum(len(positions[t]) for t in chunk)
+            if progress:
+                progress(done, len(jobs))
+    return results
+
+
+def fetch_prices_concurrent(tickers, start, end, api_key, max_workers=MAX_WORKERS, progress=None):
+    """Full-range download of `tickers`. Returns (frames, failures): {ticker: DataFrame} and {ticker: reason}."""
+    tickers = list(dict.fromkeys(tickers))
+    results = fetch_price_jobs([(t, start, end) for t in tickers], api_key, max_workers, progress)
+
+    frames, failures = {}, {}
+    for ticker, (df, error) in zip(tickers, results):
+        if error:
+            failures[ticker] = error
+        elif df.empty:
+            failures[ticker] = "no price history returned"
+        else:
+            frames[ticker] = df
+    return frames, failures
+
+
+def combine_price_frames(frames):
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(list(frames.values()), axis=1, join="outer").sort_index()
@@ -0,0 +1,112 @@
+# utils/marginal_scan.py
+import numpy as np
+import pandas as pd
+
+from utils.covariance_store import load_covariance_store, TRADING_DAYS
+from utils.etf_stats import load_stats_table
+
+
+#======================================================================================================================
+# Marginal Contribution Scan
+#======================================================================================================================
+# Moving a slice `alpha` of the portfolio into candidate c turns w into w' = (1 - alpha) w + alpha e_c, a rank-one
+# change whose variance only needs the portfolio's own variance, the candidate's covariance with the portfolio
+# (b_c = w . Sigma[:, c]) and its own variance:
+#     var' = (1 - alpha)^2 var_p + 2 alpha (1 - alpha) b_c + alpha^2 Sigma_cc
+# b for every candidate at once is one (k x N) row block of the covariance store, so the whole universe is scored
+# with a handful of vector operations instead of one optimization per candidate.
+NON_TICKERS = {"CASH"}
+
+SCAN_OBJECTIVES = {
+    "sharpe": ("delta_sharpe", False),
+    "risk": ("delta_volatility", True),
+}
+
+
+def portfolio_vector(weights, store, mu):
+    """
+    (positions, weights, dropped) of the holdings the store and stats can score; `dropped` maps each holding left
+    out to the reason. A holding whose covariance with another is missing (fewer than MIN_PERIODS common days) would
+    make the portfolio variance NaN, so the holding with the most gaps is left out until none remain.
+    """
+    weights = pd.Series(weights, dtype=np.float64)
+    weights = weights[weights > 0]
+    risky = weights.drop(labels=[t for t in weights.index if t in NON_TICKERS])
+    known = [t for t in risky.index if t in store and np.isfinite(mu.get(t, np.nan))]
+    dropped = {t: "not in the covariance store or ETF statistics" for t in risky.index if t not in known}
+
+    block = np.asarray(store.cov[[store.index[t] for t in known]][:, [store.index[t] for t in known]])
+    gaps = np.isnan(block)
+    while gaps.any():
+        worst = int(np.argmax(gaps.sum(axis=1)))
+        others = [t for t, gap in zip(known, gaps[worst]) if gap and t != known[worst]]
+        dropped[known[worst]] = (f"too little return overlap with {', '.join(others)}" if others
+                                 else "too little return history")
+        keep = np.arange(len(known)) != worst
+        known = [t for t, k in zip(known, keep) if k]
+        gaps = gaps[keep][:, keep]
+    if not known:
+        return np.empty(0, dtype=np.int64), np.empty(0), dropped
+
+    # Dropped holdings keep their share of risk budget: the known ones are scaled up to the original risky total
+    w = risky[known].to_numpy() * risky.sum() / risky[known].sum()
+    return np.array([store.index[t] for t in known], dtype=np.int64), w, dropped
+
+
+def scan_candidates(weights, alpha=0.05, objective="sharpe", rf=0.0, limit=50, store=None, stats=None):
+    """
+    Rank every ETF in the covariance store by the change it brings when `alpha` of the portfolio moves into it.
+    `weights` maps ticker -> weight (CASH allowed: zero risk, zero return). Uses annualized covariance and the
+    stats table's annual return. Returns (ranked DataFrame, {dropped holding: reason}, portfolio summary dict);
+    the summary is empty when the covariance store or stats table has not been built.
+    """
+    store = store if store is not None else load_covariance_store()
+    stats = stats if stats is not None else load_stats_table()
+    if store is None or stats.empty:
+        return pd.DataFrame(), {}, {}
+
+    mu_by_ticker = stats.set_index("symbol")["annual_return"]
+    pos, w, dropped = portfolio_vector(weights, store, mu_by_ticker)
+    if len(pos) == 0:
+        return pd.DataFrame(), dropped, {"candidates": 0}
+
+    mu = mu_by_ticker.reindex(store.tickers).to_numpy(dtype=np.float64)
+    # Sorted positions read the k memory-mapped rows in file order
+    order = np.argsort(pos)
+    pos, w = pos[order], w[order]
+    rows = np.asarray(store.cov[pos], dtype=np.float64) * TRADING_DAYS        # (k x N)
+    diag = np.asarray(np.diagonal(store.cov), dtype=np.float64) * TRADING_DAYS
+
+    var_p = float(w @ rows[:, pos] @ w)
+    ret_p = float(w @ mu[pos])
+    vol_p = float(np.sqrt(var_p))
+    sharpe_p = float((ret_p - rf) / vol_p) if vol_p > 0 else 0.0
+
+    b = w @ rows
+    new_var = (1 - alpha) ** 2 * var_p + 2 * alpha * (1 - alpha) * b + alpha ** 2 * diag
+    new_ret = (1 - alpha) * ret_p + alpha * mu
+    with np.errstate(divide="ignore", invalid="ignore"):
+        new_vol = np.sqrt(new_var)
+        new_sharpe = (new_ret - rf) / new_vol
+        corr_p = b / (vol_p * np.sqrt(diag))
+
+    valid = np.isfinite(new_sharpe) & np.isfinite(corr_p)
+    held = np.zeros(len(store.tickers), dtype=bool)
+    held[pos] = True
+
+    result = pd.DataFrame({
+        "symbol": np.asarray(store.tickers, dtype=object)[valid],
+        "held": held[valid],
+        "expected_return": mu[valid],
+        "volatility": np.sqrt(diag[valid]),
+        "corr_with_portfolio": corr_p[valid],
+        "new_return": new_ret[valid],
+        "new_volatility": new_vol[valid],
+        "new_sharpe": new_sharpe[valid],
+        "delta_sharpe": new_sharpe[valid] - sharpe_p,
+        "delta_volatility": new_vol[valid] - vol_p,
+    })
+    sort_col, ascending = SCAN_OBJECTIVES[objective]
+    result = result.sort_values(sort_col, ascending=ascending, kind="stable").reset_index(drop=True)
+    summary = {"return": ret_p, "volatility": vol_p, "sharpe": sharpe_p, "candidates": int(valid.sum())}
+    return (result.head(limit) if limit else result), dropped, summary
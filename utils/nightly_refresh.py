@@ -0,0 +1,132 @@
+# utils/nightly_refresh.py
+#
+# Warm the shared price store and ETF metadata cache for every ticker any client references, then compact the
+# client change journal.
+#   python -m utils.nightly_refresh                 (cron: 0 5 * * 1-5)
+#   python -m utils.nightly_refresh --dry-run
+#   python -m utils.nightly_refresh --universe      (also warm every ETF in the universe, for the screener)
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import toml
+from dotenv import load_dotenv
+
+from utils import fmp_utils
+from utils.client_store import CLIENT_DB, compact_journal, referenced_tickers
+from utils.etf_metadata import fetch_etf_metadata
+from utils.etf_stats import refresh_stats_table
+from utils.covariance_store import build_covariance_store
+from utils.price_store import refresh_tickers, DEFAULT_START_DATE
+from utils.universe import get_universe
+
+
+#======================================================================================================================
+# Settings
+#======================================================================================================================
+RUNS_DIR = "data/refresh_runs"
+SECRETS_FILE = ".streamlit/secrets.toml"
+
+
+def load_api_settings():
+    """(api_key, base_url) from the same places the Streamlit pages use: secrets.toml first, then .env."""
+    load_dotenv()
+    api = {}
+    if os.path.exists(SECRETS_FILE):
+        api = toml.load(SECRETS_FILE).get("api", {})
+    return api.get("fmp_key") or os.getenv("FMP_API_KEY"), api.get("base_url")
+
+
+#======================================================================================================================
+# Refresh Run
+#======================================================================================================================
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def run_refresh(tickers, api_key, start=DEFAULT_START_DATE, end=None):
+    """Refresh prices and metadata side by side; returns the run summary."""
+    end = end or date.today()
+    started_at = datetime.now().isoformat(timespec="seconds")
+    transfer_before = fmp_utils.transfer_stats()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        prices = pool.submit(_timed, refresh_tickers, tickers, start, end, api_key)
+        metadata = pool.submit(_timed, fetch_etf_metadata, tickers, api_key)
+        price_failures, price_seconds = prices.result()
+        (_, meta_failures), meta_seconds = metadata.result()
+
+    # Screener table and covariance store over everything now in the store, not only this run's tickers
+    stats, stats_seconds = _timed(refresh_stats_table)
+    covariance, covariance_seconds = _timed(build_covariance_store)
+
+    transfer_after = fmp_utils.transfer_stats()
+    return {
+        "started_at": started_at,
+        "tickers": len(tickers),
+        "range": [start.isoformat(), end.isoformat()],
+        "seconds": {
+            "total": round(time.perf_counter() - started, 3),
+            "prices": price_seconds,
+            "metadata": meta_seconds,
+            "stats": stats_seconds,
+            "covariance": covariance_seconds,
+        },
+        "stats_rows": len(stats),
+        "covariance_tickers": len(covariance.tickers),
+        "requests": transfer_after["requests"] - transfer_before["requests"],
+        "bytes": transfer_after["bytes"] - transfer_before["bytes"],
+        "failures": {
+            "prices": price_failures,
+            "metadata": meta_failures,
+        },
+    }
+
+
+def write_summary(summary, runs_dir=RUNS_DIR):
+    os.makedirs(runs_dir, exist_ok=True)
+    path = os.path.join(runs_dir, f"refresh_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=4)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh prices and ETF metadata for all client tickers.")
+    parser.add_argument("--db", default=CLIENT_DB, help="client store to read tickers from")
+    parser.add_argument("--start", type=date.fromisoformat, default=DEFAULT_START_DATE)
+    parser.add_argument("--universe", action="store_true", help="include every ETF in the universe")
+    parser.add_argument("--dry-run", action="store_true", help="list the tickers that would be refreshed")
+    args = parser.parse_args()
+
+    tickers = referenced_tickers(args.db)
+    if args.universe:
+        tickers = list(dict.fromkeys(tickers + get_universe().column("symbol").tolist()))
+    if args.dry_run:
+        print(f"{len(tickers)} tickers: {', '.join(tickers)}")
+        return 0
+
+    api_key, base_url = load_api_settings()
+    if not api_key:
+        print("❌ FMP_API_KEY not found. Please add it to Streamlit Secrets or your .env file.")
+        return 1
+    fmp_utils.set_base_url(base_url)
+
+    summary = run_refresh(tickers, api_key, start=args.start)
+    summary["journal_compacted"] = compact_journal(db_path=args.db)
+    path = write_summary(summary)
+
+    n_failed = len(summary["failures"]["prices"]) + len(summary["failures"]["metadata"])
+    print(f"Refreshed {summary['tickers']} tickers in {summary['seconds']['total']}s: "
+          f"{summary['requests']} requests, {summary['bytes'] / 1e6:.1f} MB, {n_failed} failures. Summary: {path}")
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,243 @@
+# utils/optimization_cache.py
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import riskfolio as rp
+
+
+#======================================================================================================================
+# Cache Layout
+#======================================================================================================================
+# data/cache/optimization/<key[:2]>/<key>.pkl   one solved problem: {"weights"} or {"frontier"}, plus "mu", "cov"
+# A key is the hash of the returns matrix (columns, dates and values) together with everything the solver is told,
+# so a hit is the exact problem solved before, by any page or worker. Entries never go stale; they are evicted when
+# unused for MAX_AGE_DAYS or, oldest use first, when the directory grows past MAX_CACHE_BYTES.
+OPT_CACHE_DIR = "data/cache/optimization"
+MAX_CACHE_BYTES = 256 * 1024 ** 2
+MAX_AGE_DAYS = 7
+MAX_MEMORY_ENTRIES = 128
+EVICT_EVERY = 64  # writes between disk sweeps
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+_writes = {"count": 0}
+
+
+#======================================================================================================================
+# Keys
+#======================================================================================================================
+def returns_hash(returns):
+    """Content hash of a (dates x assets) returns frame; equal frames hash equally wherever they were built."""
+    h = hashlib.sha1()
+    h.update(json.dumps([str(c) for c in returns.columns]).encode())
+    h.update(pd.util.hash_pandas_object(returns.index, index=False).to_numpy().tobytes())
+    h.update(np.ascontiguousarray(returns.to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+def problem_key(returns, kind, **params):
+    """Cache key of one problem on `returns`: its kind ("stats", "optimization", "frontier") and solver params."""
+    params = {k: float(v) if isinstance(v, (int, float, np.number)) and not isinstance(v, bool) else v
+              for k, v in params.items()}
+    payload = json.dumps({"returns": returns_hash(returns), "kind": kind, "params": params}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+#======================================================================================================================
+# Store
+#======================================================================================================================
+def _entry_path(key, cache_dir=OPT_CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], f"{key}.pkl")
+
+
+def _remember(key, entry):
+    with _memory_lock:
+        _memory[key] = entry
+        _memory.move_to_end(key)
+        while len(_memory) > MAX_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def get(key, cache_dir=OPT_CACHE_DIR):
+    """The cached entry for `key`, or None. Disk hits are promoted to memory and their age reset."""
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+
+    path = _entry_path(key, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            entry = pickle.load(f)
+        os.utime(path)  # age counts from last use
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None  # half-written or evicted underneath us; solve again
+    _remember(key, entry)
+    return entry
+
+
+def put(key, entry, cache_dir=OPT_CACHE_DIR):
+    _remember(key, entry)
+    path = _entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+    with _memory_lock:
+        _writes["count"] += 1
+        sweep = _writes["count"] % EVICT_EVERY == 0
+    if sweep:
+        evict(cache_dir=cache_dir)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, max_age_days=MAX_AGE_DAYS, cache_dir=OPT_CACHE_DIR):
+    """Remove entries unused for max_age_days, then the least recently used until under max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+        with _memory_lock:
+            _memory.pop(os.path.splitext(os.path.basename(path))[0], None)
+    return removed
+
+
+def cached(key, compute, cache_dir=OPT_CACHE_DIR):
+    """
+    get(key), else compute() and put it. Concurrent askers for the same key wait for the one solving it instead of
+    solving it again. A None result (failed solve) is returned but not cached.
+    """
+    entry = get(key, cache_dir)
+    if entry is not None:
+        return entry
+    with _inflight_lock:
+        lock = _inflight.setdefault(key, threading.Lock())
+    with lock:
+        entry = get(key, cache_dir)
+        if entry is None:
+            entry = compute()
+            if entry is not None:
+                put(key, entry, cache_dir)
+    with _inflight_lock:
+        _inflight.pop(key, None)
+    return entry
+
+
+#======================================================================================================================
+# Riskfolio Problems
+#======================================================================================================================
+def asset_stats(returns):
+    """(mu, cov) as Portfolio.assets_stats(method_mu="hist", method_cov="hist") estimates them."""
+    def compute():
+        port = rp.Portfolio(returns=returns)
+        port.assets_stats(method_mu="hist", method_cov="hist")
+        return {"mu": port.mu, "cov": port.cov}
+
+    entry = cached(problem_key(returns, "stats", method_mu="hist", method_cov="hist"), compute)
+    return entry["mu"], entry["cov"]
+
+
+def portfolio(returns, sht=False):
+    """An rp.Portfolio on `returns` with mu and cov filled in from the cache rather than re-estimated."""
+    port = rp.Portfolio(returns=returns, sht=sht)
+    port.mu, port.cov = asset_stats(returns)
+    return port
+
+
+def optimization_key(returns, obj, model="Classic", rm="MAD", rf=0.0, l=2.0, hist=True, sht=False):
+    """Key of one objective's solve; `l` only enters it for Utility, the only objective it changes."""
+    params = dict(obj=obj, model=model, rm=rm, rf=rf, hist=hist, sht=sht)
+    if obj == "Utility":
+        params["l"] = l
+    return problem_key(returns, "optimization", **params)
+
+
+def optimize(returns, obj, model="Classic", rm="MAD", rf=0.0, l=2.0, hist=True, sht=False):
+    """
+    Weights (assets x 1 frame, as port.optimization returns them) of one objective on `returns`, or None if the
+    solver failed.
+    """
+    def compute():
+        port = portfolio(returns, sht=sht)
+        w = port.optimization(model=model, rm=rm, obj=obj, rf=rf, l=l, hist=hist)
+        if w is None or w.empty:
+            return None
+        return {"weights": w, "mu": port.mu, "cov": port.cov}
+
+    entry = cached(optimization_key(returns, obj, model, rm, rf, l, hist, sht), compute)
+    return None if entry is None else entry["weights"].copy()
+
+
+def efficient_frontier(returns, model="Classic", rm="MAD", points=50, rf=0.0, hist=True, sht=False):
+    """Frontier weights (assets x points) on `returns`, or None if the solver failed."""
+    def compute():
+        port = portfolio(returns, sht=sht)
+        frontier = port.efficient_frontier(model=model, rm=rm, points=points, rf=rf, hist=hist)
+        if frontier is None or frontier.empty:
+            return None
+        return {"frontier": frontier, "mu": port.mu, "cov": port.cov}
+
+    key = problem_key(returns, "frontier", model=model, rm=rm, points=points, rf=rf, hist=hist, sht=sht)
+    entry = cached(key, compute)
+    return None if entry is None else entry["frontier"].copy()
+
+
+#======================================================================================================================
+# Report Problem
+#======================================================================================================================
+# The PDF report solves the selected objective and a frontier on the client's last REPORT_YEARS of prices with
+# these parameters. The Optimization page solves the same problem when an allocation is saved, so the report that
+# follows reads both from the cache; change them here and both pages move together.
+REPORT_YEARS = 3
+REPORT_POINTS = 50
+REPORT_PARAMS = {"model": "Classic", "rm": "MAD", "rf": 0.0, "hist": True, "sht": False}
+REPORT_L = 0.0
+REPORT_OBJECTIVES = ("Sharpe", "MinRisk", "Utility", "MaxRet")
+
+
+def report_prices(price_panel):
+    """The report's price window of a PricePanel, as a frame."""
+    return price_panel.last_years(REPORT_YEARS).to_frame()
+
+
+def warm_report(price_panel, obj):
+    """Solve and cache what the report will ask for when `obj` is the selected portfolio: its weights and frontier."""
+    returns = report_prices(price_panel).pct_change().dropna()
+    if returns.empty:
+        return
+    if obj not in ("Equal", "Manual"):
+        optimize(returns, obj if obj in REPORT_OBJECTIVES else "Sharpe", l=REPORT_L, **REPORT_PARAMS)
+    efficient_frontier(returns, points=REPORT_POINTS, **REPORT_PARAMS)
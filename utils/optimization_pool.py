@@ -0,0 +1,181 @@
+# utils/optimization_pool.py
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from utils import optimization_cache
+
+
+#======================================================================================================================
+# Pool
+#======================================================================================================================
+# The pool outlives a single run so workers pay the riskfolio/cvxpy import once. Workers are spawned, never forked:
+# a fork would copy whatever locks the web server's threads hold at that moment.
+MAX_WORKERS = 4
+
+_pool = {"executor": None, "workers": 0, "warmed": False}  # warmed: warm_pool() has run in this process
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    with _pool_lock:
+        if _pool["executor"] is None:
+            _pool["workers"] = max(1, min(MAX_WORKERS, os.cpu_count() or 1))
+            _pool["executor"] = ProcessPoolExecutor(max_workers=_pool["workers"], mp_context=get_context("spawn"))
+        return _pool["executor"]
+
+
+def _warm():
+    import riskfolio  # noqa: F401
+    return os.getpid()
+
+
+def warm_pool():
+    """
+    Start the workers and their imports in the background, so the first run doesn't wait on them. Only the first
+    call in a process does anything; pages call it on every rerun. A pool replaced after a crash starts cold.
+    """
+    with _pool_lock:
+        if _pool["warmed"]:
+            return
+        _pool["warmed"] = True
+    executor = _executor()
+    for _ in range(_pool["workers"]):
+        executor.submit(_warm)
+
+
+def shutdown_pool():
+    with _pool_lock:
+        executor, _pool["executor"] = _pool["executor"], None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+#======================================================================================================================
+# Shared Problem
+#======================================================================================================================
+# One shared-memory block per run holds returns (T x N), mu (N) and cov (N x N) as float64, back to back. Tasks
+# carry only the block's name, shape and tickers; each worker copies the matrices out once per run and keeps the
+# Portfolio for every objective it is handed on that run.
+def _share(returns, mu, cov, sht=False):
+    t, n = returns.shape
+    shm = SharedMemory(create=True, size=8 * (t * n + n + n * n))
+    data = np.ndarray(t * n + n + n * n, dtype=np.float64, buffer=shm.buf)
+    data[:t * n] = returns.to_numpy(dtype=np.float64).ravel()
+    data[t * n:t * n + n] = np.asarray(mu, dtype=np.float64).ravel()
+    data[t * n + n:] = np.asarray(cov, dtype=np.float64).ravel()
+    del data
+    return shm, {"name": shm.name, "shape": (t, n), "columns": list(returns.columns), "sht": sht}
+
+
+_worker = {"name": None, "port": None}
+
+
+def _attach(spec):
+    """The worker's Portfolio for the shared problem `spec`, built from the block on first use."""
+    if _worker["name"] != spec["name"]:
+        import riskfolio as rp
+
+        t, n = spec["shape"]
+        shm = SharedMemory(name=spec["name"])
+        try:
+            data = np.ndarray(t * n + n + n * n, dtype=np.float64, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        columns = spec["columns"]
+        port = rp.Portfolio(returns=pd.DataFrame(data[:t * n].reshape(t, n), columns=columns), sht=spec["sht"])
+        port.mu = pd.DataFrame(data[t * n:t * n + n].reshape(1, n), columns=columns)
+        port.cov = pd.DataFrame(data[t * n + n:].reshape(n, n), index=columns, columns=columns)
+        _worker.update(name=spec["name"], port=port)
+    return _worker["port"]
+
+
+def _solve(spec, obj, params):
+    """Worker task: (weights array or None, solve seconds) for one objective."""
+    port = _attach(spec)
+    start = time.perf_counter()
+    w = port.optimization(obj=obj, **params)
+    seconds = time.perf_counter() - start
+    return (None if w is None or w.empty else w.to_numpy(dtype=np.float64)[:, 0].copy()), seconds
+
+
+#======================================================================================================================
+# Multi-Objective Solve
+#======================================================================================================================
+def _solve_here(returns, obj, params, sht):
+    start = time.perf_counter()
+    try:
+        w = optimization_cache.portfolio(returns, sht=sht).optimization(obj=obj, **params)
+    except Exception as e:
+        return {"weights": None, "seconds": time.perf_counter() - start, "cached": False, "error": str(e)}
+    return {"weights": None if w is None or w.empty else w, "seconds": time.perf_counter() - start,
+            "cached": False, "error": None}
+
+
+def _solve_pooled(returns, mu, cov, objectives, params, sht):
+    """{obj: result} for the objectives the pool solved; a broken pool is shut down and its objectives left out."""
+    results = {}
+    shm, spec = _share(returns, mu, cov, sht)
+    try:
+        futures = {obj: _executor().submit(_solve, spec, obj, params) for obj in objectives}
+        for obj, future in futures.items():
+            try:
+                w, seconds = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                results[obj] = {"weights": None, "seconds": 0.0, "cached": False, "error": str(e)}
+                continue
+            weights = None if w is None else pd.DataFrame(w, index=returns.columns, columns=["weights"])
+            results[obj] = {"weights": weights, "seconds": seconds, "cached": False, "error": None}
+    except BrokenProcessPool:
+        shutdown_pool()  # a dead worker poisons the pool; the next run starts a fresh one
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def solve_objectives(returns, objectives, model="Classic", rm="MAD", rf=0.0, l=2.0, hist=True, sht=False):
+    """
+    Solve each objective on `returns`, cached ones straight from the optimization cache and the rest concurrently
+    in the worker pool (in process if the pool is unavailable). Returns ({obj: {"weights", "seconds", "cached",
+    "error"}}, wall seconds), with weights an (assets x 1) frame as port.optimization returns it, or None if the
+    solver failed.
+    """
+    start = time.perf_counter()
+    mu, cov = optimization_cache.asset_stats(returns)
+    results, keys = {}, {}
+    for obj in objectives:
+        hit_start = time.perf_counter()
+        keys[obj] = optimization_cache.optimization_key(returns, obj, model, rm, rf, l, hist, sht)
+        entry = optimization_cache.get(keys[obj])
+        if entry is not None:
+            results[obj] = {"weights": entry["weights"].copy(), "seconds": time.perf_counter() - hit_start,
+                            "cached": True, "error": None}
+
+    misses = [obj for obj in objectives if obj not in results]
+    params = dict(model=model, rm=rm, rf=rf, l=l, hist=hist)
+    # A single solve is cheaper here than shipping it to a worker
+    if len(misses) > 1:
+        results.update(_solve_pooled(returns, mu, cov, misses, params, sht))
+    for obj in misses:
+        if obj not in results:
+            results[obj] = _solve_here(returns, obj, params, sht)
+
+    for obj in misses:
+        if results[obj]["weights"] is not None:
+            optimization_cache.put(keys[obj], {"weights": results[obj]["weights"].copy(), "mu": mu, "cov": cov})
+
+    return {obj: results[obj] for obj in objectives}, time.perf_counter() - start
@@ -0,0 +1,110 @@
+# utils/panel_store.py
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+#======================================================================================================================
+# Panel Layout
+#======================================================================================================================
+# data/prices/panels/<key>/values.npy    float64 (dates x tickers), opened memory-mapped
+# data/prices/panels/<key>/dates.npy     datetime64[D], sorted ascending
+# data/prices/panels/<key>/columns.json  ticker order of the value columns
+PANEL_DIR = "data/prices/panels"
+PANEL_MAX_AGE_DAYS = 7
+
+
+class PricePanel:
+    """Aligned close panel backed by (possibly memory-mapped) arrays; slicing by date never copies."""
+
+    def __init__(self, values, dates, columns):
+        self.values = values
+        self.dates = dates
+        self.columns = list(columns)
+
+    @classmethod
+    def from_frame(cls, df):
+        df = df.sort_index()
+        dates = df.index.values.astype("datetime64[D]")
+        return cls(df.to_numpy(dtype=np.float64), dates, df.columns)
+
+    @property
+    def empty(self):
+        return self.values.size == 0
+
+    def slice(self, start=None, end=None):
+        """Rows with start <= date <= end, found by binary search on the date index."""
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start).date(), "D"), "left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end).date(), "D"), "right")
+        return PricePanel(self.values[lo:hi], self.dates[lo:hi], self.columns)
+
+    def last_years(self, years):
+        if len(self.dates) == 0:
+            return self
+        return self.slice(start=pd.Timestamp.today().normalize() - pd.DateOffset(years=years))
+
+    def to_frame(self):
+        index = pd.DatetimeIndex(self.dates.astype("datetime64[ns]"), name="date")
+        return pd.DataFrame(self.values, index=index, columns=self.columns, copy=False)
+
+
+#======================================================================================================================
+# Persistence
+#======================================================================================================================
+def _panel_path(key):
+    return os.path.join(PANEL_DIR, key)
+
+
+def load_price_panel(key):
+    """Open a stored panel without reading its values: O(1) in the panel size. None if it does not exist."""
+    path = _panel_path(key)
+    if not os.path.isdir(path):
+        return None
+    values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+    dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+    with open(os.path.join(path, "columns.json"), "r") as f:
+        columns = json.load(f)
+    return PricePanel(values, dates, columns)
+
+
+def save_price_panel(key, df, in_use=None):
+    panel = PricePanel.from_frame(df)
+    path = _panel_path(key)
+    if not os.path.isdir(path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, "values.npy"), np.ascontiguousarray(panel.values))
+        np.save(os.path.join(tmp, "dates.npy"), panel.dates)
+        with open(os.path.join(tmp, "columns.json"), "w") as f:
+            json.dump(panel.columns, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another session stored the same key first; panels are immutable, so theirs is identical
+            shutil.rmtree(tmp, ignore_errors=True)
+        prune_panels(in_use=in_use)
+    return load_price_panel(key)
+
+
+def prune_panels(max_age_days=PANEL_MAX_AGE_DAYS, in_use=None):
+    """
+    Drop panels older than max_age_days, except the keys returned by `in_use()`: panels something still points at,
+    which are kept however old. `in_use` is only called when some panel is old enough to go.
+    """
+    # Keys change whenever the store is refreshed, so superseded panels are dropped after a while
+    if not os.path.isdir(PANEL_DIR):
+        return
+    cutoff = time.time() - max_age_days * 24 * 3600
+    expired = [name for name in os.listdir(PANEL_DIR)
+               if os.path.isdir(_panel_path(name)) and os.path.getmtime(_panel_path(name)) < cutoff]
+    if not expired:
+        return
+    keep = in_use() if in_use is not None else set()
+    for name in expired:
+        if name not in keep:
+            shutil.rmtree(_panel_path(name), ignore_errors=True)
@@ -0,0 +1,84 @@
+# utils/prefetch.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.price_store import refresh_tickers
+
+
+#======================================================================================================================
+# Background Price Prefetch
+#======================================================================================================================
+# Jobs live at module level, so every Streamlit session in the process sees the same registry:
+# Asset Selection enqueues, Optimization attaches to the job by key.
+PREFETCH_WORKERS = 2
+JOB_RETENTION = 3600  # seconds a finished job stays attachable
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class PrefetchJob:
+    def __init__(self, key, tickers, start, end):
+        self.key = key
+        self.tickers = tickers
+        self.start = start
+        self.end = end
+        self.done = 0
+        self.total = 0
+        self.failures = {}
+        self.error = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else (0.0 if self.running else 1.0)
+
+    def _update(self, done, total):
+        self.done, self.total = done, total
+
+    def _run(self, api_key):
+        try:
+            self.failures = refresh_tickers(self.tickers, self.start, self.end, api_key, progress=self._update)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+
+    def wait(self, timeout=None):
+        if self.future is not None:
+            self.future.result(timeout)
+
+
+def prefetch_key(tickers, start, end):
+    return f"{','.join(sorted(set(tickers)))}|{start}|{end}"
+
+
+def enqueue_prefetch(tickers, start, end, api_key):
+    """Start refreshing `tickers` for [start, end] in the background, or return the identical job already queued."""
+    tickers = list(dict.fromkeys(tickers))
+    key = prefetch_key(tickers, start, end)
+    with _jobs_lock:
+        now = time.time()
+        for k in [k for k, j in _jobs.items() if j.finished_at and now - j.finished_at > JOB_RETENTION]:
+            del _jobs[k]
+
+        job = _jobs.get(key)
+        if job is not None and (job.running or job.error is None):
+            return job
+
+        job = PrefetchJob(key, tickers, start, end)
+        _jobs[key] = job
+        job.future = _executor.submit(job._run, api_key)
+        return job
+
+
+def get_prefetch(key):
+    with _jobs_lock:
+        return _jobs.get(key) if key else None
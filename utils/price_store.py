@@ -0,0 +1,360 @@
+# utils/price_store.py
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import pandas as pd
+
+from utils.fmp_utils import fetch_price_jobs, MAX_WORKERS
+from utils.panel_store import PricePanel, load_price_panel, save_price_panel
+
+
+#======================================================================================================================
+# Store Layout
+#======================================================================================================================
+# data/prices/<TICKER>.parquet   one file per ticker: `date` index, single close column named after the ticker
+# data/prices/_index.json         {ticker: {"first", "last", "checked_from", "checked"}} so refreshes never open parquet
+#                                 first/last are the stored data bounds, checked_from/checked the range already asked of FMP
+#                                 (checked stops at yesterday: today's bar is still moving and is re-read on the next day)
+# data/prices/_index.json.lock    flock'd around every read-merge-replace of the index, by whichever process writes it
+PRICE_STORE_DIR = "data/prices"
+INDEX_FILE = "_index.json"
+DEFAULT_START_DATE = date(2020, 1, 1)
+# Refreshed tickers whose index entries are written in one rewrite of _index.json
+INDEX_FLUSH_EVERY = 500
+
+_index_lock = threading.Lock()
+_ticker_locks = {}
+_inflight = {}
+
+
+def _ticker_lock(ticker):
+    with _index_lock:
+        return _ticker_locks.setdefault(ticker, threading.Lock())
+
+
+def ticker_path(ticker):
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+    return os.path.join(PRICE_STORE_DIR, f"{safe}.parquet")
+
+
+def _index_path():
+    return os.path.join(PRICE_STORE_DIR, INDEX_FILE)
+
+
+def load_index():
+    path = _index_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive OS-level lock on `path`, held across processes: the nightly CLI and the app share the index."""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10s; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _update_index(entries):
+    """Merge {ticker: entry} into the index in a single rewrite, read and replaced under the index file lock."""
+    if not entries:
+        return
+    os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+    with _index_lock, _file_lock(f"{_index_path()}.lock"):
+        index = load_index()
+        index.update(entries)
+        tmp = f"{_index_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp, _index_path())
+
+
+def last_stored_date(ticker):
+    entry = load_index().get(ticker)
+    return pd.Timestamp(entry["last"]) if entry else None
+
+
+#======================================================================================================================
+# Read / Write
+#======================================================================================================================
+def load_ticker(ticker):
+    path = ticker_path(ticker)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def _write_ticker(ticker, df):
+    os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+    path = ticker_path(ticker)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def load_panel(tickers, start=None, end=None):
+    """Outer-joined close panel for `tickers` between start and end (inclusive), indexed by `date`."""
+    frames = [load_ticker(t) for t in dict.fromkeys(tickers)]
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    panel = pd.concat(frames, axis=1, join="outer").sort_index()
+    panel.index.name = "date"
+    if start is not None:
+        panel = panel[panel.index >= pd.Timestamp(start)]
+    if end is not None:
+        panel = panel[panel.index <= pd.Timestamp(end)]
+    return panel
+
+
+#======================================================================================================================
+# Incremental Refresh
+#======================================================================================================================
+def _missing_ranges(entry, start, end):
+    """
+    Date ranges still to fetch for one ticker: a head backfill and/or the tail since the last check. Both reach
+    the checked range, even when the request starts after it or ends before it, so checked_from..checked stays one
+    gap-free span.
+    """
+    if entry is None:
+        return [(start, end)]
+
+    ranges = []
+    checked_from = date.fromisoformat(entry["checked_from"])
+    checked = date.fromisoformat(entry["checked"])
+    if start < checked_from:
+        ranges.append((start, checked_from - timedelta(days=1)))
+    if end > checked and entry.get("refreshed_on") != date.today().isoformat():
+        ranges.append((checked + timedelta(days=1), end))
+    return ranges
+
+
+def _claim(tickers):
+    """Split tickers into those this caller refreshes and (ticker, event) pairs already being refreshed elsewhere."""
+    claimed, running = [], []
+    with _index_lock:
+        for ticker in tickers:
+            if ticker in _inflight:
+                running.append((ticker, _inflight[ticker]))
+            else:
+                _inflight[ticker] = threading.Event()
+                claimed.append(ticker)
+    return claimed, running
+
+
+def _release(tickers):
+    with _index_lock:
+        for ticker in tickers:
+            _inflight.pop(ticker).set()
+
+
+def refresh_tickers(tickers, start, end, api_key, max_workers=MAX_WORKERS, progress=None):
+    """
+    Bring every ticker's stored history up to [start, end], downloading only the missing head/tail.
+    Tickers already being refreshed by another session are waited on instead of fetched twice.
+    Returns {ticker: reason} for tickers that could not be refreshed.
+    """
+    claimed, running = _claim(list(dict.fromkeys(tickers)))
+    try:
+        failures = _refresh_claimed(claimed, start, end, api_key, max_workers, progress)
+    finally:
+        _release(claimed)
+
+    for ticker, event in running:
+        event.wait()
+    index = load_index()
+    for ticker, _ in running:
+        if ticker not in index:
+            failures[ticker] = "refresh failed in another session"
+    return failures
+
+
+def _refresh_claimed(tickers, start, end, api_key, max_workers, progress):
+    end = min(end, date.today())
+    index = load_index()
+
+    jobs = []
+    for ticker in tickers:
+        for s, e in _missing_ranges(index.get(ticker), start, end):
+            jobs.append((ticker, s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")))
+
+    results = fetch_price_jobs(jobs, api_key, max_workers, progress)
+
+    fetched, failures = {}, {}
+    for (ticker, _, _), (df, error) in zip(jobs, results):
+        if error:
+            failures[ticker] = error
+        else:
+            fetched.setdefault(ticker, []).append(df)
+
+    # The index is rewritten once per INDEX_FLUSH_EVERY tickers, not per ticker; these tickers are claimed, so
+    # their entries in the index loaded above are current
+    pending = {}
+    for ticker, new_frames in fetched.items():
+        if ticker in failures:
+            continue
+        if len(pending) >= INDEX_FLUSH_EVERY:
+            _update_index(pending)
+            pending = {}
+        with _ticker_lock(ticker):
+            entry = index.get(ticker)
+            stored = load_ticker(ticker)
+            frames = [df for df in [stored] + new_frames if not df.empty]
+            if not frames:
+                if entry is None:
+                    failures[ticker] = "no price history returned"
+                continue
+
+            merged = pd.concat(frames)
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            merged.index.name = "date"
+            if any(not df.empty for df in new_frames):
+                _write_ticker(ticker, merged)
+
+            today = date.today()
+            checked_from, checked = start, min(end, today - timedelta(days=1))
+            refreshed_on = today.isoformat() if end >= today else None
+            if entry is not None:
+                checked_from = min(checked_from, date.fromisoformat(entry["checked_from"]))
+                checked = max(checked, date.fromisoformat(entry["checked"]))
+                refreshed_on = refreshed_on or entry.get("refreshed_on")
+            pending[ticker] = {
+                "first": merged.index[0].date().isoformat(),
+                "last": merged.index[-1].date().isoformat(),
+                "checked_from": checked_from.isoformat(),
+                "checked": checked.isoformat(),
+                "refreshed_on": refreshed_on,
+            }
+
+    _update_index(pending)
+    return failures
+
+
+#======================================================================================================================
+# Client Manifests
+#======================================================================================================================
+# The only per-client price artifact: which tickers and dates the client's panel is assembled from.
+def client_manifest_path(client_name):
+    folder_name = client_name.replace(" ", "_")
+    return f"data/clients/{folder_name}/{folder_name}_prices.json"
+
+
+def save_client_manifest(client_name, tickers, start, end, panel=None):
+    """Record the client's tickers and dates; `panel` (the DataFrame just assembled) is stored memory-mapped too."""
+    path = client_manifest_path(client_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = {
+        "tickers": list(dict.fromkeys(tickers)),
+        "start": pd.Timestamp(start).strftime("%Y-%m-%d"),
+        "end": pd.Timestamp(end).strftime("%Y-%m-%d"),
+        "updated": date.today().isoformat(),
+    }
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp, path)
+
+    if panel is not None and not panel.empty:
+        save_price_panel(panel_key(manifest["tickers"], manifest["start"], manifest["end"]), panel,
+                         in_use=referenced_panel_keys)
+    return manifest
+
+
+def load_client_manifest(client_name):
+    path = client_manifest_path(client_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _latest_legacy_csv(client_name):
+    # Clients saved before the shared store kept dated CSV snapshots in their folder
+    folder_name = client_name.replace(" ", "_")
+    folder_path = f"data/clients/{folder_name}"
+    if not os.path.isdir(folder_path):
+        return None
+    csv_files = sorted(f for f in os.listdir(folder_path) if f.startswith(folder_name) and f.endswith(".csv"))
+    return os.path.join(folder_path, csv_files[-1]) if csv_files else None
+
+
+def panel_key(tickers, start, end, index=None):
+    """Content key of an aligned panel: changes whenever any of its tickers is refreshed in the store."""
+    index = load_index() if index is None else index
+    parts = [f"{start}|{end}"] + [f"{t}|{json.dumps(index.get(t), sort_keys=True)}" for t in tickers]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def referenced_panel_keys():
+    """Keys of the panels the client manifests resolve to today; pruning keeps these however old they are."""
+    index, keys = load_index(), set()
+    for path in glob.glob(os.path.join("data/clients", "*", "*_prices.json")):
+        # A client folder named "<x>_prices" holds "<x>_prices.json" as its document, not as a manifest
+        if os.path.basename(path) != f"{os.path.basename(os.path.dirname(path))}_prices.json":
+            continue
+        try:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            keys.add(panel_key(manifest["tickers"], manifest["start"], manifest["end"], index))
+        except (OSError, ValueError, KeyError):
+            continue
+    return keys
+
+
+def load_client_price_panel(client_name):
+    """
+    The client's aligned price panel as a memory-mapped PricePanel, built from the shared store on first use
+    and reopened in O(1) afterwards. None if the client has no price data.
+    """
+    manifest = load_client_manifest(client_name)
+    if manifest:
+        key = panel_key(manifest["tickers"], manifest["start"], manifest["end"])
+        panel = load_price_panel(key)
+        if panel is None:
+            df = load_panel(manifest["tickers"], manifest["start"], manifest["end"])
+            if df.empty:
+                return None
+            panel = save_price_panel(key, df, in_use=referenced_panel_keys)
+        return panel
+
+    csv_path = _latest_legacy_csv(client_name)
+    if csv_path:
+        return PricePanel.from_frame(pd.read_csv(csv_path, parse_dates=["date"]).set_index("date"))
+    return None
+
+
+def load_client_panel(client_name):
+    """The client's price panel as a DataFrame indexed by `date`, or empty if none."""
+    panel = load_client_price_panel(client_name)
+    return panel.to_frame() if panel is not None else pd.DataFrame()
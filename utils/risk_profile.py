@@ -0,0 +1,60 @@
+# utils/risk_profile.py
+
+
+#======================================================================================================================
+# Questionnaire
+#======================================================================================================================
+QUESTIONS = [
+    ("What is your investment horizon?", ["< 1 year", "1-3 years", "3-5 years", "> 5 years"]),
+    ("What is your primary investment goal?", ["Capital Preservation", "Income", "Balanced Growth", "Aggressive Growth"]),
+    ("How would you react to a 10% drop in your portfolio value?", ["Sell immediately", "Reduce exposure", "Hold", "Buy more"]),
+    ("How much risk are you willing to take to achieve higher returns?", ["Very Low", "Low", "Moderate", "High"]),
+    ("What percentage of your total wealth is this portfolio?", ["< 10%", "10%-25%", "25%-50%", "> 50%"]),
+    ("How frequently do you monitor your investments?", ["Daily", "Weekly", "Monthly", "Rarely"]),
+    ("How familiar are you with financial products?", ["Not at all", "Somewhat", "Well-informed", "Expert"]),
+    ("What best describes your income stability?", ["Very unstable", "Unstable", "Stable", "Very stable"]),
+    ("Where is your current portfolio primarily invested?", ["Domestic markets", "Regional markets (e.g., GCC, MENA)", "Global markets"]),
+    ("Where would you prefer new investments to be allocated?", ["Domestic markets", "Regional markets (e.g., GCC, MENA)", "Global markets"]),
+    ("Are you open to investing in emerging markets?", ["No", "Limited exposure", "Yes, if returns justify the risk"]),
+    ("Are you open to investing in developed markets?", ["No", "Limited exposure", "Yes"]),
+    ("Are you comfortable with short selling?", ["No", "Maybe", "Yes"]),
+    ("Are you comfortable with portfolio leverage (borrowing to invest more)?", ["No", "Somewhat", "Yes"])
+]
+
+SHORT_QUESTION = "Are you comfortable with short selling?"
+LEVERAGE_QUESTION = "Are you comfortable with portfolio leverage (borrowing to invest more)?"
+
+
+#======================================================================================================================
+# Scoring
+#======================================================================================================================
+def score_profile(res):
+    scores = {
+        "< 1 year": 1, "1-3 years": 2, "3-5 years": 3, "> 5 years": 4,
+        "Capital Preservation": 1, "Income": 2, "Balanced Growth": 3, "Aggressive Growth": 4,
+        "Sell immediately": 1, "Reduce exposure": 2, "Hold": 3, "Buy more": 4,
+        "Very Low": 1, "Low": 2, "Moderate": 3, "High": 4,
+        "< 10%": 1, "10%-25%": 2, "25%-50%": 3, "> 50%": 4,
+        "Daily": 1, "Weekly": 2, "Monthly": 3, "Rarely": 4,
+        "Not at all": 1, "Somewhat": 2, "Well-informed": 3, "Expert": 4,
+        "Very unstable": 1, "Unstable": 2, "Stable": 3, "Very stable": 4
+    }
+    return sum(scores.get(res[q], 0) for q in res)
+
+def map_score_to_lambda(score):
+    return 1 if score >= 42 else 3 if score >= 35 else 5 if score >= 28 else 10 if score >= 21 else 20
+
+def map_score_to_level(score):
+    return "Aggressive" if score >= 42 else "Moderate" if score >= 28 else "Conservative"
+
+
+def risk_profile(answers):
+    """Everything the questionnaire submit stores, derived from the answers alone."""
+    risk_score = score_profile(answers)
+    return {
+        "risk_score": risk_score,
+        "risk_level": map_score_to_level(risk_score),
+        "risk_lambda": map_score_to_lambda(risk_score),
+        "allow_short": answers.get(SHORT_QUESTION, "No") == "Yes",
+        "allow_leverage": answers.get(LEVERAGE_QUESTION, "No") == "Yes",
+    }
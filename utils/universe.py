@@ -0,0 +1,299 @@
+# utils/universe.py
+import hashlib
+import json
+import os
+import sys
+import threading
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+
+#======================================================================================================================
+# Universe Source and Compiled Cache
+#======================================================================================================================
+UNIVERSE_XLSX = "data/data_lists.xlsx"
+UNIVERSE_SHEET = "ETF"
+
+# data/universe/etf_universe.parquet   synced from FMP by utils/universe_sync.py; once present it replaces the xlsx.
+#                                      Delisted rows are kept (delisted_on set) so a relisting keeps its Asset Class.
+UNIVERSE_STORE = "data/universe/etf_universe.parquet"
+STORE_COLUMNS = ["listed_on", "updated_on", "delisted_on"]
+
+# data/cache/universe/universe_<sha1>.parquet   compiled sheet, Broad Asset Class included
+# data/cache/universe/universe_meta.json        {"mtime_ns", "size", "sha1", "parquet"} of the xlsx it came from
+UNIVERSE_CACHE_DIR = "data/cache/universe"
+UNIVERSE_META = "universe_meta.json"
+
+# ==== Asset Class Mapping ====
+ASSET_CLASS_MAP = {
+    "Equities": ["Domestic Equity", "Canadian Equity", "Emerging Market Equity", "Australasian Equities",
+                 "Consumer Discretionary", "Consumer Staples", "Banks", "Biotechnology", "Aerospace & Defense",
+                 "Cyber Security", "E-Commerce", "Currency-hedged, Equities, International"],
+    "Fixed Income": ["Active Fixed Income", "Bond", "Canadian Fixed Income", "Emerging Market Bonds",
+                     "Convertible Securities"],
+    "Commodities": ["Commodities", "Commodity", "Agriculture"],
+    "Real Estate": ["Alternative | Real Estate", "REITs", "Global Real Estate", "Real Estate"],
+    "Private Equity": ["Private Equity", "Buyout Funds", "Venture Capital"],
+    "Alternatives": ["Alternative", "Alternative Energy", "Alternative Investments", "Alternative Equity Focused",
+                     "Alternative Credit Focused", "Alternative | Infrastructure", "Alternative | Managed Futures",
+                     "Alternative | Mid-Stream Energy", "Alternative | Multi-Strategy"],
+    "Multi-Asset": ["Balanced", "Balanced/Diversified", "Asset Allocation",
+                    "Active Equity Income and Green/Renewable", "Capital Efficient ETFs", "Alternatives, Equities"],
+    "Other": ["Cash", "Cash and Cash Equivalents", "Currency", "Community Bank"],
+    "Crypto": [ "Crypto ETPs", "Crypto-Linked","Digital Assets", "Currencies"],
+    "Private Credit": [ "Private Credit"]
+}
+
+REVERSE_MAP = {sub.lower(): broad for broad, subs in ASSET_CLASS_MAP.items() for sub in subs}
+BROAD_CLASSES = list(ASSET_CLASS_MAP) + ["Unclassified"]
+
+_memo = {"signature": None, "universe": None}
+_memo_lock = threading.Lock()
+
+
+class UniverseError(Exception):
+    pass
+
+
+#======================================================================================================================
+# Compilation
+#======================================================================================================================
+def _file_sha1(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _meta_path():
+    return os.path.join(UNIVERSE_CACHE_DIR, UNIVERSE_META)
+
+
+def _read_meta():
+    try:
+        with open(_meta_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta):
+    os.makedirs(UNIVERSE_CACHE_DIR, exist_ok=True)
+    tmp = f"{_meta_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp, _meta_path())
+
+
+def classify(df):
+    """Broad Asset Class as a categorical: the mapping runs once per distinct Asset Class, not once per row."""
+    codes, uniques = pd.factorize(df["Asset Class"])
+    broad_of_unique = np.array([BROAD_CLASSES.index(REVERSE_MAP.get(str(u).lower(), "Unclassified"))
+                                for u in uniques] + [BROAD_CLASSES.index("Unclassified")], dtype=np.int8)
+    # factorize marks missing values with -1, which picks the trailing "Unclassified" entry
+    df["Broad Asset Class"] = pd.Categorical.from_codes(broad_of_unique[codes], categories=BROAD_CLASSES)
+    return df
+
+
+def build_class_options(df):
+    """{broad class: ["name – symbol", ...]} in sheet order, as shown in the per-class multiselects."""
+    labels = df["name"].astype(str) + " – " + df["symbol"].astype(str)
+    grouped = labels.groupby(df["Broad Asset Class"], observed=True, sort=False)
+    return {broad: group.tolist() for broad, group in grouped}
+
+
+def compile_universe(xlsx_path=UNIVERSE_XLSX, sheet_name=UNIVERSE_SHEET, sha1=None):
+    """Parse the workbook once (the only openpyxl call) and store it as Parquet keyed by the file hash."""
+    df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
+    if "Asset Class" not in df.columns:
+        raise UniverseError("'Asset Class' column not found.")
+    df = classify(df)
+
+    stat = os.stat(xlsx_path)
+    sha1 = sha1 or _file_sha1(xlsx_path)
+    parquet = os.path.join(UNIVERSE_CACHE_DIR, f"universe_{sha1}.parquet")
+    os.makedirs(UNIVERSE_CACHE_DIR, exist_ok=True)
+    tmp = f"{parquet}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, parquet)
+
+    _write_meta({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": sha1, "parquet": parquet})
+    return df
+
+
+def _load_compiled(xlsx_path, sheet_name, stat):
+    meta = _read_meta()
+    parquet = meta.get("parquet")
+    if parquet and os.path.exists(parquet):
+        if meta.get("mtime_ns") == stat.st_mtime_ns and meta.get("size") == stat.st_size:
+            return pd.read_parquet(parquet)
+
+        # Touched but identical content (e.g. re-saved workbook): keep the compiled copy
+        sha1 = _file_sha1(xlsx_path)
+        if sha1 == meta.get("sha1"):
+            _write_meta(dict(meta, mtime_ns=stat.st_mtime_ns, size=stat.st_size))
+            return pd.read_parquet(parquet)
+        return compile_universe(xlsx_path, sheet_name, sha1)
+
+    return compile_universe(xlsx_path, sheet_name)
+
+
+def _load_store(store_path):
+    df = pd.read_parquet(store_path)
+    df = df[df["delisted_on"].isna()].drop(columns=STORE_COLUMNS).reset_index(drop=True)
+    return classify(df)
+
+
+#======================================================================================================================
+# Shared Universe
+#======================================================================================================================
+class Universe:
+    """
+    Read-only, process-wide universe shared by every session. Symbols are a fixed-width bytes array with a sorted
+    lookup order, names one UTF-8 buffer plus offsets, low-cardinality columns small integer codes into a tuple of
+    interned categories, and the per-class option lists tuples of interned labels. Sessions keep positions or
+    symbols into it, never copies of it.
+    """
+    CATEGORY_COLUMNS = ("exchange", "exchangeShortName", "Asset Class", "Broad Asset Class")
+
+    __slots__ = ("version", "_symbols", "_symbol_order", "_sorted_symbols", "_name_data", "_name_offsets",
+                 "_codes", "_categories", "class_options", "_frozen")
+
+    def __init__(self, df, version=None):
+        self.version = version
+        symbols = [str(v) for v in df["symbol"].tolist()]
+        self._symbols = _readonly(np.array([v.encode() for v in symbols], dtype=bytes))
+        self._symbol_order = _readonly(np.argsort(self._symbols, kind="stable"))
+        self._sorted_symbols = _readonly(self._symbols[self._symbol_order])
+
+        names = [str(v) for v in df["name"].tolist()]
+        encoded = [v.encode() for v in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in encoded], out=offsets[1:])
+        self._name_data, self._name_offsets = b"".join(encoded), _readonly(offsets)
+
+        self._codes, self._categories = {}, {}
+        for col in self.CATEGORY_COLUMNS:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            self._codes[col] = _readonly(codes.astype(np.int16 if len(uniques) > 127 else np.int8))
+            self._categories[col] = tuple(sys.intern(str(u)) for u in uniques)
+
+        labels = [sys.intern(f"{name} – {sym}") for name, sym in zip(names, symbols)]
+        broad_codes, broad_names = self._codes["Broad Asset Class"], self._categories["Broad Asset Class"]
+        self.class_options = MappingProxyType({
+            broad: tuple(labels[i] for i in np.flatnonzero(broad_codes == code))
+            for code, broad in enumerate(broad_names)
+        })
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Universe is immutable")
+        object.__setattr__(self, name, value)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, symbol):
+        return len(self.positions([symbol])) == 1
+
+    @property
+    def columns(self):
+        return ["symbol", "name"] + list(self._codes)
+
+    def _names_at(self, positions):
+        data, offsets = self._name_data, self._name_offsets
+        return [data[offsets[i]:offsets[i + 1]].decode() for i in positions]
+
+    def column(self, name, positions=None):
+        """Decoded values of one column for `positions` (default: all rows), as a new object array."""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        if name == "symbol":
+            return np.array([v.decode() for v in self._symbols[positions]], dtype=object)
+        if name == "name":
+            return np.array(self._names_at(positions), dtype=object)
+        # Code -1 (missing) picks the trailing None
+        categories = np.array(self._categories[name] + (None,), dtype=object)
+        return categories[self._codes[name][positions]]
+
+    def _lookup(self, symbols):
+        """(hit mask over `symbols`, row positions of the hits); binary search, first listing wins."""
+        query = [str(s).encode() for s in symbols]
+        if not query or not len(self):
+            return np.zeros(len(query), dtype=bool), np.empty(0, dtype=np.int64)
+        keys = self._sorted_symbols
+        found = np.searchsorted(keys, np.array(query, dtype=bytes)).clip(0, len(keys) - 1)
+        hit = np.array([keys[f] == q for f, q in zip(found, query)], dtype=bool)
+        return hit, self._symbol_order[found[hit]].astype(np.int64)
+
+    def positions(self, symbols):
+        """Row positions of the given symbols that are in the universe, in query order."""
+        return self._lookup(list(symbols))[1]
+
+    def names(self, symbols):
+        """Fund name for each symbol, None where the symbol is not in the universe."""
+        hit, positions = self._lookup(list(symbols))
+        found = iter(self._names_at(positions))
+        return [next(found) if h else None for h in hit]
+
+    def rows(self, positions):
+        """A small DataFrame for the given row positions (e.g. a selection or search result)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        return pd.DataFrame({col: self.column(col, positions) for col in self.columns}, index=positions)
+
+    def to_frame(self):
+        """The whole universe as a new DataFrame, for offline tools; pages should use rows() instead."""
+        return self.rows(np.arange(len(self))).reset_index(drop=True)
+
+    def memory_bytes(self):
+        """Approximate resident size: arrays, name buffer, interned categories and the option tuples."""
+        total = self._symbols.nbytes + self._symbol_order.nbytes + self._sorted_symbols.nbytes
+        total += self._name_offsets.nbytes
+        total += sys.getsizeof(self._name_data) + sum(c.nbytes for c in self._codes.values())
+        total += sum(sys.getsizeof(v) for cats in self._categories.values() for v in cats)
+        for opts in self.class_options.values():
+            total += sys.getsizeof(opts) + sum(sys.getsizeof(v) for v in opts)
+        return total
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+def get_universe(xlsx_path=UNIVERSE_XLSX, sheet_name=UNIVERSE_SHEET, store_path=UNIVERSE_STORE):
+    """
+    The shared Universe: the listed rows of the synced store when it exists, else the workbook. Rebuilt only
+    when the source's mtime/size change; the workbook goes through the compiled Parquet, recompiling only when
+    the content hash differs. The sync job replaces the store atomically, so the next rerun of any session
+    picks up the new version.
+    """
+    if store_path and os.path.exists(store_path):
+        stat = os.stat(store_path)
+        signature = (store_path, None, stat.st_mtime_ns, stat.st_size)
+        load = lambda: _load_store(store_path)
+    else:
+        stat = os.stat(xlsx_path)
+        signature = (xlsx_path, sheet_name, stat.st_mtime_ns, stat.st_size)
+        load = lambda: _load_compiled(xlsx_path, sheet_name, stat)
+
+    with _memo_lock:
+        if _memo["signature"] != signature:
+            _memo["universe"] = Universe(load(), version=signature)
+            _memo["signature"] = signature
+        return _memo["universe"]
+
+
+def load_universe(xlsx_path=UNIVERSE_XLSX, sheet_name=UNIVERSE_SHEET, store_path=UNIVERSE_STORE):
+    """The universe as a fresh DataFrame (with Broad Asset Class), for offline tools like the sync job."""
+    return get_universe(xlsx_path, sheet_name, store_path).to_frame()
+
+
+def load_class_options(xlsx_path=UNIVERSE_XLSX, sheet_name=UNIVERSE_SHEET, store_path=UNIVERSE_STORE):
+    """Multiselect option tuples per broad class, built with the universe version they belong to."""
+    return get_universe(xlsx_path, sheet_name, store_path).class_options
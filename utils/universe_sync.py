@@ -0,0 +1,171 @@
+# utils/universe_sync.py
+#
+# Sync the ETF universe store with FMP's ETF list: apply inserts, updates and delistings, keep our Asset Class.
+#   python -m utils.universe_sync                   (cron: 30 4 * * 1-5, before the nightly refresh)
+#   python -m utils.universe_sync --dry-run
+import argparse
+import json
+import os
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from utils import fmp_utils
+from utils.nightly_refresh import load_api_settings
+from utils.universe import UNIVERSE_STORE, UNIVERSE_XLSX, UNIVERSE_SHEET, STORE_COLUMNS, UniverseError, load_universe
+
+
+#======================================================================================================================
+# Settings
+#======================================================================================================================
+ETF_LIST_PATH = "v3/etf/list"
+SYNC_FIELDS = ["name", "exchange", "exchangeShortName"]
+UNIVERSE_COLUMNS = ["symbol"] + SYNC_FIELDS + ["Asset Class"]
+SYNC_RUNS_DIR = "data/universe/sync_runs"
+
+# A list that would delist more than this share of the universe is treated as a bad response, not applied
+MAX_DELIST_SHARE = 0.2
+
+
+#======================================================================================================================
+# Store
+#======================================================================================================================
+def seed_store(xlsx_path=UNIVERSE_XLSX, sheet_name=UNIVERSE_SHEET):
+    """Initial store rows from the hand-maintained workbook, so its Asset Class classification carries over."""
+    df = load_universe(xlsx_path, sheet_name, store_path=None)
+    df = df.reindex(columns=UNIVERSE_COLUMNS).drop_duplicates("symbol", keep="first")
+    today = date.today().isoformat()
+    df["listed_on"], df["updated_on"], df["delisted_on"] = today, today, None
+    return df.reset_index(drop=True)
+
+
+def load_store(store_path=UNIVERSE_STORE):
+    if os.path.exists(store_path):
+        return pd.read_parquet(store_path)
+    return seed_store()
+
+
+def write_store(df, store_path=UNIVERSE_STORE):
+    """Replace the store in one rename; sessions keep their loaded version until their next rerun."""
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp = f"{store_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, store_path)
+
+
+def fetch_etf_list(api_key):
+    """FMP's ETF list as a DataFrame keyed by symbol (one row per symbol)."""
+    data = fmp_utils.fmp_get(ETF_LIST_PATH, api_key=api_key)
+    if not isinstance(data, list):
+        raise fmp_utils.FMPError(f"Unexpected {ETF_LIST_PATH} response: {str(data)[:200]}")
+    remote = pd.DataFrame(data).reindex(columns=["symbol"] + SYNC_FIELDS)
+    remote = remote[remote["symbol"].notna()].drop_duplicates("symbol", keep="first")
+    return remote.reset_index(drop=True)
+
+
+#======================================================================================================================
+# Diff and Apply
+#======================================================================================================================
+def _differs(a, b):
+    """Element-wise inequality where two missing values count as equal."""
+    a, b = a.astype(object), b.astype(object)
+    return (a != b) & ~(pd.isna(a) & pd.isna(b))
+
+
+def diff_universe(local, remote):
+    """
+    (merged store, summary). Symbols new to the store are inserted (Asset Class left empty, i.e. Unclassified),
+    listed symbols whose FMP fields changed are updated in place, store symbols missing from the list are marked
+    delisted, and delisted symbols that reappear are relisted with their old classification.
+    """
+    today = date.today().isoformat()
+    # Keep the store's row order (it drives the option lists) and append new symbols in FMP's order
+    merged = local.assign(_order=np.arange(len(local))).merge(
+        remote.assign(_remote_order=np.arange(len(remote)) + len(local)),
+        on="symbol", how="outer", suffixes=("", "_remote"), indicator=True)
+    order = merged["_order"].fillna(merged["_remote_order"]).to_numpy()
+    merged = merged.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+    in_remote = merged["_merge"].isin(["both", "right_only"]).to_numpy()
+    in_local = merged["_merge"].isin(["both", "left_only"]).to_numpy()
+    was_listed = in_local & merged["delisted_on"].isna().to_numpy()
+
+    changed = np.zeros(len(merged), dtype=bool)
+    for field in SYNC_FIELDS:
+        changed |= _differs(merged[field], merged[f"{field}_remote"]).to_numpy()
+
+    inserts = in_remote & ~in_local
+    relists = in_remote & in_local & ~was_listed
+    updates = in_remote & was_listed & changed
+    delists = ~in_remote & was_listed
+
+    touched = inserts | relists | updates
+    for field in SYNC_FIELDS:
+        merged.loc[touched, field] = merged.loc[touched, f"{field}_remote"]
+    merged.loc[inserts, "listed_on"] = today
+    merged.loc[touched | delists, "updated_on"] = today
+    merged.loc[relists, "delisted_on"] = None
+    merged.loc[delists, "delisted_on"] = today
+
+    merged = merged[UNIVERSE_COLUMNS + STORE_COLUMNS]
+    summary = {
+        "inserted": int(inserts.sum()),
+        "relisted": int(relists.sum()),
+        "updated": int(updates.sum()),
+        "delisted": int(delists.sum()),
+        "listed_before": int(was_listed.sum()),
+        "listed_after": int(in_remote.sum()),
+    }
+    return merged, summary
+
+
+def sync_universe(api_key, store_path=UNIVERSE_STORE, dry_run=False, force=False):
+    """Pull the FMP list, diff it against the store and, unless dry_run, write the new store atomically."""
+    local = load_store(store_path)
+    remote = fetch_etf_list(api_key)
+    merged, summary = diff_universe(local, remote)
+
+    if summary["listed_before"] and summary["delisted"] > MAX_DELIST_SHARE * summary["listed_before"] and not force:
+        raise UniverseError(f"Refusing to delist {summary['delisted']} of {summary['listed_before']} ETFs; "
+                            f"re-run with --force if the FMP list really shrank.")
+    if not dry_run:
+        write_store(merged, store_path)
+    return summary
+
+
+def write_summary(summary, runs_dir=SYNC_RUNS_DIR):
+    os.makedirs(runs_dir, exist_ok=True)
+    path = os.path.join(runs_dir, f"sync_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=4)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the ETF universe with FMP's ETF list.")
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing the store")
+    parser.add_argument("--force", action="store_true", help=f"apply even if over {MAX_DELIST_SHARE:.0%} delist")
+    args = parser.parse_args()
+
+    api_key, base_url = load_api_settings()
+    if not api_key:
+        print("❌ FMP_API_KEY not found. Please add it to Streamlit Secrets or your .env file.")
+        return 1
+    fmp_utils.set_base_url(base_url)
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    try:
+        summary = dict(sync_universe(api_key, dry_run=args.dry_run, force=args.force),
+                       started_at=started_at, dry_run=args.dry_run)
+    except (UniverseError, fmp_utils.FMPError) as e:
+        print(f"❌ Universe sync failed: {e}")
+        return 1
+    path = write_summary(summary)
+    print(f"{summary['inserted']} inserted, {summary['relisted']} relisted, {summary['updated']} updated, "
+          f"{summary['delisted']} delisted; {summary['listed_after']} listed ETFs. Summary: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())